@@ -0,0 +1,41 @@
+"""
+Benchmark title classification throughput.
+
+Usage: python benchmarks/bench_classify.py [number of titles]
+"""
+import sys
+import random
+from timeit import timeit
+
+from memeoverflow.classify import DEFAULT_CLASSIFIER
+
+
+TITLES = (
+    'Is this a bug in the compiler?',
+    'Is it possible to run two scripts at once?',
+    'What does "sudo" actually do',
+    'If I delete this file, will it break anything?',
+    'How do I connect a button to GPIO 17?',
+    'Python script stops running after a few hours',
+)
+
+
+def make_titles(n):
+    rng = random.Random(0)
+    return [rng.choice(TITLES) for i in range(n)]
+
+
+def main(n=10000, repeat=10):
+    titles = make_titles(n)
+    rng = random.Random(0)
+    seconds = timeit(
+        lambda: DEFAULT_CLASSIFIER.classify_many(titles, rng=rng),
+        number=repeat,
+    ) / repeat
+    print(f"classify_many: {n} titles in {seconds * 1000:.1f}ms "
+          f"({seconds * 1000 * 10000 / n:.1f}ms per 10k titles, "
+          f"{n / seconds:,.0f} titles/s)")
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:2]])
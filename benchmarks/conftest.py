@@ -0,0 +1,85 @@
+from io import BytesIO
+from unittest.mock import Mock, MagicMock
+
+import pytest
+
+from memeoverflow import MemeOverflow, MemeDatabase
+
+
+# rows per site table in the database benchmarks
+DB_ROWS = 1000000
+
+
+@pytest.fixture(scope='session')
+def big_db_path(tmp_path_factory):
+    "Database with DB_ROWS question IDs (the even numbers) for site 'big'"
+    db_path = str(tmp_path_factory.mktemp('bench') / 'big.db')
+    with MemeDatabase('big', db_path) as db:
+        db.conn.executemany(
+            "insert into big values (?)",
+            ((id, ) for id in range(0, DB_ROWS * 2, 2))
+        )
+        db.conn.commit()
+    return db_path
+
+
+def make_question(id):
+    return {
+        'tags': ['python', 'c#', 'raspberry-pi', 'gpio'],
+        'question_id': id,
+        'link': f'https://stackoverflow.com/questions/{id}/some-question',
+        'title': f'Is it possible to do thing number {id}?',
+        'creation_date': 1600000000 + id,
+    }
+
+
+class FakeSession:
+    """
+    In-process stand-in for the HTTP session, answering Stack Exchange,
+    imgflip and image download requests instantly
+    """
+    def __init__(self, questions):
+        self.questions = questions
+
+    def get(self, url, params=None, stream=False):
+        response = MagicMock()
+        response.__enter__.return_value = response
+        if 'stackexchange' in url:
+            response.json.return_value = {
+                'items': self.questions,
+                'has_more': False,
+                'quota_max': 10000,
+                'quota_remaining': 9999,
+            }
+        else:
+            response.raw = BytesIO(b'\xff\xd8' + b'x' * 50000)
+        return response
+
+    def post(self, url, data=None):
+        response = Mock()
+        response.json.return_value = {
+            'success': True,
+            'data': {'url': 'https://i.imgflip.com/test.jpg'},
+        }
+        return response
+
+
+@pytest.fixture()
+def fake_bot(tmp_path):
+    "MemeOverflow wired to in-process fakes, with no cooldowns"
+    questions = [make_question(id) for id in range(100)]
+    session = FakeSession(questions)
+    bot = MemeOverflow(
+        twitter={
+            'con_key': 'a', 'con_sec': 'b', 'acc_tok': 'c', 'acc_sec': 'd',
+        },
+        imgflip={'username': 'user', 'password': 'pass'},
+        stackexchange={'site': 'bench', 'key': 'bench_key'},
+        db_path=str(tmp_path / 'bench.db'),
+        session=session,
+        tweet_interval=0,
+        poll_interval=0,
+    )
+    bot.twitter.twython.post = Mock(return_value={'media_id': '1'})
+    bot.twitter.twython.update_status = Mock()
+    return bot
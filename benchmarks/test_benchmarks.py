@@ -0,0 +1,76 @@
+"""
+Benchmarks of the pipeline's hot paths. Run with ``make bench``, which fails
+if any benchmark is more than 20% slower (mean) than the stored baseline.
+"""
+import random
+
+from memeoverflow import MemeDatabase
+from memeoverflow.classify import DEFAULT_CLASSIFIER
+from memeoverflow.utils import tags_to_hashtags
+from memeoverflow.status import compose_status
+
+from conftest import DB_ROWS, make_question
+from bench_classify import make_titles
+
+
+def test_choose_meme_template(benchmark, fake_bot):
+    rng = random.Random(0)
+    benchmark(fake_bot.choose_meme_template, 'Why does this not work?', rng)
+
+def test_place_text(benchmark, fake_bot):
+    benchmark(fake_bot.place_text, 'ANCIENT_ALIENS', 'Why does this not work?')
+
+def test_classify_many_10k(benchmark):
+    titles = make_titles(10000)
+    rng = random.Random(0)
+    benchmark(DEFAULT_CLASSIFIER.classify_many, titles, rng)
+
+def test_tags_to_hashtags(benchmark):
+    tags = ['python', 'c#', 'raspberry-pi', 'python-3.x', '.net']
+    benchmark(tags_to_hashtags, tags)
+
+def test_compose_status(benchmark):
+    q = make_question(12345)
+    benchmark(compose_status, q['title'], q['link'], q['tags'])
+
+def test_question_is_known(benchmark, big_db_path):
+    rng = random.Random(0)
+    with MemeDatabase('big', big_db_path) as db:
+        benchmark(lambda: db.question_is_known(rng.randrange(DB_ROWS * 2)))
+
+def test_question_is_known_cached(benchmark, big_db_path):
+    rng = random.Random(0)
+    with MemeDatabase('big', big_db_path, cache_size=10000) as db:
+        benchmark(lambda: db.question_is_known(rng.randrange(DB_ROWS * 2)))
+
+def test_known_ids_page(benchmark, big_db_path):
+    ids = list(range(DB_ROWS - 50, DB_ROWS + 50))
+    with MemeDatabase('big', big_db_path) as db:
+        benchmark(db.known_ids, ids)
+
+def test_insert_question(benchmark, big_db_path):
+    ids = iter(range(DB_ROWS * 2 + 1, DB_ROWS * 4, 2))
+    with MemeDatabase('big', big_db_path) as db:
+        benchmark(lambda: db.insert_question(next(ids)))
+
+def test_insert_question_batched(benchmark, big_db_path):
+    ids = iter(range(DB_ROWS * 4 + 1, DB_ROWS * 6, 2))
+    with MemeDatabase('big', big_db_path, batch_size=100) as db:
+        benchmark(lambda: db.insert_question(next(ids)))
+
+def test_get_se_questions(benchmark, fake_bot):
+    for id in range(0, 100, 2):
+        fake_bot.db.insert_question(id)
+    questions = benchmark(fake_bot.get_se_questions)
+    assert len(questions) == 50
+
+def test_end_to_end_cycle(benchmark, fake_bot):
+    ids = iter(range(10 ** 9))
+
+    def cycle():
+        fake_bot.stackexchange._http.questions = [make_question(next(ids))]
+        fake_bot.scheduler.next_poll_at = 0
+        return fake_bot.step()
+
+    benchmark(cycle)
+    assert fake_bot.twitter.twython.update_status.called
@@ -30,5 +30,7 @@ main = MemeOverflow(
 )
 
 if __name__ == '__main__':
-    while True:
-        main()
+    # closing writes any batched question IDs to the database
+    with main:
+        while True:
+            main()
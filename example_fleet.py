@@ -0,0 +1,36 @@
+from memeoverflow import MemeOverflowFleet
+from logzero import logfile
+
+logfile('/var/log/memeoverflow/fleet.log')  # optional
+
+twitter = {
+    'con_key': '',
+    'con_sec': '',
+    'acc_tok': '',
+    'acc_sec': '',
+}
+
+imgflip = {
+    'username': '',
+    'password': '',
+}
+
+sites = [
+    {
+        'stackexchange': {'site': '', 'key': ''},
+        'twitter': twitter,
+        'imgflip': imgflip,
+        'tweet_interval': 60*5,  # optional
+        'poll_interval': 60*5,  # optional
+    },
+]
+
+db_path = '/home/ben/bots/memes/memes.db'
+
+main = MemeOverflowFleet(sites=sites, db_path=db_path)
+
+if __name__ == '__main__':
+    # closing writes any batched question IDs to the database
+    with main:
+        while True:
+            main()
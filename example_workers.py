@@ -0,0 +1,33 @@
+from memeoverflow import MemeOverflowSupervisor
+from logzero import logfile
+
+logfile('/var/log/memeoverflow/workers.log')  # optional
+
+twitter = {
+    'con_key': '',
+    'con_sec': '',
+    'acc_tok': '',
+    'acc_sec': '',
+}
+
+imgflip = {
+    'username': '',
+    'password': '',
+}
+
+sites = [
+    {
+        'stackexchange': {'site': '', 'key': ''},
+        'twitter': twitter,
+        'imgflip': imgflip,
+        'tweet_interval': 60*5,  # optional
+        'poll_interval': 60*5,  # optional
+    },
+]
+
+db_path = '/home/ben/bots/memes/memes.db'
+
+main = MemeOverflowSupervisor(sites=sites, db_path=db_path, workers=4)
+
+if __name__ == '__main__':
+    main.run()
@@ -1,10 +1,58 @@
 "Simple framework for Twitter bots creating memes from Stack Exchange questions"
 
-from .memeoverflow import MemeOverflow
-from .stackexchange import StackExchange
-from .db import MemeDatabase
-from .imgflip import ImgFlip, MEMES
-from .twitter import Twitter
+from typing import TYPE_CHECKING
+from importlib import import_module
 
 
 __version__ = '0.8.0'
+
+# public names and the modules they come from, imported on first use so that
+# tools which only need e.g. the database don't pay for the API clients
+_LAZY = {
+    'MemeOverflow': '.memeoverflow',
+    'AsyncMemeOverflow': '.pipeline',
+    'MemeOverflowFleet': '.fleet',
+    'MemeOverflowSupervisor': '.supervisor',
+    'StackExchange': '.stackexchange',
+    'MemeDatabase': '.db',
+    'ImgFlip': '.imgflip',
+    'MEMES': '.memes',
+    'Twitter': '.twitter',
+    'LocalRenderer': '.render',
+    'ImageCache': '.cache',
+    'MetricsCollector': '.metrics',
+    'MetricsServer': '.metrics',
+}
+
+__all__ = list(_LAZY)
+
+if TYPE_CHECKING:
+    # let linters and type checkers see the lazy names
+    from .memeoverflow import MemeOverflow
+    from .pipeline import AsyncMemeOverflow
+    from .fleet import MemeOverflowFleet
+    from .supervisor import MemeOverflowSupervisor
+    from .stackexchange import StackExchange
+    from .db import MemeDatabase
+    from .imgflip import ImgFlip
+    from .memes import MEMES
+    from .twitter import Twitter
+    from .render import LocalRenderer
+    from .cache import ImageCache
+    from .metrics import MetricsCollector, MetricsServer
+
+
+def __getattr__(name):
+    try:
+        module = _LAZY[name]
+    except KeyError:
+        raise AttributeError(
+            f"module {__name__!r} has no attribute {name!r}"
+        ) from None
+    value = getattr(import_module(module, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY))
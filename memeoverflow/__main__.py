@@ -0,0 +1,52 @@
+"""
+Maintenance commands for a bot's database, e.g.::
+
+    python -m memeoverflow outbox /home/ben/bots/memes/memes.db stackoverflow
+
+Only the database module is imported, so commands start quickly.
+"""
+import html
+import argparse
+
+from .db import MemeDatabase
+
+
+def outbox(options):
+    "List the questions in the outbox which haven't been tweeted"
+    with MemeDatabase(options.site, options.db_path) as db:
+        for entry in db.outbox_unfinished():
+            title = html.unescape(entry.question.get('title', ''))
+            print(f"{entry.question_id}\t{entry.state}\t{title}")
+
+
+def known(options):
+    "Show which questions have been tweeted"
+    with MemeDatabase(options.site, options.db_path) as db:
+        found = db.known_ids(options.ids)
+    for id in options.ids:
+        print(f"{id}\t{'known' if id in found else 'unknown'}")
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m memeoverflow',
+        description="Maintenance commands for a meme-overflow database"
+    )
+    commands = parser.add_subparsers(dest='command', required=True)
+    outbox_parser = commands.add_parser(
+        'outbox', help="list the questions waiting to be tweeted")
+    outbox_parser.set_defaults(func=outbox)
+    known_parser = commands.add_parser(
+        'known', help="show which questions have been tweeted")
+    known_parser.set_defaults(func=known)
+    for command in (outbox_parser, known_parser):
+        command.add_argument('db_path', help="path to the database file")
+        command.add_argument('site', help="Stack Exchange site name")
+    known_parser.add_argument(
+        'ids', nargs='+', type=int, help="question IDs to look up")
+    options = parser.parse_args(args)
+    options.func(options)
+
+
+if __name__ == '__main__':
+    main()
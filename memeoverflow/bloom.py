@@ -0,0 +1,53 @@
+import math
+from hashlib import blake2b
+
+
+class BloomFilter:
+    """
+    Simple Bloom filter for fast probabilistic set membership. Lookups can
+    give false positives, but never false negatives.
+
+    :type capacity: int
+    :param capacity: Number of items the filter is sized for
+
+    :type error_rate: float
+    :param error_rate: Target false positive rate when full
+    """
+    def __init__(self, capacity, error_rate=0.001):
+        capacity = max(capacity, 1)
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.num_bits = math.ceil(
+            -capacity * math.log(error_rate) / math.log(2) ** 2
+        )
+        self.num_hashes = max(
+            1, round(self.num_bits / capacity * math.log(2))
+        )
+        self.bits = bytearray(math.ceil(self.num_bits / 8))
+        self.count = 0
+
+    def __repr__(self):
+        return (
+            f"<BloomFilter capacity={self.capacity} count={self.count}>"
+        )
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, item):
+        return all(
+            self.bits[i >> 3] & (1 << (i & 7))
+            for i in self._indexes(item)
+        )
+
+    def add(self, item):
+        "Add an item to the filter"
+        for i in self._indexes(item):
+            self.bits[i >> 3] |= 1 << (i & 7)
+        self.count += 1
+
+    def _indexes(self, item):
+        digest = blake2b(str(item).encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
@@ -0,0 +1,162 @@
+import os
+import json
+import shutil
+import threading
+from io import BytesIO
+from hashlib import sha256
+from collections import OrderedDict
+
+from .utils import CHUNK_SIZE
+
+
+class ImageCache:
+    """
+    Size-bounded on-disk cache of generated meme images, keyed by the content
+    which produced them (template ID and text), so repeated or retried memes
+    don't need to be made or downloaded again. The least recently used images
+    (and URLs) are evicted once the cache grows beyond max_bytes.
+
+    :type cache_dir: str
+    :param cache_dir: Directory to store cached images in
+
+    :type max_bytes: int
+    :param max_bytes: Maximum total size of cached images and URLs in bytes
+    """
+    def __init__(self, cache_dir, max_bytes=100 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.stats = {
+            'hits': 0,
+            'url_hits': 0,
+            'misses': 0,
+            'evictions': 0,
+        }
+        self._lock = threading.Lock()
+        self._index = OrderedDict()
+        self._size = 0
+        os.makedirs(cache_dir, exist_ok=True)
+        self._load_index()
+
+    def __repr__(self):
+        return (
+            f"<ImageCache items={len(self._index)} bytes={self._size} "
+            f"hit_rate={self.hit_rate:.2f}>"
+        )
+
+    def __len__(self):
+        return len(self._index)
+
+    @property
+    def hit_rate(self):
+        "Return the proportion of lookups which found a cached image"
+        lookups = self.stats['hits'] + self.stats['misses']
+        if lookups == 0:
+            return 0.0
+        return self.stats['hits'] / lookups
+
+    @staticmethod
+    def key(template_id, text0, text1):
+        "Return the cache key for the given meme content"
+        content = json.dumps([template_id, text0, text1])
+        return sha256(content.encode()).hexdigest()
+
+    def get(self, template_id, text0, text1):
+        """
+        Return (img_url, img_bytes) for the given meme content. img_bytes is
+        None if only the URL has been cached, and both are None if neither
+        has.
+        """
+        key = self.key(template_id, text0, text1)
+        img_url = self._read_url(key)
+        with self._lock:
+            if key in self._index:
+                try:
+                    with open(self._path(key, 'img'), 'rb') as f:
+                        img_bytes = BytesIO(f.read())
+                except FileNotFoundError:
+                    self._reindex(key)
+                else:
+                    self._index.move_to_end(key)
+                    self.stats['hits'] += 1
+                    os.utime(self._path(key, 'img'))
+                    return (img_url, img_bytes)
+            if img_url is not None:
+                self.stats['url_hits'] += 1
+                if key in self._index:
+                    self._index.move_to_end(key)
+                    os.utime(self._path(key, 'url'))
+            self.stats['misses'] += 1
+        return (img_url, None)
+
+    def put(self, template_id, text0, text1, img_url=None, img_bytes=None):
+        "Cache the image URL and/or image bytes for the given meme content"
+        key = self.key(template_id, text0, text1)
+        if img_url is not None:
+            with open(self._path(key, 'url'), 'w') as f:
+                f.write(img_url)
+        if img_bytes is not None:
+            img_bytes.seek(0)
+            path = self._path(key, 'img')
+            with open(path + '.part', 'wb') as f:
+                shutil.copyfileobj(img_bytes, f, CHUNK_SIZE)
+            img_bytes.seek(0)
+            os.replace(path + '.part', path)
+        if img_url is None and img_bytes is None:
+            return
+        with self._lock:
+            self._reindex(key)
+            self._evict()
+
+    def _path(self, key, ext):
+        return os.path.join(self.cache_dir, f'{key}.{ext}')
+
+    def _read_url(self, key):
+        try:
+            with open(self._path(key, 'url')) as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def _load_index(self):
+        "Index the images and URLs already on disk, least recently used first"
+        entries = {}
+        for name in os.listdir(self.cache_dir):
+            key, ext = os.path.splitext(name)
+            if ext in ('.img', '.url'):
+                st = os.stat(os.path.join(self.cache_dir, name))
+                mtime, size = entries.get(key, (0, 0))
+                entries[key] = (max(mtime, st.st_mtime), size + st.st_size)
+        for key, (mtime, size) in sorted(
+                entries.items(), key=lambda item: item[1][0]):
+            self._index[key] = size
+            self._size += size
+        self._evict()
+
+    def _reindex(self, key):
+        "Update the size of key's entry from the files on disk"
+        self._forget(key)
+        size = 0
+        for ext in ('img', 'url'):
+            try:
+                size += os.stat(self._path(key, ext)).st_size
+            except FileNotFoundError:
+                pass
+        if size:
+            self._index[key] = size
+            self._size += size
+
+    def _forget(self, key):
+        size = self._index.pop(key, None)
+        if size is not None:
+            self._size -= size
+
+    def _evict(self):
+        while self._size > self.max_bytes and self._index:
+            key, size = self._index.popitem(last=False)
+            self._size -= size
+            self.stats['evictions'] += 1
+            for ext in ('img', 'url'):
+                try:
+                    os.remove(self._path(key, ext))
+                except FileNotFoundError:
+                    pass
@@ -0,0 +1,87 @@
+import re
+import random
+from collections import namedtuple
+
+from .memes import TEMPLATES, QUESTION_POOL, STATEMENT_POOL
+
+
+Rule = namedtuple('Rule', ('meme', 'pattern', 'strip'))
+Rule.__doc__ = """
+A title classification rule: titles matching the regular expression pattern
+(from the start of the title, case-insensitive) use the meme template. If
+strip is True, the matched text is removed from the title.
+"""
+
+DEFAULT_RULES = (
+    Rule('IS_THIS_A_PIGEON', r'is this ', strip=True),
+    Rule('WELL_YES_BUT_ACTUALLY_NO', r'.*possible.*\?\Z', strip=False),
+    Rule('DR_EVIL_LASER', r'[^"]*"[^"]*"[^"]*\Z', strip=False),
+    Rule('PHILOSORAPTOR', r'if.*\?\Z', strip=False),
+)
+
+
+class TitleClassifier:
+    """
+    Chooses meme templates for question titles using a list of rules, tried
+    in order, compiled into a single regular expression. Titles which don't
+    match any rule get a random template suitable for a question or a
+    statement.
+
+    :type rules: list
+    :param rules: List of :class:`Rule` (defaults to :data:`DEFAULT_RULES`)
+    """
+    def __init__(self, rules=DEFAULT_RULES):
+        self.rules = list(rules)
+        self._compile()
+
+    def __repr__(self):
+        return f"<TitleClassifier rules={len(self.rules)}>"
+
+    def add_rule(self, rule, index=None):
+        """
+        Add a rule, at the given index in the order rules are tried (by
+        default, after the existing rules)
+        """
+        if index is None:
+            index = len(self.rules)
+        self.rules.insert(index, rule)
+        self._compile()
+
+    def _compile(self):
+        for rule in self.rules:
+            if rule.meme not in TEMPLATES:
+                raise ValueError(f"Unknown meme template: {rule.meme}")
+        # alternatives are tried in order at the start of the title, so the
+        # first rule which matches wins; rules which don't strip their match
+        # are lookaheads so they consume nothing
+        alternatives = [
+            f'(?P<r{i}>{rule.pattern})' if rule.strip else
+            f'(?P<r{i}>(?={rule.pattern}))'
+            for i, rule in enumerate(self.rules)
+        ]
+        self._regex = re.compile('|'.join(alternatives), re.I | re.S)
+        self._groups = {f'r{i}': rule for i, rule in enumerate(self.rules)}
+
+    def classify(self, title, rng=random):
+        """
+        Return (meme_name, text_parts) for the given title. rng is the random
+        number generator to choose templates with.
+        """
+        match = self._regex.match(title)
+        if match is None:
+            pool = QUESTION_POOL if title.endswith('?') else STATEMENT_POOL
+            meme = rng.choice(pool)
+        else:
+            rule = self._groups[match.lastgroup]
+            meme = rule.meme
+            if rule.strip:
+                title = title[match.end():]
+        return (meme, TEMPLATES[meme].place_text(title))
+
+    def classify_many(self, titles, rng=random):
+        "Return a list of (meme_name, text_parts) for each of the given titles"
+        classify = self.classify
+        return [classify(title, rng) for title in titles]
+
+
+DEFAULT_CLASSIFIER = TitleClassifier()
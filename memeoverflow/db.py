@@ -1,4 +1,64 @@
+import json
 import sqlite3
+import threading
+from time import monotonic, time
+from functools import wraps
+from collections import namedtuple, OrderedDict
+
+from .bloom import BloomFilter
+from .metrics import NULL_COLLECTOR
+from .utils import CHUNK_SIZE
+
+
+# stay well below sqlite's limit on the number of variables in a query
+MAX_QUERY_VARIABLES = 500
+
+# the stages a question goes through, in order, as recorded in the outbox
+OUTBOX_STATES = ('fetched', 'rendered', 'downloaded', 'tweeted')
+
+# outbox columns which can be set along with the state
+OUTBOX_FIELDS = ('meme', 'text0', 'text1', 'img_url', 'img', 'tweet_id')
+
+OutboxEntry = namedtuple('OutboxEntry', (
+    'question_id', 'state', 'question', 'meme', 'text0', 'text1', 'img_url',
+    'img', 'tweet_id',
+))
+OutboxEntry.__doc__ = """
+A question's progress through the bot, as recorded in the outbox: its state
+(one of :data:`OUTBOX_STATES`), the question as returned by the API, and what
+the completed stages produced - the meme template and text, the image URL,
+the image itself (until it's tweeted) and the tweet ID
+"""
+
+
+def connect(db_path, wal=False, busy_timeout=5000):
+    """
+    Open a connection to the sqlite database file at db_path. With wal=True,
+    use write-ahead logging so readers and writers (in other threads or
+    processes) don't block each other, and wait up to busy_timeout
+    milliseconds for a lock rather than failing with "database is locked".
+    WAL connections may be closed from a thread other than the one using
+    them.
+    """
+    conn = sqlite3.connect(
+        db_path, timeout=busy_timeout / 1000, check_same_thread=not wal
+    )
+    if wal:
+        conn.execute("pragma journal_mode=wal")
+        conn.execute("pragma synchronous=normal")
+        conn.execute(f"pragma busy_timeout={int(busy_timeout)}")
+    return conn
+
+
+def _timed(op):
+    "Decorate a MemeDatabase method to record how long it takes"
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with self.metrics.timer('memeoverflow_db_seconds', op=op):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorator
 
 
 class MemeDatabase:
@@ -12,15 +72,105 @@ class MemeDatabase:
 
     :type db_path: str
     :param db_path: Path to the sqlite database file
+
+    :type conn: sqlite3.Connection or None
+    :param conn:
+        Existing connection to use instead of opening db_path (optional) -
+        pass a shared connection to keep several sites in one database
+
+    :type cache_size: int or None
+    :param cache_size:
+        If provided, keep known question IDs in memory: a Bloom filter of all
+        IDs (loaded at startup) and an LRU of this many recently confirmed
+        IDs, so most lookups don't need to query the database
+
+    :type wal: bool
+    :param wal:
+        If True, use write-ahead logging and open a separate connection for
+        each thread, so the database can be shared between threads and
+        processes (ignored if conn is provided)
+
+    :type busy_timeout: int
+    :param busy_timeout:
+        Milliseconds to wait for another writer's lock before giving up
+
+    :type batch_size: int or None
+    :param batch_size:
+        If provided, buffer inserted question IDs and write them in a single
+        transaction once this many are pending
+
+    :type batch_interval: float or None
+    :param batch_interval:
+        If provided, buffer inserted question IDs and write them once the
+        oldest has been pending for this many seconds (checked whenever the
+        database is used). Pending IDs are always written on :meth:`flush`
+        and :meth:`close`, and are reported as known straight away.
+
+    :type metrics: Collector or None
+    :param metrics:
+        Collector to record metrics with, see
+        :class:`~memeoverflow.metrics.MetricsCollector` (optional)
     """
-    def __init__(self, site, db_path):
+    def __init__(self, site, db_path, conn=None, cache_size=None, wal=False,
+                 busy_timeout=5000, batch_size=None, batch_interval=None,
+                 metrics=None):
         self.site = site
-        self.conn = sqlite3.connect(db_path)
+        self.metrics = NULL_COLLECTOR if metrics is None else metrics
+        self.db_path = db_path
+        self.wal = wal and conn is None
+        self.busy_timeout = busy_timeout
+        self._lock = threading.RLock()
+        self._local = threading.local()
+        self._connections = []
+        if conn is not None:
+            self._conn = conn
+        elif self.wal:
+            self._conn = None
+        else:
+            self._conn = connect(db_path, busy_timeout=busy_timeout)
+            self._connections.append(self._conn)
         cursor = self.conn.cursor()
         cursor.execute(
             f"create table if not exists {site} (question_id int unique)"
         )
+        cursor.execute(
+            "create table if not exists cursors "
+            "(site text primary key, creation_date int, question_id int)"
+        )
+        cursor.execute(
+            "create table if not exists outbox "
+            "(site text, question_id int, state text, question text, "
+            "meme text, text0 text, text1 text, img_url text, img blob, "
+            "tweet_id text, updated int, primary key (site, question_id))"
+        )
+        # a question may have been tweeted just before the process stopped,
+        # without being added to the site table
+        cursor.execute(
+            f"insert or ignore into {site} select question_id from outbox "
+            f"where site = ? and state = 'tweeted'",
+            (site, )
+        )
+        cursor.execute(
+            "delete from outbox where site = ? and state = 'tweeted'",
+            (site, )
+        )
+        self.conn.commit()
         cursor.close()
+        self.cache_size = cache_size
+        self.cache_stats = {
+            'bloom_negatives': 0,
+            'lru_hits': 0,
+            'db_hits': 0,
+            'false_positives': 0,
+        }
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self._pending = {}
+        self._pending_since = None
+        self._bloom = None
+        self._lru = OrderedDict()
+        if cache_size is not None:
+            self._load_bloom()
 
     def __repr__(self):
         return f"<MemeDatabase site='{self.site}'>"
@@ -29,20 +179,139 @@ class MemeDatabase:
         return self
 
     def __exit__(self, *args):
-        pass
+        self.close()
 
+    @property
+    def conn(self):
+        """
+        The sqlite connection to use from the current thread. In WAL mode,
+        each thread gets its own connection.
+        """
+        if self._conn is not None:
+            return self._conn
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = connect(self.db_path, wal=True,
+                           busy_timeout=self.busy_timeout)
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def close(self):
+        """
+        Write any pending question IDs and close the connections opened by
+        this object (a connection passed in is left open for its owner to
+        close)
+        """
+        self.flush()
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
+
+    @property
+    def batching(self):
+        "True if inserts are buffered and written in batches"
+        return self.batch_size is not None or self.batch_interval is not None
+
+    @_timed('insert')
     def insert_question(self, id):
         "Insert a question ID"
+        if self.batching:
+            with self._lock:
+                if not self._pending:
+                    self._pending_since = monotonic()
+                self._pending[id] = True
+            self._maybe_flush()
+        else:
+            cursor = self.conn.cursor()
+            cursor.execute(f"insert into {self.site} values (?)", (id, ))
+            # the question is finished with, so its outbox entry goes in the
+            # same transaction
+            cursor.execute(
+                "delete from outbox where site = ? and question_id = ?",
+                (self.site, id)
+            )
+            self.conn.commit()
+            cursor.close()
+        if self._bloom is not None:
+            with self._lock:
+                self._add_to_bloom(id)
+                self._remember(id)
+
+    def get_cursor(self):
+        """
+        Return (creation_date, question_id) of the newest question seen on
+        this site, or None if the site hasn't been polled yet
+        """
         cursor = self.conn.cursor()
-        cursor.execute(f"insert into {self.site} values (?)", (id, ))
+        cursor.execute(
+            "select creation_date, question_id from cursors where site = ?",
+            (self.site, )
+        )
+        result = cursor.fetchone()
+        cursor.close()
+        return result
+
+    def set_cursor(self, creation_date, question_id):
+        "Record the newest question seen on this site"
+        cursor = self.conn.cursor()
+        cursor.execute(
+            "insert or replace into cursors values (?, ?, ?)",
+            (self.site, creation_date, question_id)
+        )
         self.conn.commit()
         cursor.close()
 
+    @_timed('flush')
+    def flush(self):
+        "Write any pending question IDs to the database in one transaction"
+        with self._lock:
+            ids = list(self._pending)
+            if not ids:
+                return
+            cursor = self.conn.cursor()
+            cursor.executemany(
+                f"insert or ignore into {self.site} values (?)",
+                [(id, ) for id in ids]
+            )
+            cursor.executemany(
+                "delete from outbox where site = ? and question_id = ?",
+                [(self.site, id) for id in ids]
+            )
+            self.conn.commit()
+            cursor.close()
+            for id in ids:
+                del self._pending[id]
+            self._pending_since = None
+
+    def _maybe_flush(self):
+        "Flush pending question IDs if the batch size or interval is reached"
+        pending = len(self._pending)
+        if not pending:
+            return
+        if self.batch_size is not None and pending >= self.batch_size:
+            self.flush()
+        elif (self.batch_interval is not None and
+                monotonic() - self._pending_since >= self.batch_interval):
+            self.flush()
+
+    @_timed('lookup')
     def question_is_known(self, id):
         """
         Return True if the provided question ID is already in the database,
         otherwise return False
         """
+        if self._pending:
+            self._maybe_flush()
+            if id in self._pending:
+                return True
+        if self._bloom is not None:
+            unsure, known = self._check_cache([id])
+            if not unsure:
+                return bool(known)
         cursor = self.conn.cursor()
         cursor.execute(
             f"select 1 from {self.site} where question_id = ?",
@@ -50,4 +319,212 @@ class MemeDatabase:
         )
         result = bool(cursor.fetchone())
         cursor.close()
+        if self._bloom is not None:
+            self._record_lookup([id], {id} if result else set())
         return result
+
+    @_timed('lookup_many')
+    def known_ids(self, ids):
+        """
+        Return the set of the provided question IDs which are already in the
+        database, looked up in as few queries as possible
+        """
+        ids = list(ids)
+        known = set()
+        if self._pending:
+            self._maybe_flush()
+            with self._lock:
+                known = {id for id in ids if id in self._pending}
+            ids = [id for id in ids if id not in known]
+        if self._bloom is not None:
+            ids, cached = self._check_cache(ids)
+            known |= cached
+        found = set()
+        cursor = self.conn.cursor()
+        for i in range(0, len(ids), MAX_QUERY_VARIABLES):
+            chunk = ids[i:i + MAX_QUERY_VARIABLES]
+            placeholders = ', '.join('?' * len(chunk))
+            cursor.execute(
+                f"select question_id from {self.site} "
+                f"where question_id in ({placeholders})",
+                chunk
+            )
+            found.update(row[0] for row in cursor.fetchall())
+        cursor.close()
+        if self._bloom is not None:
+            self._record_lookup(ids, found)
+        return known | found
+
+    def filter_unknown(self, ids):
+        """
+        Return a list of the provided question IDs which are not already in
+        the database, preserving their order
+        """
+        ids = list(ids)
+        known = self.known_ids(ids)
+        return [id for id in ids if id not in known]
+
+    def outbox_add(self, questions):
+        """
+        Record the given questions (as returned by the API) in the outbox as
+        fetched, unless they're there already
+        """
+        now = int(time())
+        cursor = self.conn.cursor()
+        cursor.executemany(
+            "insert or ignore into outbox (site, question_id, state, "
+            "question, updated) values (?, ?, 'fetched', ?, ?)",
+            [
+                (self.site, q['question_id'], json.dumps(q), now)
+                for q in questions
+            ]
+        )
+        self.conn.commit()
+        cursor.close()
+
+    def outbox_update(self, id, state, **fields):
+        """
+        Move a question in the outbox on to the given state, setting any of
+        the fields in :data:`OUTBOX_FIELDS`. img may be a file-like object,
+        which is streamed into the database where sqlite supports it.
+        """
+        if state not in OUTBOX_STATES:
+            raise ValueError(f"Unknown outbox state: {state}")
+        unknown = set(fields) - set(OUTBOX_FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown outbox fields: {', '.join(unknown)}")
+        img = fields.get('img')
+        stream = hasattr(img, 'read') and hasattr(self.conn, 'blobopen')
+        if hasattr(img, 'read'):
+            img.seek(0)
+            if stream:
+                # reserve the space, and fill it in once the row is updated
+                img.seek(0, 2)
+                fields['img'] = img.tell()
+                img.seek(0)
+            else:
+                fields['img'] = img.read()
+                img.seek(0)
+        columns = ''.join(
+            f", {name} = zeroblob(?)" if stream and name == 'img'
+            else f", {name} = ?"
+            for name in fields
+        )
+        cursor = self.conn.cursor()
+        cursor.execute(
+            f"update outbox set state = ?, updated = ?{columns} "
+            f"where site = ? and question_id = ?",
+            (state, int(time()), *fields.values(), self.site, id)
+        )
+        if stream and cursor.rowcount:
+            cursor.execute(
+                "select rowid from outbox where site = ? and question_id = ?",
+                (self.site, id)
+            )
+            rowid = cursor.fetchone()[0]
+            with self.conn.blobopen('outbox', 'img', rowid) as blob:
+                for chunk in iter(lambda: img.read(CHUNK_SIZE), b''):
+                    blob.write(chunk)
+            img.seek(0)
+        self.conn.commit()
+        cursor.close()
+
+    def outbox_get(self, id):
+        "Return the question's :class:`OutboxEntry`, or None"
+        cursor = self.conn.cursor()
+        cursor.execute(
+            "select question_id, state, question, meme, text0, text1, "
+            "img_url, img, tweet_id from outbox "
+            "where site = ? and question_id = ?",
+            (self.site, id)
+        )
+        row = cursor.fetchone()
+        cursor.close()
+        if row is not None:
+            return _outbox_entry(row)
+
+    def outbox_unfinished(self):
+        """
+        Return a list of the :class:`OutboxEntry` of every question in the
+        outbox which hasn't been tweeted, in the order they were fetched
+        """
+        cursor = self.conn.cursor()
+        cursor.execute(
+            "select question_id, state, question, meme, text0, text1, "
+            "img_url, img, tweet_id from outbox "
+            "where site = ? and state != 'tweeted' order by rowid",
+            (self.site, )
+        )
+        entries = [_outbox_entry(row) for row in cursor.fetchall()]
+        cursor.close()
+        return entries
+
+    def outbox_remove(self, id):
+        "Remove a question from the outbox"
+        cursor = self.conn.cursor()
+        cursor.execute(
+            "delete from outbox where site = ? and question_id = ?",
+            (self.site, id)
+        )
+        self.conn.commit()
+        cursor.close()
+
+    def _check_cache(self, ids):
+        """
+        Split ids using the in-memory cache. Return (ids which need checking
+        in the database, set of ids known from the LRU).
+        """
+        unsure = []
+        known = set()
+        with self._lock:
+            for id in ids:
+                if id not in self._bloom:
+                    self.cache_stats['bloom_negatives'] += 1
+                elif id in self._lru:
+                    self.cache_stats['lru_hits'] += 1
+                    self._lru.move_to_end(id)
+                    known.add(id)
+                else:
+                    unsure.append(id)
+        return (unsure, known)
+
+    def _record_lookup(self, ids, found):
+        "Update the cache with the result of looking up ids in the database"
+        with self._lock:
+            self.cache_stats['db_hits'] += len(found)
+            self.cache_stats['false_positives'] += len(set(ids) - found)
+            for id in found:
+                self._remember(id)
+
+    def _load_bloom(self, capacity=None):
+        "Build the Bloom filter from all question IDs in the table"
+        cursor = self.conn.cursor()
+        if capacity is None:
+            cursor.execute(f"select count(*) from {self.site}")
+            capacity = max(cursor.fetchone()[0] * 2, 1000)
+        bloom = BloomFilter(capacity)
+        cursor.execute(f"select question_id from {self.site}")
+        for (id, ) in cursor:
+            bloom.add(id)
+        cursor.close()
+        for id in self._pending:
+            bloom.add(id)
+        self._bloom = bloom
+
+    def _add_to_bloom(self, id):
+        if len(self._bloom) >= self._bloom.capacity:
+            # filter is full, so rebuild it bigger to keep false positives low
+            self._load_bloom(capacity=self._bloom.capacity * 2)
+        else:
+            self._bloom.add(id)
+
+    def _remember(self, id):
+        self._lru[id] = True
+        self._lru.move_to_end(id)
+        if len(self._lru) > self.cache_size:
+            self._lru.popitem(last=False)
+
+
+def _outbox_entry(row):
+    question_id, state, question, *rest = row
+    return OutboxEntry(question_id, state, json.loads(question), *rest)
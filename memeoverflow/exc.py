@@ -7,9 +7,15 @@ class ImgFlipError(MemeOverflowError):
 class TwitterError(MemeOverflowError):
     "Error raised in the Twitter class"
 
+class TwitterDuplicateError(TwitterError):
+    "Error raised when Twitter refuses a status as a duplicate of a recent one"
+
 class StackExchangeError(MemeOverflowError):
     "Error raised in the StackExchange class"
 
+class RenderError(MemeOverflowError):
+    "Error raised in the LocalRenderer class"
+
 class MemeOverflowWarning(Warning):
     "Module base warning"
 
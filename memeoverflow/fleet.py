@@ -0,0 +1,110 @@
+import heapq
+from time import sleep, monotonic
+
+from logzero import logger
+
+from .memeoverflow import MemeOverflow
+from .db import connect
+from .http import make_session
+from .profiling import default_profiler
+
+
+class MemeOverflowFleet:
+    """
+    Run the :class:`MemeOverflow` pipelines for many Stack Exchange sites in
+    one process, sharing one database connection and one HTTP session, with
+    each site tweeting at its own cadence.
+
+    :type sites: list
+    :param sites:
+        List of site config dicts. Expected keys: twitter, imgflip,
+        stackexchange (as passed to :class:`MemeOverflow`). Optional keys:
+        tweet_interval, poll_interval, retry_interval, max_attempts,
+        max_pending, cache_size, batch_size, batch_interval (also as passed
+        to :class:`MemeOverflow`)
+
+    :type db_path: str
+    :param db_path:
+        Path to the sqlite database file shared by all sites
+
+    :type metrics: Collector or None
+    :param metrics:
+        Collector to record every site's metrics with, see
+        :class:`~memeoverflow.metrics.MetricsCollector` (optional)
+
+    :type profiler: Profiler or None
+    :param profiler:
+        Profiler to wrap each cycle of the main loop in, see
+        :class:`~memeoverflow.profiling.Profiler` (optional) - by default,
+        the process's profiler if the profiling environment variables are set
+    """
+    def __init__(self, sites, db_path, metrics=None, profiler=None):
+        if profiler is None:
+            profiler = default_profiler()
+        self.profiler = profiler
+        self.conn = connect(db_path, wal=True)
+        self.session = make_session()
+        self.bots = []
+        self._queue = []
+        for i, config in enumerate(sites):
+            config = dict(config)
+            bot = MemeOverflow(
+                twitter=config.pop('twitter'),
+                imgflip=config.pop('imgflip'),
+                stackexchange=config.pop('stackexchange'),
+                db_path=db_path,
+                session=self.session,
+                conn=self.conn,
+                metrics=metrics,
+                profiler=profiler,
+                **config
+            )
+            self.bots.append(bot)
+            heapq.heappush(self._queue, (monotonic(), i))
+
+    def __repr__(self):
+        return f"<MemeOverflowFleet sites={len(self.bots)}>"
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        "Write every site's batched question IDs and close the database"
+        for bot in self.bots:
+            bot.close()
+        self.conn.close()
+
+    def __call__(self):
+        """
+        Main loop - run the next due site, then sleep until another site is
+        due
+        """
+        if self.profiler is None:
+            delay = self.step()
+        else:
+            with self.profiler.cycle():
+                delay = self.step()
+        if delay > 0:
+            sleep(delay)
+
+    def step(self):
+        """
+        Run the site which is due soonest (see :meth:`MemeOverflow.step`).
+        Return the number of seconds until the next site is due.
+        """
+        due, i = heapq.heappop(self._queue)
+        now = monotonic()
+        if due > now:
+            heapq.heappush(self._queue, (due, i))
+            return due - now
+        try:
+            delay = self.bots[i].step()
+        except Exception as e:
+            # don't let one site's failure stop the others
+            logger.exception(e)
+            delay = self.bots[i].scheduler.poll_interval
+        heapq.heappush(self._queue, (monotonic() + delay, i))
+        return max(0, self._queue[0][0] - monotonic())
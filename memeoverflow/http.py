@@ -0,0 +1,103 @@
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+# (connect, read) timeouts in seconds
+DEFAULT_TIMEOUT = (5, 30)
+
+# keep-alive connections to keep open per host
+DEFAULT_POOL_SIZES = {
+    'api.stackexchange.com': 4,
+    'api.imgflip.com': 4,
+    'i.imgflip.com': 4,
+}
+
+_default_session = None
+_default_session_lock = threading.Lock()
+
+
+class Session(requests.Session):
+    """
+    :class:`requests.Session` which applies a default timeout to every
+    request
+
+    :type timeout: float or tuple
+    :param timeout: Default (connect, read) timeout in seconds
+    """
+    def __init__(self, timeout=DEFAULT_TIMEOUT):
+        super().__init__()
+        self.timeout = timeout
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        return super().request(method, url, **kwargs)
+
+
+def make_adapter(pool_maxsize=10, retries=3, backoff_factor=0.5):
+    """
+    Return an :class:`~requests.adapters.HTTPAdapter` keeping up to
+    pool_maxsize keep-alive connections per host, retrying failed
+    connections and 5xx responses to idempotent requests
+    """
+    retry = Retry(
+        total=retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=(500, 502, 503, 504),
+        raise_on_status=False,
+    )
+    return HTTPAdapter(
+        pool_connections=len(DEFAULT_POOL_SIZES) + 1,
+        pool_maxsize=pool_maxsize,
+        max_retries=retry,
+    )
+
+
+def make_session(pool_sizes=None, pool_maxsize=10, retries=3,
+                 backoff_factor=0.5, timeout=DEFAULT_TIMEOUT):
+    """
+    Return a new :class:`Session` with keep-alive connection pools,
+    retries and timeouts, to be shared between the API clients
+
+    :type pool_sizes: dict or None
+    :param pool_sizes:
+        Mapping of host name to number of connections to keep open for it
+        (defaults to :data:`DEFAULT_POOL_SIZES`)
+
+    :type pool_maxsize: int
+    :param pool_maxsize: Number of connections to keep open for other hosts
+
+    :type retries: int
+    :param retries: Number of times to retry a failed request
+
+    :type backoff_factor: float
+    :param backoff_factor: Factor for the exponential delay between retries
+
+    :type timeout: float or tuple
+    :param timeout: Default (connect, read) timeout in seconds
+    """
+    if pool_sizes is None:
+        pool_sizes = DEFAULT_POOL_SIZES
+    session = Session(timeout=timeout)
+    session.mount('https://', make_adapter(pool_maxsize, retries,
+                                           backoff_factor))
+    session.mount('http://', make_adapter(pool_maxsize, retries,
+                                          backoff_factor))
+    for host, size in pool_sizes.items():
+        session.mount(f'https://{host}/', make_adapter(size, retries,
+                                                       backoff_factor))
+    return session
+
+
+def default_session():
+    """
+    Return the session shared by all clients which aren't given one,
+    creating it on first use
+    """
+    global _default_session
+    with _default_session_lock:
+        if _default_session is None:
+            _default_session = make_session()
+        return _default_session
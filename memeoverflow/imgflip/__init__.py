@@ -1,11 +1,12 @@
 from time import sleep
 from json import JSONDecodeError
 
-import requests
 from requests.exceptions import RequestException
 
-from .memes import MEMES
+from ..memes import MEMES, TEMPLATES
 from ..exc import ImgFlipError
+from ..http import default_session
+from ..metrics import NULL_COLLECTOR
 
 
 API_URL = 'https://api.imgflip.com/caption_image'
@@ -20,10 +21,27 @@ class ImgFlip:
     
     :type password: str
     :param password: imgflip account password
+
+    :type session: requests.Session or None
+    :param session:
+        HTTP session to make requests with (optional) - defaults to the
+        session shared by all clients
+
+    :type api_url: str
+    :param api_url: URL of the caption_image API endpoint
+
+    :type metrics: Collector or None
+    :param metrics:
+        Collector to record metrics with, see
+        :class:`~memeoverflow.metrics.MetricsCollector` (optional)
     """
-    def __init__(self, *, username, password):
+    def __init__(self, *, username, password, session=None, api_url=API_URL,
+                 metrics=None):
         self._username = username
         self._password = password
+        self._http = default_session() if session is None else session
+        self.api_url = api_url
+        self.metrics = NULL_COLLECTOR if metrics is None else metrics
 
     def __repr__(self):
         return f"<ImgFlip username='{self.username}'>"
@@ -37,14 +55,18 @@ class ImgFlip:
         data = {
             'username': self._username,
             'password': self._password,
-            'template_id': MEMES[meme]['id'],
+            'template_id': TEMPLATES[meme].id,
             'text0': text_parts[0],
             'text1': text_parts[1],
         }
-        r = requests.post(API_URL, data=data)
         try:
+            with self.metrics.timer('memeoverflow_request_seconds',
+                                    api='imgflip'):
+                r = self._http.post(self.api_url, data=data)
             r.raise_for_status()
             img_url = r.json()['data']['url']
             return img_url
         except (RequestException, JSONDecodeError, KeyError) as e:
+            self.metrics.inc('memeoverflow_request_errors_total',
+                             api='imgflip')
             raise ImgFlipError("Failed to make meme") from e
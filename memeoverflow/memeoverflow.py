@@ -1,17 +1,33 @@
 import random
 from time import sleep
 import html
-import copy
+from io import BytesIO
+from collections import namedtuple, deque, OrderedDict
 
 from logzero import logger
 from requests.exceptions import RequestException
 
 from .stackexchange import StackExchange
 from .db import MemeDatabase
-from .imgflip import ImgFlip, MEMES
+from .imgflip import ImgFlip
+from .memes import TEMPLATES
+from .classify import DEFAULT_CLASSIFIER
 from .twitter import Twitter
-from .utils import tags_to_hashtags, download_image_bytes
-from .exc import ImgFlipError, TwitterError, StackExchangeError
+from .utils import download_image_bytes
+from .status import compose_status
+from .http import default_session
+from .scheduler import Scheduler
+from .metrics import NULL_COLLECTOR
+from .profiling import default_profiler
+from .exc import (
+    ImgFlipError, TwitterError, TwitterDuplicateError, StackExchangeError,
+    RenderError,
+)
+
+
+PreparedMeme = namedtuple(
+    'PreparedMeme', ('question_id', 'title', 'status', 'meme', 'img_bytes')
+)
 
 
 class MemeOverflow:
@@ -23,9 +39,10 @@ class MemeOverflow:
     :param twitter:
         Expected keys: con_key, con_sec, acc_tok, acc_sec (Twitter API keys)
 
-    :type imgflip: dict
+    :type imgflip: dict or None
     :param imgflip:
-        Expected keys: user, pass (imgflip account)
+        Expected keys: user, pass (imgflip account) - not needed if a
+        renderer is provided
 
     :type stackexchange: dict
     :param stackexchange:
@@ -35,50 +52,386 @@ class MemeOverflow:
     :type db_path: str
     :param db_path:
         Path to the sqlite database file
+
+    :type session: requests.Session or None
+    :param session:
+        HTTP session shared by the Stack Exchange and imgflip clients and
+        image downloads (optional) - see :func:`~memeoverflow.http.make_session`
+
+    :type conn: sqlite3.Connection or None
+    :param conn: Existing database connection to use (optional)
+
+    :type cache_size: int or None
+    :param cache_size:
+        If provided, keep known question IDs in memory, see
+        :class:`~memeoverflow.db.MemeDatabase`
+
+    :type wal: bool
+    :param wal:
+        If True, open the database in write-ahead logging mode (ignored if
+        conn is provided)
+
+    :type batch_size: int or None
+    :param batch_size:
+        If provided, write tweeted question IDs to the database in batches of
+        this many
+
+    :type batch_interval: float or None
+    :param batch_interval:
+        If provided, write tweeted question IDs to the database once the
+        oldest has been waiting for this many seconds
+
+    :type tweet_interval: float
+    :param tweet_interval: Seconds to wait after a successful tweet
+
+    :type poll_interval: float
+    :param poll_interval:
+        Minimum seconds between Stack Exchange polls (longer if needed to
+        spread the API quota across the day)
+
+    :type retry_interval: float
+    :param retry_interval:
+        Seconds to wait after a failed question before trying the next one
+        (backing off for longer after several failures in a row)
+
+    :type max_attempts: int
+    :param max_attempts: Number of times to try each question before giving up
+
+    :type max_pending: int
+    :param max_pending:
+        Maximum number of questions waiting to be tweeted - when more arrive
+        than can be tweeted, the oldest are skipped
+
+    :type renderer: object or None
+    :param renderer:
+        Object to make memes with instead of the imgflip API, e.g.
+        :class:`~memeoverflow.render.LocalRenderer` (optional)
+
+    :type image_cache: ImageCache or None
+    :param image_cache:
+        Cache of generated images to avoid making the same meme twice, see
+        :class:`~memeoverflow.cache.ImageCache` (optional)
+
+    :type prefetch: int
+    :param prefetch:
+        Number of pending questions to make memes for in advance, while
+        waiting to be allowed to tweet
+
+    :type classifier: TitleClassifier or None
+    :param classifier:
+        Rules for choosing meme templates for titles, see
+        :class:`~memeoverflow.classify.TitleClassifier` (optional)
+
+    :type metrics: Collector or None
+    :param metrics:
+        Collector to record the bot's metrics with, labelled with the site
+        name, see :class:`~memeoverflow.metrics.MetricsCollector` (optional)
+
+    :type profiler: Profiler or None
+    :param profiler:
+        Profiler to wrap each cycle of the main loop in, see
+        :class:`~memeoverflow.profiling.Profiler` (optional) - by default,
+        the process's profiler if the profiling environment variables are set
+        (see :func:`~memeoverflow.profiling.default_profiler`)
+
+    :type outbox: bool
+    :param outbox:
+        If True, record each question's progress in the database's outbox, so
+        that after a restart the bot carries on from the last stage each
+        question completed rather than repeating or losing work
+
+    :type outbox_images: bool
+    :param outbox_images:
+        If True, also store each downloaded image in the outbox until it's
+        tweeted, so it isn't downloaded again after a restart (by default,
+        only the image URL is stored)
     """
-    def __init__(self, twitter, imgflip, stackexchange, db_path):
+    def __init__(self, twitter, imgflip, stackexchange, db_path, *,
+                 session=None, conn=None, cache_size=None, wal=False,
+                 batch_size=None, batch_interval=None, tweet_interval=60*5,
+                 poll_interval=60*5, retry_interval=0, max_attempts=3,
+                 max_pending=100,
+                 renderer=None, image_cache=None, prefetch=0,
+                 classifier=None, metrics=None, profiler=None, outbox=True,
+                 outbox_images=False):
         self.site = stackexchange['site']
-        self.stackexchange = StackExchange(**stackexchange)
-        self.imgflip = ImgFlip(**imgflip)
-        self.twitter = Twitter(**twitter)
-        self.db = MemeDatabase(site=self.site, db_path=db_path)
+        if metrics is None:
+            metrics = NULL_COLLECTOR
+        self.metrics = metrics.bind(site=self.site)
+        self.session = default_session() if session is None else session
+        self.stackexchange = StackExchange(
+            **stackexchange, session=self.session, metrics=self.metrics
+        )
+        if renderer is None:
+            self.imgflip = ImgFlip(
+                **imgflip, session=self.session, metrics=self.metrics
+            )
+        else:
+            self.imgflip = renderer
+        self.twitter = Twitter(**twitter, metrics=self.metrics)
+        self.db_options = {
+            'cache_size': cache_size,
+            'wal': wal,
+            'batch_size': batch_size,
+            'batch_interval': batch_interval,
+        }
+        self.db = MemeDatabase(
+            site=self.site, db_path=db_path, conn=conn, metrics=self.metrics,
+            **self.db_options
+        )
+        self.scheduler = Scheduler(
+            tweet_interval=tweet_interval,
+            poll_interval=poll_interval,
+            retry_interval=retry_interval,
+        )
+        self.max_attempts = max_attempts
+        self.max_pending = max_pending
+        self.image_cache = image_cache
+        self.prefetch = prefetch
+        if classifier is None:
+            classifier = DEFAULT_CLASSIFIER
+        self.classifier = classifier
+        self.pending = deque()
+        self.ready = OrderedDict()
+        self.prefetch_stats = {
+            'rendered': 0,
+            'used': 0,
+            'discarded': 0,
+        }
+        self._attempts = {}
+        if profiler is None:
+            profiler = default_profiler()
+        self.profiler = profiler
+        self.outbox = outbox
+        self.outbox_images = outbox_images
+        if outbox:
+            self.resume()
 
     def __repr__(self):
         return f"<MemeOverflow site='{self.site}'>"
 
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        "Write any batched question IDs and close the database"
+        self.db.close()
+
     def __call__(self):
         """
-        Main loop - get questions, make memes and tweet them, with sensible
-        pauses
+        Main loop - get questions, make memes and tweet them, then sleep until
+        the next poll or tweet is due
+        """
+        if self.profiler is None:
+            delay = self.step()
+        else:
+            with self.profiler.cycle():
+                delay = self.step()
+        self.metrics.set('memeoverflow_sleep_seconds', max(delay, 0))
+        if delay > 0:
+            sleep(delay)
+
+    def step(self):
         """
-        questions = self.get_se_questions()
+        Poll for new questions if a poll is due, and tweet the next pending
+        question if a tweet is allowed, otherwise make memes for the next
+        pending questions in advance. Return the number of seconds until
+        there's more to do.
+        """
+        if self.scheduler.poll_due():
+            self.poll()
+        if self.pending and self.scheduler.tweet_due():
+            self.tweet_next()
+        if self.prefetch and not self.scheduler.tweet_due():
+            self.prefetch_memes()
+        self.metrics.set('memeoverflow_queue_depth', len(self.pending),
+                         queue='pending')
+        self.metrics.set('memeoverflow_queue_depth', len(self.ready),
+                         queue='ready')
+        return self.scheduler.time_until_next(pending=bool(self.pending))
+
+    def poll(self):
+        "Add any new questions to the pending queue"
+        backoff = self.stackexchange.governor.backoff_remaining
+        if backoff > 0:
+            # the API asked for a backoff (perhaps to another site using the
+            # same key), so postpone the poll rather than wait for it
+            self.scheduler.polled(backoff)
+            return
+        with self.metrics.timer('memeoverflow_stage_seconds', stage='poll'):
+            questions = self.get_se_questions()
         if questions:
-            for q in questions:
-                tweeted = self.generate_meme_and_tweet(q)
-                if tweeted:
-                    sleep(60*5)
-                else:
-                    sleep(60)
+            queued = {q['question_id'] for q in self.pending}
+            new = [q for q in questions if q['question_id'] not in queued]
+            self.pending.extend(new)
+            skipped = self.trim_pending()
+            if self.outbox:
+                self.db.outbox_add(
+                    q for q in new if q['question_id'] not in skipped
+                )
+                for id in skipped & queued:
+                    self.db.outbox_remove(id)
+        if self.ready:
+            # another process may have tweeted these in the meantime
+            for id in self.db.known_ids(self.ready):
+                self._discard_ready(id)
+        self.scheduler.polled(self.stackexchange.governor.poll_interval(
+            minimum=self.scheduler.poll_interval
+        ))
+
+    def tweet_next(self):
+        """
+        Make and tweet a meme for the next pending question. If it fails, put
+        the question back at the end of the queue, unless it's been tried
+        max_attempts times. Return True on success, False on fail.
+        """
+        question = self.pending.popleft()
+        id = question['question_id']
+        prepared = self.ready.pop(id, None)
+        if prepared is None:
+            tweeted = self.generate_meme_and_tweet(question)
+        else:
+            self.prefetch_stats['used'] += 1
+            tweeted = self.tweet_prepared(prepared)
+        self.scheduler.tweeted(tweeted)
+        if tweeted:
+            self._attempts.pop(id, None)
         else:
-            sleep(60*5)
+            if self.record_failure(id):
+                self.pending.append(question)
+                if prepared is not None:
+                    # keep the meme rather than making it again
+                    self.ready[id] = prepared
+            self.metrics.inc('memeoverflow_tweets_failed_total')
+        return tweeted
+
+    def record_failure(self, id):
+        """
+        Count a failed attempt at question id. Return True if it should be
+        tried again, or False if it's been tried max_attempts times and has
+        been given up on.
+        """
+        attempts = self._attempts.get(id, 0) + 1
+        if attempts < self.max_attempts:
+            self._attempts[id] = attempts
+            return True
+        logger.info(f"Giving up on question {id}")
+        self._attempts.pop(id, None)
+        if self.outbox:
+            self.db.outbox_remove(id)
+        return False
+
+    def resume(self):
+        """
+        Queue the questions a previous run fetched but didn't tweet, to carry
+        on from the last stage each one completed
+        """
+        entries = self.db.outbox_unfinished()
+        if not entries:
+            return
+        known = self.db.known_ids(entry.question_id for entry in entries)
+        queued = {q['question_id'] for q in self.pending}
+        for entry in entries:
+            if entry.question_id in known:
+                # tweeted by a previous run or another process
+                self.db.outbox_remove(entry.question_id)
+            elif entry.question_id not in queued:
+                self.pending.append(entry.question)
+        for id in self.trim_pending():
+            self.db.outbox_remove(id)
+        logger.info(f"Resuming {len(self.pending)} questions")
+
+    def trim_pending(self):
+        """
+        Skip the oldest pending questions if there are more than max_pending.
+        Return the set of IDs skipped. Polls carry on from the newest
+        question, so skipped questions aren't fetched again.
+        """
+        excess = len(self.pending) - self.max_pending
+        if excess <= 0:
+            return set()
+        oldest = sorted(
+            self.pending,
+            key=lambda q: (q.get('creation_date', 0), q['question_id'])
+        )[:excess]
+        skipped = {q['question_id'] for q in oldest}
+        self.pending = deque(
+            q for q in self.pending if q['question_id'] not in skipped
+        )
+        for id in skipped:
+            self._discard_ready(id)
+            self._attempts.pop(id, None)
+        self.metrics.inc('memeoverflow_questions_skipped_total', excess)
+        logger.info(f"Skipping {excess} older questions")
+        return skipped
+
+    def prefetch_memes(self):
+        """
+        Make memes for up to prefetch of the next pending questions, ready to
+        tweet as soon as it's allowed
+        """
+        for question in list(self.pending)[:self.prefetch]:
+            id = question['question_id']
+            if id in self.ready:
+                continue
+            prepared = self.prepare_meme(question)
+            if prepared is not None:
+                self.ready[id] = prepared
+                self.prefetch_stats['rendered'] += 1
+        pending = {q['question_id'] for q in self.pending}
+        for id in list(self.ready):
+            if id not in pending:
+                self._discard_ready(id)
+
+    def _discard_ready(self, id):
+        "Throw away a meme made in advance which won't be used"
+        if self.ready.pop(id, None) is not None:
+            self.prefetch_stats['discarded'] += 1
 
     def get_se_questions(self, n=100):
         """
-        Retreive n questions from the StackExchange site and return as a list,
+        Retreive questions created since the last poll (or the latest n on the
+        first poll) from the StackExchange site and return as a list,
         filtering out any known questions.
         """
         try:
-            questions = self.stackexchange.get_questions(n=n)
+            questions = self.stackexchange.get_questions(
+                n=n, since=self.get_poll_since()
+            )
         except StackExchangeError as e:
             logger.exception(e)
             return
-        return [
-            q
-            for q in questions
-            if not self.db.question_is_known(q['question_id'])
-        ]
+        known = self.db.known_ids(q['question_id'] for q in questions)
+        self.update_poll_cursor(questions)
+        self.count_questions(len(questions), len(known))
+        return [q for q in questions if q['question_id'] not in known]
+
+    def count_questions(self, fetched, known):
+        "Record the numbers of questions fetched and already known"
+        self.metrics.inc('memeoverflow_questions_fetched_total', fetched)
+        self.metrics.inc('memeoverflow_questions_known_total', known)
+        self.metrics.inc('memeoverflow_questions_new_total', fetched - known)
 
-    def choose_meme_template(self, text):
+    def get_poll_since(self):
+        "Return the creation date to poll for new questions from, or None"
+        cursor = self.db.get_cursor()
+        if cursor is not None:
+            return cursor[0]
+
+    def update_poll_cursor(self, questions):
+        "Record the newest of the given questions as the site's poll cursor"
+        dated = [q for q in questions if 'creation_date' in q]
+        if not dated:
+            return
+        newest = max((q['creation_date'], q['question_id']) for q in dated)
+        cursor = self.db.get_cursor()
+        if cursor is None or newest > tuple(cursor):
+            self.db.set_cursor(*newest)
+
+    def choose_meme_template(self, text, rng=random):
         """
         Choose a meme for the supplied text. If the text fits one of the
         templates well, it will use that one, otherwise it will be random. If
@@ -86,52 +439,19 @@ class MemeOverflow:
         called again. Some templates move text to the second row or add their
         own second row of text to complete the meme.
 
+        rng is the random number generator to choose templates with. The
+        rules are those of the bot's :class:`~memeoverflow.classify.TitleClassifier`.
+
         Return (meme_name, text_parts)
         """
-        if text.lower().startswith("is this "):
-            meme = 'IS_THIS_A_PIGEON'
-            text = text[8:]
-        elif 'possible' in text.lower() and text.endswith('?'):
-            meme = 'WELL_YES_BUT_ACTUALLY_NO'
-        elif text.count('"') == 2:
-            meme = 'DR_EVIL_LASER'
-        elif text.lower().startswith('if') and text.endswith('?'):
-            meme = 'PHILOSORAPTOR'
-        else:
-            # don't allow these to be picked at random
-            special_memes = {
-                'IS_THIS_A_PIGEON',
-                'WELL_YES_BUT_ACTUALLY_NO',
-                'DR_EVIL_LASER',
-                'PHILOSORAPTOR',
-            }
-            if text.endswith('?'):
-                special_memes |= {
-                    'BUT_THATS_NONE_OF_MY_BUSINESS',
-                    'CHANGE_MY_MIND',
-                    'ANCIENT_ALIENS',
-                    'AND_EVERYBODY_LOSES_THEIR_MINDS',
-                }
-            else:
-                special_memes |= {
-                    'GRUMPY_CAT',
-                }
-            meme = random.choice(list(set(MEMES.keys()) - special_memes))
-
-        text_parts = self.place_text(meme, text)
-
-        return (meme, text_parts)
+        return self.classifier.classify(text, rng=rng)
 
     def place_text(self, meme, text):
         """
         Decide where the given text should go on the given meme template, including any
         template-specific text. Return a 2-tuple of strings.
         """
-        meme_dict = copy.deepcopy(MEMES[meme])
-        text_location = meme_dict['text_location']
-        meme_dict[text_location] = text
-
-        return (meme_dict['text0'], meme_dict['text1'])
+        return TEMPLATES[meme].place_text(text)
 
     def generate_meme_and_tweet(self, question):
         """
@@ -141,34 +461,154 @@ class MemeOverflow:
         - add to database
         Return True on success, False on fail or question was known
         """
-        question_title = html.unescape(question['title'])
-        question_url = self.stackexchange.get_question_url(question['link'])
-        question_id = question['question_id']
-        tags = tags_to_hashtags(question['tags'])
-        status = f"{question_title} {question_url} {tags}"
-
-        if len(status) > 240:
-            status = f"{question_title} {question_url}"
-            logger.info("Tweet too long - removing tags")
-        meme, text_parts = self.choose_meme_template(question_title)
-        try:
-            img_url = self.imgflip.make_meme(meme=meme, text_parts=text_parts)
-        except ImgFlipError as e:
-            logger.exception(e)
+        prepared = self.prepare_meme(question)
+        if prepared is None:
             return False
+        return self.tweet_prepared(prepared)
 
-        try:
-            img_bytes = download_image_bytes(img_url)
-        except RequestException:
-            logger.exception("Failed to download image")
+    def tweet_prepared(self, prepared):
+        """
+        Tweet a prepared meme and add its question to the database. Return
+        True on success, False on fail.
+        """
+        if not self.tweet_meme(prepared):
             return False
+        self.db.insert_question(prepared.question_id)
+        return True
+
+    def make_status(self, question):
+        """
+        Return (question_title, status) for the given question, including as
+        many of its tags as will fit in a tweet
+        """
+        question_title = html.unescape(question['title'])
+        question_url = self.stackexchange.get_question_url(question['link'])
+        status = compose_status(question_title, question_url, question['tags'])
+        return (question_title, status)
 
+    def prepare_meme(self, question):
+        """
+        Generate the meme image and status for the given question, ready to be
+        tweeted. Return a :class:`PreparedMeme`, or None on failure.
+        """
+        question_title, status = self.make_status(question)
+        id = question['question_id']
+        entry = None
+        if self.outbox:
+            entry = self.db.outbox_get(id)
+            if entry is None:
+                self.db.outbox_add([question])
+        if entry is not None and entry.meme is not None:
+            # carry on with the meme a previous attempt chose
+            meme, text_parts = entry.meme, (entry.text0, entry.text1)
+        else:
+            if self.image_cache is None:
+                rng = random
+            else:
+                # choose the same template for the same title so retries and
+                # repeats can be found in the cache
+                rng = random.Random(question_title)
+            meme, text_parts = self.choose_meme_template(
+                question_title, rng=rng
+            )
+        if entry is not None and entry.img is not None:
+            img_bytes = BytesIO(entry.img)
+        else:
+            with self.metrics.timer('memeoverflow_stage_seconds',
+                                    stage='render'):
+                img_bytes = self.render_meme(
+                    meme, text_parts,
+                    question_id=id if self.outbox else None,
+                    img_url=None if entry is None else entry.img_url,
+                )
+        if img_bytes is None:
+            return
+        self.metrics.inc('memeoverflow_memes_rendered_total')
+        return PreparedMeme(id, question_title, status, meme, img_bytes)
+
+    def render_meme(self, meme, text_parts, question_id=None, img_url=None):
+        """
+        Make the meme image (using the image cache if there is one) and return
+        its contents, or None on failure. If img_url is given, the meme has
+        already been made and only needs downloading. If question_id is
+        given, the meme's progress is recorded in the question's outbox
+        entry.
+        """
+        if self.image_cache is not None:
+            template_id = TEMPLATES[meme].id
+            cached_url, img_bytes = self.image_cache.get(
+                template_id, *text_parts
+            )
+            if img_bytes is not None:
+                return img_bytes
+            if img_url is None:
+                img_url = cached_url
+
+        if img_url is None:
+            try:
+                img = self.imgflip.make_meme(meme=meme, text_parts=text_parts)
+            except (ImgFlipError, RenderError) as e:
+                logger.exception(e)
+                return
+            if isinstance(img, str):
+                # imgflip returns the URL of the image rather than the image
+                img_url = img
+                if self.image_cache is not None:
+                    self.image_cache.put(template_id, *text_parts,
+                                         img_url=img_url)
+                if question_id is not None:
+                    self.db.outbox_update(
+                        question_id, 'rendered', meme=meme,
+                        text0=text_parts[0], text1=text_parts[1],
+                        img_url=img_url,
+                    )
+            else:
+                img_bytes = img
+
+        if img_url is not None:
+            try:
+                with self.metrics.timer('memeoverflow_request_seconds',
+                                        api='imgflip_image'):
+                    img_bytes = download_image_bytes(
+                        img_url, session=self.session
+                    )
+            except RequestException:
+                self.metrics.inc('memeoverflow_request_errors_total',
+                                 api='imgflip_image')
+                logger.exception("Failed to download image")
+                return
+
+        if self.image_cache is not None:
+            self.image_cache.put(template_id, *text_parts, img_bytes=img_bytes)
+        if question_id is not None and self.outbox_images:
+            self.db.outbox_update(
+                question_id, 'downloaded', meme=meme, text0=text_parts[0],
+                text1=text_parts[1], img_url=img_url, img=img_bytes,
+            )
+        return img_bytes
+
+    def tweet_meme(self, prepared):
+        "Tweet a prepared meme. Return True on success, False on fail."
         try:
-            self.twitter.tweet_with_image(status, img_bytes)
-            logger.info(f"Tweeted: {question_title} [{meme}]")
-        except TwitterError:
+            with self.metrics.timer('memeoverflow_stage_seconds',
+                                    stage='tweet'):
+                tweet_id = self.twitter.tweet_with_image(
+                    prepared.status, prepared.img_bytes
+                )
+            logger.info(f"Tweeted: {prepared.title} [{prepared.meme}]")
+        except TwitterDuplicateError:
+            # an earlier attempt was tweeted but the process stopped before
+            # it was recorded
+            logger.info(f"Already tweeted: {prepared.title}")
+            tweet_id = None
+        except TwitterError as e:
             logger.exception(e)
             return False
-
-        self.db.insert_question(question_id)
+        if self.outbox:
+            self.db.outbox_update(
+                prepared.question_id, 'tweeted',
+                tweet_id=None if tweet_id is None else str(tweet_id),
+                img=None,
+            )
+        self.metrics.inc('memeoverflow_tweets_total')
         return True
@@ -0,0 +1,367 @@
+"""
+Instrumentation for the bot: counters, gauges and latency histograms,
+recorded through a pluggable :class:`Collector` and optionally exposed in the
+Prometheus text format by :class:`MetricsServer`.
+"""
+import threading
+from time import monotonic
+from bisect import bisect_left
+from functools import lru_cache
+
+
+# (type, help) of each metric recorded by the bot
+METRICS = {
+    'memeoverflow_stage_seconds': (
+        'histogram', "Time taken by each stage of the bot's cycle"),
+    'memeoverflow_request_seconds': (
+        'histogram', "Time taken by requests to each remote API"),
+    'memeoverflow_request_errors_total': (
+        'counter', "Failed requests to each remote API"),
+    'memeoverflow_db_seconds': (
+        'histogram', "Time taken by database operations"),
+    'memeoverflow_questions_fetched_total': (
+        'counter', "Questions fetched from Stack Exchange"),
+    'memeoverflow_questions_new_total': (
+        'counter', "Fetched questions which hadn't been seen before"),
+    'memeoverflow_questions_known_total': (
+        'counter', "Fetched questions which were already in the database"),
+    'memeoverflow_questions_skipped_total': (
+        'counter', "New questions skipped as too many were waiting"),
+    'memeoverflow_memes_rendered_total': (
+        'counter', "Meme images made or downloaded"),
+    'memeoverflow_tweets_total': (
+        'counter', "Memes tweeted"),
+    'memeoverflow_tweets_failed_total': (
+        'counter', "Failed attempts to make and tweet a meme"),
+    'memeoverflow_queue_depth': (
+        'gauge', "Number of items waiting in each queue"),
+    'memeoverflow_sleep_seconds': (
+        'gauge', "Length of the last sleep between cycles"),
+    'memeoverflow_stackexchange_quota_remaining': (
+        'gauge', "Stack Exchange API requests left today"),
+}
+
+# upper bounds of the histogram buckets, in seconds
+DEFAULT_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, float('inf')
+)
+
+
+class Collector:
+    """
+    Base class for metrics collectors. Subclasses override :meth:`inc`,
+    :meth:`set` and :meth:`observe` to record metrics, e.g. to forward them
+    to another monitoring system; this class records nothing.
+    """
+    def __repr__(self):
+        return f"<{self.__class__.__name__}>"
+
+    def inc(self, name, value=1, **labels):
+        "Increase the counter name by value"
+
+    def set(self, name, value, **labels):
+        "Set the gauge name to value"
+
+    def observe(self, name, value, **labels):
+        "Record value in the histogram name"
+
+    def timer(self, name, **labels):
+        """
+        Return a context manager which records the time taken by its body in
+        the histogram name
+        """
+        return _Timer(self, name, labels)
+
+    def bind(self, **labels):
+        "Return a collector which adds the given labels to every metric"
+        return BoundCollector(self, labels)
+
+
+class NullCollector(Collector):
+    "Collector which does nothing, as cheaply as possible"
+    def timer(self, name, **labels):
+        return _NULL_TIMER
+
+    def bind(self, **labels):
+        return self
+
+
+class BoundCollector(Collector):
+    """
+    Collector which adds labels to every metric and passes it on to another
+    collector (see :meth:`Collector.bind`)
+    """
+    def __init__(self, collector, labels):
+        self.collector = collector
+        self.labels = labels
+
+    def __repr__(self):
+        return (
+            f"<BoundCollector labels={self.labels} "
+            f"collector={self.collector}>"
+        )
+
+    def inc(self, name, value=1, **labels):
+        self.collector.inc(name, value, **{**self.labels, **labels})
+
+    def set(self, name, value, **labels):
+        self.collector.set(name, value, **{**self.labels, **labels})
+
+    def observe(self, name, value, **labels):
+        self.collector.observe(name, value, **{**self.labels, **labels})
+
+    def bind(self, **labels):
+        return BoundCollector(self.collector, {**self.labels, **labels})
+
+
+class MetricsCollector(Collector):
+    """
+    Collector which keeps metrics in memory, to be read with :meth:`get` or
+    exported with :meth:`exposition`. Thread-safe.
+
+    :type buckets: tuple
+    :param buckets: Upper bounds of the histogram buckets, in seconds
+    """
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        buckets = tuple(buckets)
+        if buckets[-1] != float('inf'):
+            buckets += (float('inf'), )
+        self.buckets = buckets
+        self._types = {}
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return f"<MetricsCollector metrics={len(self._types)}>"
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._types.setdefault(name, 'counter')
+            self._values[key] = self._values.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._types.setdefault(name, 'gauge')
+            self._values[key] = value
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        bucket = bisect_left(self.buckets, value)
+        with self._lock:
+            self._types.setdefault(name, 'histogram')
+            try:
+                histogram = self._values[key]
+            except KeyError:
+                histogram = self._values[key] = _Histogram(len(self.buckets))
+            histogram.counts[bucket] += 1
+            histogram.sum += value
+            histogram.count += 1
+
+    def get(self, name, **labels):
+        """
+        Return the value of a counter or gauge, or (count, sum) of a
+        histogram, with exactly the given labels (or None if there isn't one)
+        """
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            value = self._values.get(key)
+            if isinstance(value, _Histogram):
+                return (value.count, value.sum)
+            return value
+
+    def total(self, name, **labels):
+        """
+        Return the sum of a counter or gauge over all label values, or of the
+        number of observations of a histogram, for metrics which have the
+        given labels
+        """
+        wanted = set(labels.items())
+        total = 0
+        with self._lock:
+            for (metric, metric_labels), value in self._values.items():
+                if metric == name and wanted <= set(metric_labels):
+                    if isinstance(value, _Histogram):
+                        value = value.count
+                    total += value
+        return total
+
+    def exposition(self):
+        "Return the metrics in the Prometheus text exposition format"
+        with self._lock:
+            values = sorted(
+                (
+                    (key, value.copy())
+                    if isinstance(value, _Histogram) else (key, value)
+                    for key, value in self._values.items()
+                ),
+                key=lambda item: item[0],
+            )
+            types = dict(self._types)
+        lines = []
+        described = set()
+        for (name, labels), value in values:
+            if name not in described:
+                described.add(name)
+                help = METRICS.get(name, (None, ''))[1]
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {types[name]}")
+            if isinstance(value, _Histogram):
+                cumulative = 0
+                for bound, count in zip(self.buckets, value.counts):
+                    cumulative += count
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    bucket_labels = _format_labels(labels + (('le', le), ))
+                    lines.append(f"{name}_bucket{bucket_labels} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {value.sum}")
+                lines.append(
+                    f"{name}_count{_format_labels(labels)} {value.count}"
+                )
+            else:
+                lines.append(f"{name}{_format_labels(labels)} {value}")
+        return '\n'.join(lines) + '\n'
+
+
+class MetricsServer:
+    """
+    HTTP server exposing a :class:`MetricsCollector`'s metrics at
+    ``/metrics`` for Prometheus to scrape, run in a background thread
+
+    :type collector: MetricsCollector
+    :param collector: Collector to expose
+
+    :type host: str
+    :param host: Address to listen on (by default, only local connections)
+
+    :type port: int
+    :param port: Port to listen on
+    """
+    def __init__(self, collector, host='127.0.0.1', port=9100):
+        from http.server import ThreadingHTTPServer
+
+        self.collector = collector
+        self._server = ThreadingHTTPServer((host, port), _metrics_handler())
+        self._server.daemon_threads = True
+        self._server.collector = collector
+        self._thread = None
+
+    def __repr__(self):
+        return f"<MetricsServer url='{self.url}'>"
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    @property
+    def url(self):
+        "Return the URL of the metrics endpoint"
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}/metrics'
+
+    def start(self):
+        "Start serving metrics in a background thread, and return self"
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self):
+        "Stop the server"
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+NULL_COLLECTOR = NullCollector()
+
+
+class _Histogram:
+    __slots__ = ('counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self.counts = [0] * buckets
+        self.sum = 0
+        self.count = 0
+
+    def copy(self):
+        histogram = _Histogram(0)
+        histogram.counts = list(self.counts)
+        histogram.sum = self.sum
+        histogram.count = self.count
+        return histogram
+
+
+class _Timer:
+    __slots__ = ('collector', 'name', 'labels', 'start')
+
+    def __init__(self, collector, name, labels):
+        self.collector = collector
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = monotonic()
+        return self
+
+    def __exit__(self, *exc):
+        self.collector.observe(
+            self.name, monotonic() - self.start, **self.labels
+        )
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+_NULL_TIMER = _NullTimer()
+
+
+@lru_cache(maxsize=None)
+def _metrics_handler():
+    # http.server is only imported when a server is started, as collectors
+    # are used by everything
+    from http.server import BaseHTTPRequestHandler
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = self.server.collector.exposition().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return MetricsHandler
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    pairs = ','.join(
+        f'{name}="{_escape(str(value))}"' for name, value in labels
+    )
+    return f'{{{pairs}}}'
+
+
+def _escape(value):
+    return (
+        value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    )
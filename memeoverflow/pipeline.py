@@ -0,0 +1,249 @@
+import asyncio
+from functools import partial
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
+
+from logzero import logger
+
+from .memeoverflow import MemeOverflow
+from .db import MemeDatabase
+from .exc import StackExchangeError
+
+
+class AsyncMemeOverflow(MemeOverflow):
+    """
+    Asyncio version of :class:`MemeOverflow` which runs the pipeline as
+    concurrent stages joined by bounded queues: polling Stack Exchange,
+    rendering and downloading memes, and tweeting them. Memes for later
+    questions are rendered while waiting for the cooldown before the next
+    tweet. Network calls run in a thread pool, and the poll and tweet
+    stages' database calls run in a dedicated thread. The render and tweet
+    workers record each question's progress in the outbox from the thread
+    pool, so with the outbox the database is opened in WAL mode, which gives
+    each thread its own connection.
+
+    Takes the same arguments as :class:`MemeOverflow` except conn (the
+    pipeline opens its own connections) and prefetch (it always renders
+    ahead, see queue_size). max_pending limits the number of questions in
+    the pipeline at once: the oldest newly polled questions are skipped
+    rather than go over it. Also takes:
+
+    :type renderers: int
+    :param renderers: Number of concurrent render/download workers
+
+    :type queue_size: int
+    :param queue_size:
+        Maximum number of questions waiting to be rendered, and of rendered
+        memes waiting to be tweeted
+    """
+    def __init__(self, twitter, imgflip, stackexchange, db_path, *,
+                 renderers=2, queue_size=10, **kwargs):
+        if kwargs.get('conn') is not None:
+            raise ValueError(
+                "AsyncMemeOverflow opens its own database connections, so "
+                "can't use conn"
+            )
+        if kwargs.get('prefetch'):
+            raise ValueError(
+                "AsyncMemeOverflow always renders ahead (see queue_size), so "
+                "can't use prefetch"
+            )
+        super().__init__(twitter, imgflip, stackexchange, db_path, **kwargs)
+        # the pipeline opens its own connection in its database thread, so
+        # close this one in the thread that opened it
+        self.db.close()
+        self.db_path = db_path
+        self.renderers = renderers
+        self.queue_size = queue_size
+        self._in_flight = set()
+        self._retries = set()
+
+    def __repr__(self):
+        return f"<AsyncMemeOverflow site='{self.site}'>"
+
+    def run(self, max_tweets=None):
+        "Run the pipeline until max_tweets have been tweeted (or forever)"
+        asyncio.run(self.run_async(max_tweets=max_tweets))
+
+    async def run_async(self, max_tweets=None):
+        """
+        Run the pipeline stages concurrently until max_tweets have been
+        tweeted (or forever)
+        """
+        loop = asyncio.get_running_loop()
+        self._io = ThreadPoolExecutor(max_workers=self.renderers + 2)
+        self._db_executor = ThreadPoolExecutor(max_workers=1)
+        # sqlite connections can only be used in the thread that created them,
+        # and the outbox is written to from the render and tweet workers too,
+        # so they need the per-thread connections of WAL mode
+        db_options = dict(self.db_options)
+        db_options['wal'] = db_options['wal'] or self.outbox
+        self.db = await loop.run_in_executor(
+            self._db_executor,
+            partial(MemeDatabase, self.site, self.db_path,
+                    metrics=self.metrics, **db_options)
+        )
+        questions = asyncio.Queue(maxsize=self.queue_size)
+        ready = asyncio.Queue(maxsize=self.queue_size)
+        workers = [asyncio.ensure_future(self._poller(questions))]
+        workers += [
+            asyncio.ensure_future(self._renderer(questions, ready))
+            for i in range(self.renderers)
+        ]
+        tweeter = asyncio.ensure_future(self._tweeter(ready, max_tweets))
+        try:
+            # the other stages run forever, so if one finishes it has failed
+            # and the pipeline would stall waiting for it
+            done, running = await asyncio.wait(
+                workers + [tweeter], return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                if not task.cancelled() and task.exception() is not None:
+                    logger.error(
+                        f"Pipeline stage failed, stopping: {task.exception()!r}"
+                    )
+                task.result()
+        finally:
+            tasks = workers + [tweeter] + list(self._retries)
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            self._io.shutdown(wait=True)
+            await loop.run_in_executor(self._db_executor, self.db.close)
+            self._db_executor.shutdown(wait=True)
+
+    async def _run_io(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._io, func, *args)
+
+    async def _run_db(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._db_executor, func, *args)
+
+    async def _failed(self, id, queue, item):
+        """
+        Count a failed attempt at question id, and put item back on queue
+        after the retry interval unless the question has been given up on.
+        Polls only return questions newer than the cursor, so a question
+        which isn't retried here is never seen again.
+        """
+        self.metrics.inc('memeoverflow_tweets_failed_total')
+        if await self._run_db(self.record_failure, id):
+            # requeue from a separate task, as the stage which failed may be
+            # the only one taking items off the queue
+            task = asyncio.ensure_future(self._requeue(queue, item))
+            self._retries.add(task)
+            task.add_done_callback(self._retries.discard)
+        else:
+            self._in_flight.discard(id)
+
+    async def _requeue(self, queue, item):
+        await asyncio.sleep(self.scheduler.retry_interval)
+        await queue.put(item)
+
+    async def _poller(self, questions):
+        "Stage 1: poll for new questions and queue them for rendering"
+        # questions resumed from the outbox go first
+        while self.pending:
+            q = self.pending.popleft()
+            self._in_flight.add(q['question_id'])
+            await questions.put(q)
+        while True:
+            backoff = self.stackexchange.governor.backoff_remaining
+            if backoff > 0:
+                await asyncio.sleep(backoff)
+                continue
+            since = await self._run_db(self.get_poll_since)
+            try:
+                fetched = await self._run_io(
+                    self.stackexchange.get_questions, 100, since
+                )
+            except StackExchangeError as e:
+                logger.exception(e)
+                fetched = []
+            known = await self._run_db(
+                self.db.known_ids, [q['question_id'] for q in fetched]
+            )
+            await self._run_db(self.update_poll_cursor, fetched)
+            self.count_questions(len(fetched), len(known))
+            new = [
+                q for q in fetched
+                if q['question_id'] not in known
+                and q['question_id'] not in self._in_flight
+            ]
+            skipped = self._skip_excess(new)
+            new = [q for q in new if q['question_id'] not in skipped]
+            if self.outbox:
+                await self._run_db(self.db.outbox_add, new)
+            for q in new:
+                self._in_flight.add(q['question_id'])
+                await questions.put(q)
+                self.metrics.set('memeoverflow_queue_depth', questions.qsize(),
+                                 queue='questions')
+            self.scheduler.polled(self.stackexchange.governor.poll_interval(
+                minimum=self.scheduler.poll_interval
+            ))
+            await asyncio.sleep(self.scheduler.time_until_poll())
+
+    def _skip_excess(self, new):
+        """
+        Skip the oldest of the new questions which would take the number in
+        the pipeline over max_pending. Return the set of IDs skipped.
+        """
+        excess = len(self._in_flight) + len(new) - self.max_pending
+        if excess <= 0:
+            return set()
+        oldest = sorted(
+            new, key=lambda q: (q.get('creation_date', 0), q['question_id'])
+        )[:excess]
+        self.metrics.inc('memeoverflow_questions_skipped_total', len(oldest))
+        logger.info(f"Skipping {len(oldest)} older questions")
+        return {q['question_id'] for q in oldest}
+
+    async def _renderer(self, questions, ready):
+        "Stage 2: render and download memes for queued questions"
+        while True:
+            q = await questions.get()
+            self.metrics.set('memeoverflow_queue_depth', questions.qsize(),
+                             queue='questions')
+            prepared = await self._run_io(self.prepare_meme, q)
+            if prepared is None:
+                await self._failed(q['question_id'], questions, q)
+            else:
+                await ready.put(prepared)
+                self.metrics.set('memeoverflow_queue_depth', ready.qsize(),
+                                 queue='ready')
+
+    async def _tweeter(self, ready, max_tweets):
+        "Stage 3: tweet rendered memes, respecting the cooldown"
+        tweets = 0
+        while max_tweets is None or tweets < max_tweets:
+            # each tweet is a cycle for the profiler, which sees the work done
+            # by every stage in the event loop meanwhile (but not in threads)
+            if self.profiler is None:
+                cycle = nullcontext()
+            else:
+                cycle = self.profiler.cycle()
+            with cycle:
+                if await self._tweet_next(ready):
+                    tweets += 1
+
+    async def _tweet_next(self, ready):
+        "Tweet the next rendered meme. Return True on success, False on fail."
+        prepared = await ready.get()
+        self.metrics.set('memeoverflow_queue_depth', ready.qsize(),
+                         queue='ready')
+        delay = self.scheduler.time_until_tweet()
+        self.metrics.set('memeoverflow_sleep_seconds', max(delay, 0))
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tweeted = await self._run_io(self.tweet_meme, prepared)
+        if tweeted:
+            await self._run_db(self.db.insert_question, prepared.question_id)
+            self._attempts.pop(prepared.question_id, None)
+            self._in_flight.discard(prepared.question_id)
+        else:
+            # keep the meme rather than making it again
+            await self._failed(prepared.question_id, ready, prepared)
+        self.scheduler.tweeted(tweeted)
+        return tweeted
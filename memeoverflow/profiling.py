@@ -0,0 +1,305 @@
+"""
+Opt-in profiling of a running bot: cProfile over a number of cycles of the
+main loop, and tracemalloc snapshots diffed between cycles to find leaks.
+
+Enable it in a :class:`~memeoverflow.MemeOverflow` process with environment
+variables:
+
+``MEMEOVERFLOW_PROFILE``
+    Number of cycles to profile, starting straight away (0 to wait for a
+    signal). Also installs the signal handlers.
+
+``MEMEOVERFLOW_TRACEMALLOC``
+    Number of cycles between tracemalloc snapshots, starting straight away.
+    Also installs the signal handlers.
+
+``MEMEOVERFLOW_PROFILE_DIR``
+    Directory to write results to (defaults to the temporary directory).
+
+Once the signal handlers are installed, ``kill -USR1 <pid>`` profiles the
+next cycles and ``kill -USR2 <pid>`` turns tracemalloc snapshots on or off.
+Each process has one profiler (see :func:`default_profiler`), shared by all the
+bots in it; in worker processes, signal each worker's pid.
+"""
+import os
+import signal
+import pstats
+import cProfile
+import tempfile
+import threading
+import tracemalloc
+from time import strftime
+
+from logzero import logger
+
+
+PROFILE_ENV = 'MEMEOVERFLOW_PROFILE'
+TRACEMALLOC_ENV = 'MEMEOVERFLOW_TRACEMALLOC'
+PROFILE_DIR_ENV = 'MEMEOVERFLOW_PROFILE_DIR'
+
+_default_profiler = None
+_default_profiler_pid = None
+_default_profiler_lock = threading.Lock()
+
+
+class Profiler:
+    """
+    Profiles cycles of a bot's main loop when asked to. Each profiling run
+    covers a number of cycles, and is written as a pstats file, a text
+    summary of the slowest functions, and collapsed stacks for flamegraph
+    tools (see :func:`write_collapsed`). While tracing is on, a tracemalloc
+    snapshot is taken every few cycles and its difference from the previous
+    one is written as text.
+
+    :type output_dir: str or None
+    :param output_dir:
+        Directory to write results to (defaults to the temporary directory)
+
+    :type cycles: int
+    :param cycles: Number of cycles to profile in each run
+
+    :type snapshot_interval: int
+    :param snapshot_interval: Number of cycles between tracemalloc snapshots
+
+    :type top: int
+    :param top: Number of functions or lines to list in the text summaries
+
+    :type frames: int
+    :param frames: Number of frames of traceback tracemalloc keeps
+    """
+    def __init__(self, output_dir=None, cycles=100, snapshot_interval=10,
+                 top=30, frames=10):
+        if output_dir is None:
+            output_dir = tempfile.gettempdir()
+        self.output_dir = output_dir
+        self.cycles = cycles
+        self.snapshot_interval = snapshot_interval
+        self.top = top
+        self.frames = frames
+        self.runs = 0
+        self.snapshots = 0
+        self._requested = 0
+        self._remaining = 0
+        self._profile = None
+        self._tracing = False
+        self._started_tracemalloc = False
+        self._toggle_tracing = False
+        self._cycles_since_snapshot = 0
+        self._last_snapshot = None
+        os.makedirs(output_dir, exist_ok=True)
+
+    def __repr__(self):
+        return (
+            f"<Profiler profiling={self.profiling} tracing={self._tracing}>"
+        )
+
+    @classmethod
+    def from_env(cls, environ=os.environ):
+        """
+        Return a profiler configured by the environment variables (and with
+        its signal handlers installed), or None if they aren't set
+        """
+        profile = environ.get(PROFILE_ENV)
+        trace = environ.get(TRACEMALLOC_ENV)
+        if profile is None and trace is None:
+            return
+        profiler = cls(output_dir=environ.get(PROFILE_DIR_ENV))
+        if profile:
+            profiler.request(int(profile))
+        if trace:
+            profiler.snapshot_interval = int(trace)
+            profiler.toggle_tracing()
+        profiler.install_signal_handlers()
+        return profiler
+
+    @property
+    def profiling(self):
+        "True if cycles are being profiled"
+        return self._profile is not None
+
+    def request(self, cycles=None):
+        "Profile the next cycles cycles (by default, :attr:`cycles`)"
+        self._requested = self.cycles if cycles is None else cycles
+
+    def toggle_tracing(self):
+        "Turn tracemalloc snapshots on or off, from the next cycle"
+        self._toggle_tracing = True
+
+    def install_signal_handlers(self, profile_signal='SIGUSR1',
+                                trace_signal='SIGUSR2'):
+        """
+        Make profile_signal start a profiling run and trace_signal toggle
+        tracemalloc snapshots. Only possible in the main thread, on platforms
+        with the signals.
+        """
+        if threading.current_thread() is not threading.main_thread():
+            return
+        for name, handler in (
+            (profile_signal, lambda signum, frame: self.request()),
+            (trace_signal, lambda signum, frame: self.toggle_tracing()),
+        ):
+            signum = getattr(signal, name, None)
+            if signum is not None:
+                signal.signal(signum, handler)
+
+    def cycle(self):
+        "Return a context manager to wrap one cycle of the main loop in"
+        return self
+
+    def __enter__(self):
+        self._before_cycle()
+        return self
+
+    def __exit__(self, *exc):
+        self._after_cycle()
+
+    def _before_cycle(self):
+        # signal handlers only set flags; the work happens between cycles
+        if self._toggle_tracing:
+            self._toggle_tracing = False
+            if self._tracing:
+                self._stop_tracing()
+            else:
+                self._start_tracing()
+        if self._requested and self._profile is None:
+            self._remaining = self._requested
+            self._requested = 0
+            self._profile = cProfile.Profile()
+            logger.info(f"Profiling the next {self._remaining} cycles")
+        if self._profile is not None:
+            self._profile.enable()
+
+    def _after_cycle(self):
+        if self._profile is not None:
+            self._profile.disable()
+            self._remaining -= 1
+            if self._remaining <= 0:
+                self._write_profile()
+        if self._tracing:
+            self._cycles_since_snapshot += 1
+            if self._cycles_since_snapshot >= self.snapshot_interval:
+                self._take_snapshot()
+
+    def _path(self, kind, ext):
+        name = f'{kind}-{os.getpid()}-{strftime("%Y%m%d-%H%M%S")}'
+        path = os.path.join(self.output_dir, f'{name}.{ext}')
+        n = 1
+        while os.path.exists(path):
+            n += 1
+            path = os.path.join(self.output_dir, f'{name}-{n}.{ext}')
+        return path
+
+    def _write_profile(self):
+        "Write the profiling run's stats and summary, and end the run"
+        profile, self._profile = self._profile, None
+        self.runs += 1
+        path = self._path('profile', 'pstats')
+        profile.dump_stats(path)
+        base = path[:-len('pstats')]
+        with open(base + 'txt', 'w') as f:
+            stats = pstats.Stats(profile, stream=f)
+            stats.sort_stats('cumulative').print_stats(self.top)
+        write_collapsed(stats, base + 'collapsed')
+        logger.info(f"Wrote profile to {path}")
+
+    def _start_tracing(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+            self._started_tracemalloc = True
+        self._tracing = True
+        self._cycles_since_snapshot = 0
+        self._last_snapshot = self._snapshot()
+        logger.info("Started tracemalloc snapshots")
+
+    def _stop_tracing(self):
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+        self._tracing = False
+        self._last_snapshot = None
+        logger.info("Stopped tracemalloc snapshots")
+
+    def _snapshot(self):
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+        ))
+
+    def _take_snapshot(self):
+        "Write the difference between a new snapshot and the last one"
+        snapshot = self._snapshot()
+        diff = snapshot.compare_to(self._last_snapshot, 'lineno')
+        self._last_snapshot = snapshot
+        self._cycles_since_snapshot = 0
+        self.snapshots += 1
+        current, peak = tracemalloc.get_traced_memory()
+        growth = sum(stat.size_diff for stat in diff)
+        path = self._path('tracemalloc', 'txt')
+        with open(path, 'w') as f:
+            f.write(
+                f"traced: {current} bytes (peak {peak}), "
+                f"change since last snapshot: {growth:+} bytes\n\n"
+            )
+            for stat in diff[:self.top]:
+                f.write(f"{stat}\n")
+        logger.info(f"Wrote tracemalloc diff ({growth:+} bytes) to {path}")
+
+
+def default_profiler():
+    """
+    Return the profiler configured by the environment variables (see
+    :meth:`Profiler.from_env`) for this process, creating it on first use, or
+    None if they aren't set. A forked worker process gets its own.
+    """
+    global _default_profiler, _default_profiler_pid
+    with _default_profiler_lock:
+        if _default_profiler_pid != os.getpid():
+            _default_profiler = Profiler.from_env()
+            _default_profiler_pid = os.getpid()
+        return _default_profiler
+
+
+def write_collapsed(stats, path, max_depth=64):
+    """
+    Write :class:`pstats.Stats` as collapsed stacks (one ``caller;callee
+    microseconds`` line per stack), as read by flamegraph.pl and speedscope.
+    cProfile only records callers one level up, so each function's time is
+    split between its stacks in proportion to the time spent in it from each
+    caller.
+    """
+    children = {}
+    roots = []
+    for func, (cc, nc, tt, ct, callers) in stats.stats.items():
+        if not callers:
+            roots.append(func)
+        for caller, caller_stats in callers.items():
+            children.setdefault(caller, []).append((func, caller_stats[3]))
+    lines = {}
+
+    def walk(func, stack, time):
+        cc, nc, tt, ct, callers = stats.stats[func]
+        fraction = time / ct if ct else 0
+        stack = stack + (_label(func), )
+        own = int(tt * fraction * 1e6)
+        if own:
+            key = ';'.join(stack)
+            lines[key] = lines.get(key, 0) + own
+        if len(stack) >= max_depth:
+            return
+        for child, child_time in children.get(func, ()):
+            child_time *= fraction
+            if child_time > 1e-6 and _label(child) not in stack:
+                walk(child, stack, child_time)
+
+    for func in roots:
+        walk(func, (), stats.stats[func][3])
+    with open(path, 'w') as f:
+        for stack, microseconds in sorted(lines.items()):
+            f.write(f"{stack} {microseconds}\n")
+
+
+def _label(func):
+    filename, line, name = func
+    if filename == '~':
+        return name
+    return f"{name} ({os.path.basename(filename)}:{line})"
@@ -0,0 +1,181 @@
+import os
+import threading
+from io import BytesIO
+
+from requests.exceptions import RequestException
+
+try:
+    from PIL import Image, ImageDraw, ImageFont
+except ImportError:
+    Image = ImageDraw = ImageFont = None
+
+from .memes import TEMPLATES
+from .http import default_session
+from .utils import download_image_file
+from .exc import RenderError
+
+
+TEMPLATES_URL = 'https://api.imgflip.com/get_memes'
+
+# tried in order if no font_path is given
+FONT_NAMES = ('impact.ttf', 'Impact.ttf', 'DejaVuSans-Bold.ttf')
+
+
+class LocalRenderer:
+    """
+    Renders memes locally rather than with the imgflip API, using template
+    images cached on disk. Has the same :meth:`make_meme` interface as
+    :class:`~memeoverflow.imgflip.ImgFlip`, but returns the image itself
+    rather than a URL. Requires Pillow.
+
+    :type template_dir: str
+    :param template_dir:
+        Directory to cache template images in, as ``<template id>.jpg`` -
+        missing templates are downloaded from imgflip on first use
+
+    :type font_path: str or None
+    :param font_path:
+        Path to the TrueType font to use (optional) - defaults to Impact if
+        available
+
+    :type session: requests.Session or None
+    :param session: HTTP session to download templates with (optional)
+    """
+    def __init__(self, *, template_dir, font_path=None, session=None):
+        if Image is None:
+            raise RenderError(
+                "Pillow is required for local rendering - "
+                "pip install memeoverflow[render]"
+            )
+        self.template_dir = template_dir
+        self.font_path = font_path
+        self._http = default_session() if session is None else session
+        self._template_urls = None
+        self._templates = {}
+        self._fonts = {}
+        self._lock = threading.Lock()
+        os.makedirs(template_dir, exist_ok=True)
+
+    def __repr__(self):
+        return f"<LocalRenderer template_dir='{self.template_dir}'>"
+
+    def make_meme(self, *, meme, text_parts):
+        "Generate a meme with the supplied text, and return its image bytes"
+        img = self.get_template(meme).copy()
+        draw = ImageDraw.Draw(img)
+        top, bottom = text_parts
+        if top:
+            self._draw_text(draw, img.size, top, top=True)
+        if bottom:
+            self._draw_text(draw, img.size, bottom, top=False)
+        img_bytes = BytesIO()
+        img.save(img_bytes, format='JPEG', quality=90)
+        img_bytes.seek(0)
+        return img_bytes
+
+    def get_template(self, meme):
+        "Return the template image for the given meme, downloading if needed"
+        template_id = TEMPLATES[meme].id
+        with self._lock:
+            try:
+                return self._templates[template_id]
+            except KeyError:
+                pass
+        path = os.path.join(self.template_dir, f'{template_id}.jpg')
+        if not os.path.exists(path):
+            self._download_template(template_id, path)
+        img = Image.open(path).convert('RGB')
+        with self._lock:
+            self._templates[template_id] = img
+        return img
+
+    def _download_template(self, template_id, path):
+        try:
+            if self._template_urls is None:
+                r = self._http.get(TEMPLATES_URL)
+                r.raise_for_status()
+                self._template_urls = {
+                    int(m['id']): m['url']
+                    for m in r.json()['data']['memes']
+                }
+            url = self._template_urls[template_id]
+            download_image_file(url, path + '.part', session=self._http)
+            os.replace(path + '.part', path)
+        except (RequestException, ValueError, KeyError) as e:
+            raise RenderError(
+                f"Failed to get template image {template_id} - save it as "
+                f"{path} manually"
+            ) from e
+
+    def _font(self, size):
+        try:
+            return self._fonts[size]
+        except KeyError:
+            pass
+        names = (self.font_path, ) if self.font_path else FONT_NAMES
+        for name in names:
+            try:
+                font = ImageFont.truetype(name, size)
+                break
+            except OSError:
+                continue
+        else:
+            font = ImageFont.load_default(size=size)
+        self._fonts[size] = font
+        return font
+
+    def _fit_text(self, draw, size, text):
+        """
+        Return (font, lines) for the largest font size which fits text within
+        the image width and a quarter of its height
+        """
+        width, height = size
+        max_width = width * 0.95
+        font_size = max(height // 8, 10)
+        while True:
+            font = self._font(font_size)
+            lines = wrap_text(
+                text, lambda s: draw.textlength(s, font=font), max_width
+            )
+            line_height = font_size * 1.1
+            if len(lines) * line_height <= height / 4 or font_size <= 10:
+                return (font, lines)
+            font_size = int(font_size * 0.85)
+
+    def _draw_text(self, draw, size, text, top):
+        width, height = size
+        font, lines = self._fit_text(draw, size, text.upper())
+        line_height = font.size * 1.1
+        margin = height * 0.02
+        if top:
+            y = margin
+        else:
+            y = height - margin - line_height * len(lines)
+        stroke = max(font.size // 15, 1)
+        for line in lines:
+            x = (width - draw.textlength(line, font=font)) / 2
+            draw.text(
+                (x, y), line, font=font, fill='white',
+                stroke_width=stroke, stroke_fill='black',
+            )
+            y += line_height
+
+
+def wrap_text(text, measure, max_width):
+    """
+    Split text into lines which each measure no more than max_width (unless a
+    single word is too wide), where measure is a function returning the width
+    of a string
+    """
+    lines = []
+    line = ''
+    for word in text.split():
+        candidate = f'{line} {word}' if line else word
+        if line and measure(candidate) > max_width:
+            lines.append(line)
+            line = word
+        else:
+            line = candidate
+    if line:
+        lines.append(line)
+    return lines
@@ -0,0 +1,344 @@
+"""
+Load generator which replays a recorded stream of Stack Exchange questions
+through a bot running against the local stand-in servers (see
+:mod:`memeoverflow.standin`), and reports its throughput and per-stage
+latency.
+
+Usage: python -m memeoverflow.replay [questions.jsonl] [options]
+
+Each line of the questions file is a question as returned by the Stack
+Exchange API, with at least question_id, title, link, tags and
+creation_date. Without a file, a synthetic stream is replayed.
+"""
+import os
+import json
+import math
+import random
+import argparse
+import threading
+import tempfile
+from time import sleep, monotonic, time
+from functools import wraps
+from collections import namedtuple
+
+from .memeoverflow import MemeOverflow
+from .http import make_session
+from .standin import StackExchangeStandIn, ImgFlipStandIn, TwitterStandIn
+
+
+STAGES = ('poll', 'render', 'tweet', 'end_to_end')
+
+TITLES = (
+    'Is this a bug in the compiler?',
+    'Is it possible to run two scripts at once?',
+    'What does "sudo" actually do',
+    'If I delete this file, will it break anything?',
+    'How do I connect a button to GPIO 17?',
+    'Python script stops running after a few hours',
+)
+
+TAGS = ('python', 'raspberry-pi', 'gpio', 'c#', 'linux', 'bash')
+
+
+class ReplayReport(namedtuple('ReplayReport', (
+    'questions', 'tweets', 'failures', 'elapsed', 'latencies'
+))):
+    """
+    Results of a replay: the number of questions replayed, memes tweeted and
+    failed attempts, the seconds it took, and a dict of the latencies (in
+    seconds) of each stage in :data:`STAGES`
+    """
+    __slots__ = ()
+
+    @property
+    def memes_per_minute(self):
+        if self.elapsed == 0:
+            return 0.0
+        return self.tweets * 60 / self.elapsed
+
+    def percentile(self, stage, p):
+        "Return the pth percentile latency of the given stage, or None"
+        return percentile(self.latencies[stage], p)
+
+    def summary(self):
+        "Return a printable summary of the report"
+        lines = [
+            f"Replayed {self.questions} questions in {self.elapsed:.1f}s",
+            f"Tweeted {self.tweets} memes ({self.memes_per_minute:.1f}/min), "
+            f"{self.failures} failed attempts",
+            "",
+            f"{'stage':<12}{'count':>8}{'p50':>10}{'p90':>10}{'p99':>10}"
+            f"{'max':>10}",
+        ]
+        for stage in STAGES:
+            samples = self.latencies[stage]
+            row = f"{stage:<12}{len(samples):>8}"
+            for p in (50, 90, 99, 100):
+                value = percentile(samples, p)
+                if value is None:
+                    row += f"{'-':>10}"
+                else:
+                    row += f"{value * 1000:>8.1f}ms"
+            lines.append(row)
+        return '\n'.join(lines)
+
+
+def percentile(values, p):
+    "Return the pth (nearest-rank) percentile of values, or None if empty"
+    if not values:
+        return None
+    values = sorted(values)
+    rank = max(math.ceil(p / 100 * len(values)) - 1, 0)
+    return values[min(rank, len(values) - 1)]
+
+
+def load_questions(path):
+    "Return the questions recorded in a JSONL file, oldest first"
+    with open(path) as f:
+        questions = [json.loads(line) for line in f if line.strip()]
+    return sorted(questions, key=lambda q: q['creation_date'])
+
+
+def synthetic_questions(n, interval=60, seed=0):
+    "Return n made up questions, asked interval seconds apart on average"
+    rng = random.Random(seed)
+    created = int(time())
+    questions = []
+    for i in range(n):
+        id = 1000000 + i
+        created += int(rng.expovariate(1 / interval)) if interval else 0
+        questions.append({
+            'question_id': id,
+            'title': rng.choice(TITLES),
+            'link': f'https://stackoverflow.com/questions/{id}/question-{id}',
+            'tags': rng.sample(TAGS, 3),
+            'creation_date': created,
+        })
+    return questions
+
+
+def replay(questions, *, db_path, speed=1.0, stackexchange_options=None,
+           imgflip_options=None, twitter_options=None, bot_options=None,
+           timeout=None):
+    """
+    Replay questions (oldest first) through a :class:`MemeOverflow` bot
+    running against stand-in servers, and return a :class:`ReplayReport`.
+
+    Each question is added to the Stack Exchange stand-in at its original
+    time relative to the first, sped up by speed. The replay finishes once
+    every question has been polled and the bot has nothing pending, or after
+    timeout seconds (by default, a minute longer than the stream lasts).
+
+    The options dicts are passed to :class:`StackExchangeStandIn`,
+    :class:`ImgFlipStandIn` and :class:`TwitterStandIn` and to the bot.
+    """
+    bot_options = {
+        'tweet_interval': 0,
+        'poll_interval': 1,
+        **(bot_options or {}),
+    }
+    if questions:
+        duration = (
+            questions[-1]['creation_date'] - questions[0]['creation_date']
+        ) / speed
+    else:
+        duration = 0
+    if timeout is None:
+        timeout = duration + 60
+
+    se = StackExchangeStandIn(**(stackexchange_options or {})).start()
+    imgflip = ImgFlipStandIn(**(imgflip_options or {})).start()
+    twitter = TwitterStandIn(**(twitter_options or {})).start()
+    try:
+        bot = MemeOverflow(
+            twitter={
+                'con_key': 'replay', 'con_sec': 'replay',
+                'acc_tok': 'replay', 'acc_sec': 'replay',
+                'api_url': twitter.api_url, 'upload_url': twitter.upload_url,
+            },
+            imgflip={
+                'username': 'replay', 'password': 'replay',
+                'api_url': imgflip.api_url,
+            },
+            stackexchange={
+                'site': 'stackoverflow', 'key': 'replay',
+                'api_url': se.api_url,
+            },
+            db_path=db_path,
+            session=make_session(),
+            **bot_options
+        )
+        return _run(bot, se, questions, speed, timeout)
+    finally:
+        se.stop()
+        imgflip.stop()
+        twitter.stop()
+
+
+def _run(bot, se, questions, speed, timeout):
+    latencies = {stage: [] for stage in STAGES}
+    released = {}
+    state = {'last_release': 0, 'last_poll': 0, 'tweets': 0, 'failures': 0}
+    feeding = threading.Event()
+    feeding.set()
+
+    def timed(stage, func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            start = monotonic()
+            result = func(*args, **kwargs)
+            latencies[stage].append(monotonic() - start)
+            return result
+        return wrapper
+
+    get_questions = timed('poll', bot.stackexchange.get_questions)
+
+    @wraps(get_questions)
+    def poll(*args, **kwargs):
+        start = monotonic()
+        result = get_questions(*args, **kwargs)
+        state['last_poll'] = start
+        return result
+
+    tweet_prepared = bot.tweet_prepared
+
+    @wraps(tweet_prepared)
+    def tweet(prepared):
+        tweeted = tweet_prepared(prepared)
+        if tweeted:
+            state['tweets'] += 1
+            latencies['end_to_end'].append(
+                monotonic() - released[prepared.question_id]
+            )
+        return tweeted
+
+    tweet_next = bot.tweet_next
+
+    @wraps(tweet_next)
+    def attempt():
+        tweeted = tweet_next()
+        if not tweeted:
+            state['failures'] += 1
+        return tweeted
+
+    bot.stackexchange.get_questions = poll
+    bot.render_meme = timed('render', bot.render_meme)
+    bot.tweet_meme = timed('tweet', bot.tweet_meme)
+    bot.tweet_prepared = tweet
+    bot.tweet_next = attempt
+
+    def feed():
+        start = monotonic()
+        first = questions[0]['creation_date'] if questions else 0
+        for question in questions:
+            due = start + (question['creation_date'] - first) / speed
+            delay = due - monotonic()
+            if delay > 0:
+                sleep(delay)
+            # the bot polls for questions created since the newest it's
+            # seen, so questions are dated when they're released
+            released[question['question_id']] = monotonic()
+            se.add_questions([{**question, 'creation_date': int(time())}])
+            state['last_release'] = monotonic()
+        feeding.clear()
+
+    feeder = threading.Thread(target=feed, daemon=True)
+    start = monotonic()
+    feeder.start()
+    deadline = start + timeout
+    while monotonic() < deadline:
+        delay = bot.step()
+        if (
+            not feeding.is_set() and not bot.pending and
+            state['last_poll'] > state['last_release']
+        ):
+            break
+        sleep(min(max(delay, 0), 0.05))
+    elapsed = monotonic() - start
+    bot.close()
+    return ReplayReport(
+        len(released), state['tweets'], state['failures'], elapsed, latencies
+    )
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description="Replay a stream of questions through the bot against "
+        "local stand-in servers, and report its throughput and latency"
+    )
+    parser.add_argument(
+        'questions', nargs='?',
+        help="JSONL file of questions to replay (default: synthetic stream)")
+    parser.add_argument(
+        '--synthetic', type=int, default=100, metavar='N',
+        help="number of synthetic questions to replay (default: %(default)s)")
+    parser.add_argument(
+        '--speed', type=float, default=60,
+        help="speed up factor for the replay (default: %(default)s)")
+    parser.add_argument(
+        '--latency', type=float, default=0.05,
+        help="seconds each stand-in takes to respond (default: %(default)s)")
+    parser.add_argument(
+        '--jitter', type=float, default=0.05,
+        help="extra random seconds for responses (default: %(default)s)")
+    parser.add_argument(
+        '--error-rate', type=float, default=0,
+        help="proportion of requests which fail (default: %(default)s)")
+    parser.add_argument(
+        '--tweet-interval', type=float, default=0,
+        help="bot's seconds between tweets (default: %(default)s)")
+    parser.add_argument(
+        '--poll-interval', type=float, default=1,
+        help="bot's seconds between polls (default: %(default)s)")
+    parser.add_argument(
+        '--prefetch', type=int, default=0,
+        help="number of memes for the bot to make in advance "
+        "(default: %(default)s)")
+    parser.add_argument(
+        '--cache-size', type=int, default=None,
+        help="size of the bot's cache of known question IDs (default: none)")
+    parser.add_argument(
+        '--wal', action='store_true',
+        help="open the bot's database in write-ahead logging mode")
+    parser.add_argument(
+        '--batch-size', type=int, default=None,
+        help="number of question IDs for the bot to write to the database "
+        "at once (default: no batching)")
+    parser.add_argument(
+        '--batch-interval', type=float, default=None,
+        help="seconds the bot may wait before writing batched question IDs "
+        "(default: no batching)")
+    options = parser.parse_args(args)
+
+    if options.questions:
+        questions = load_questions(options.questions)
+    else:
+        questions = synthetic_questions(options.synthetic)
+    server_options = {
+        'latency': options.latency,
+        'jitter': options.jitter,
+        'error_rate': options.error_rate,
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        report = replay(
+            questions,
+            db_path=os.path.join(tmp, 'replay.db'),
+            speed=options.speed,
+            stackexchange_options=server_options,
+            imgflip_options=server_options,
+            twitter_options=server_options,
+            bot_options={
+                'tweet_interval': options.tweet_interval,
+                'poll_interval': options.poll_interval,
+                'prefetch': options.prefetch,
+                'cache_size': options.cache_size,
+                'wal': options.wal,
+                'batch_size': options.batch_size,
+                'batch_interval': options.batch_interval,
+            },
+        )
+    print(report.summary())
+
+
+if __name__ == '__main__':
+    main()
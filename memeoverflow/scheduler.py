@@ -0,0 +1,104 @@
+from time import monotonic
+
+
+class Scheduler:
+    """
+    Tracks when a bot may next tweet and when it should next poll for
+    questions, as two separate deadlines, so work can be done in between
+    rather than sleeping for a fixed time
+
+    :type tweet_interval: float
+    :param tweet_interval: Seconds to wait after a successful tweet
+
+    :type poll_interval: float
+    :param poll_interval: Seconds to wait between polls
+
+    :type retry_interval: float
+    :param retry_interval:
+        Seconds to wait after a failed attempt before trying the next question
+
+    :type backoff_after: int
+    :param backoff_after:
+        Number of failed attempts in a row after which to back off, e.g.
+        during an outage of one of the APIs
+
+    :type backoff: float
+    :param backoff:
+        Seconds to wait after backoff_after failures in a row, doubling with
+        each further failure
+
+    :type max_backoff: float
+    :param max_backoff: Maximum seconds to wait when backing off
+    """
+    def __init__(self, tweet_interval=60*5, poll_interval=60*5,
+                 retry_interval=0, backoff_after=3, backoff=10,
+                 max_backoff=60*15):
+        self.tweet_interval = tweet_interval
+        self.poll_interval = poll_interval
+        self.retry_interval = retry_interval
+        self.backoff_after = backoff_after
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.failures = 0
+        now = monotonic()
+        self.next_tweet_at = now
+        self.next_poll_at = now
+
+    def __repr__(self):
+        return (
+            f"<Scheduler tweet_in={self.time_until_tweet():.0f}s "
+            f"poll_in={self.time_until_poll():.0f}s>"
+        )
+
+    def tweet_due(self):
+        "Return True if a tweet is allowed now"
+        return self.time_until_tweet() == 0
+
+    def poll_due(self):
+        "Return True if a poll is due now"
+        return self.time_until_poll() == 0
+
+    def time_until_tweet(self):
+        "Return the number of seconds until a tweet is allowed"
+        return max(0, self.next_tweet_at - monotonic())
+
+    def time_until_poll(self):
+        "Return the number of seconds until a poll is due"
+        return max(0, self.next_poll_at - monotonic())
+
+    def time_until_next(self, pending=True):
+        """
+        Return the number of seconds until there's something to do: the next
+        poll, or the next tweet if there are questions pending
+        """
+        if pending:
+            return min(self.time_until_tweet(), self.time_until_poll())
+        return self.time_until_poll()
+
+    def tweeted(self, success=True):
+        """
+        Record a tweet attempt, and set when the next one is allowed. A failed
+        attempt is retried after the retry interval, unless there have been
+        backoff_after failures in a row.
+        """
+        if success:
+            self.failures = 0
+            interval = self.tweet_interval
+        else:
+            self.failures += 1
+            interval = self.retry_interval
+            if self.failures >= self.backoff_after:
+                backoff = self.backoff * 2 ** (
+                    self.failures - self.backoff_after
+                )
+                interval = max(interval, min(backoff, self.max_backoff))
+        self.next_tweet_at = monotonic() + interval
+
+    def polled(self, interval=None):
+        """
+        Record a poll, and set when the next one is due (after interval
+        seconds if given, otherwise the default poll interval)
+        """
+        if interval is None:
+            interval = self.poll_interval
+        self.next_poll_at = monotonic() + interval
@@ -1,15 +1,128 @@
 import warnings
+import threading
+from time import monotonic
+from datetime import datetime, timedelta, timezone
 from json import JSONDecodeError
 
-import requests
 from requests.exceptions import RequestException
 
 from .exc import StackExchangeError, StackExchangeNoKeyWarning
+from .http import default_session
+from .metrics import NULL_COLLECTOR
 
 
 API_URL = 'https://api.stackexchange.com/2.2/questions'
 
 
+class QuotaGovernor:
+    """
+    Keeps track of the Stack Exchange API quota and backoff requests for one
+    API key, shared by every :class:`StackExchange` instance using that key.
+    Use :meth:`for_key` rather than creating instances directly.
+
+    The quota is spread across :attr:`sites`, the sites using the key in this
+    process. If other processes use the key too, set :attr:`total_sites` to
+    the number of sites using it in all of them.
+
+    Backoff requests from the API are added to the poll interval rather than
+    slept through, so one key's backoff doesn't hold up other sites running
+    in the same thread.
+    """
+    _governors = {}
+    _governors_lock = threading.Lock()
+
+    def __init__(self):
+        self.quota_max = None
+        self.quota_remaining = None
+        self.quota_date = None
+        self.backoff_until = 0
+        self.sites = set()
+        self.total_sites = None
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return (
+            f"<QuotaGovernor quota_remaining={self.quota_remaining} "
+            f"sites={len(self.sites)}>"
+        )
+
+    @classmethod
+    def for_key(cls, key):
+        "Return the governor shared by all users of the given API key"
+        with cls._governors_lock:
+            try:
+                return cls._governors[key]
+            except KeyError:
+                governor = cls._governors[key] = cls()
+                return governor
+
+    @property
+    def state(self):
+        "Return a dict of the current quota and backoff state"
+        return {
+            'quota_max': self.quota_max,
+            'quota_remaining': self.quota_remaining,
+            'backoff': self.backoff_remaining,
+            'sites': self.site_count,
+            'poll_interval': self.poll_interval(),
+        }
+
+    @property
+    def backoff_remaining(self):
+        "Return the number of seconds until any requested backoff has passed"
+        return max(0, self.backoff_until - monotonic())
+
+    @property
+    def site_count(self):
+        "Return the number of sites sharing the key's quota"
+        return max(len(self.sites), self.total_sites or 0)
+
+    def record(self, data):
+        "Record the quota and backoff fields from an API response"
+        with self._lock:
+            if 'quota_max' in data:
+                self.quota_max = data['quota_max']
+            if 'quota_remaining' in data:
+                self.quota_remaining = data['quota_remaining']
+                self.quota_date = _utc_now().date()
+            if 'backoff' in data:
+                self.backoff_until = max(
+                    self.backoff_until, monotonic() + data['backoff']
+                )
+
+    def check(self):
+        """
+        Raise :exc:`StackExchangeError` if the daily quota has run out, or if
+        the API has asked for a backoff which hasn't passed yet
+        """
+        if self.quota_remaining == 0 and self.quota_date == _utc_now().date():
+            raise StackExchangeError("Stack Exchange API quota exhausted")
+        backoff = self.backoff_remaining
+        if backoff > 0:
+            raise StackExchangeError(
+                f"Stack Exchange API backoff for {backoff:.0f}s"
+            )
+
+    def poll_interval(self, minimum=0):
+        """
+        Return the number of seconds each site should wait between polls so
+        the remaining quota lasts until it resets (at midnight UTC), or
+        minimum or any requested backoff if that's longer
+        """
+        minimum = max(minimum, self.backoff_remaining)
+        now = _utc_now()
+        if self.quota_remaining is None or self.quota_date != now.date():
+            return minimum
+        reset = (now + timedelta(days=1)).replace(
+            hour=0, minute=0, second=0, microsecond=0
+        )
+        seconds_left = (reset - now).total_seconds()
+        sites = max(self.site_count, 1)
+        if self.quota_remaining <= 0:
+            return max(minimum, seconds_left)
+        return max(minimum, seconds_left * sites / self.quota_remaining)
+
+
 class StackExchange:
     """
     Wrapper class for Stack Exchange API calls
@@ -26,11 +139,30 @@ class StackExchange:
     :param user_id:
         Stack Exchange user ID (optional) - if provided, will be used to create
         URLs with a referral code
+
+    :type session: requests.Session or None
+    :param session:
+        HTTP session to make requests with (optional) - defaults to the
+        session shared by all clients
+
+    :type api_url: str
+    :param api_url: URL of the questions API endpoint
+
+    :type metrics: Collector or None
+    :param metrics:
+        Collector to record metrics with, see
+        :class:`~memeoverflow.metrics.MetricsCollector` (optional)
     """
-    def __init__(self, *, site, key=None, user_id=None):
+    def __init__(self, *, site, key=None, user_id=None, session=None,
+                 api_url=API_URL, metrics=None):
         self.site = site
+        self.api_url = api_url
+        self.metrics = NULL_COLLECTOR if metrics is None else metrics
         self.key = key
         self.user_id = user_id
+        self._http = default_session() if session is None else session
+        self.governor = QuotaGovernor.for_key(key)
+        self.governor.sites.add(site)
 
         if self.key is None:
             warnings.warn(
@@ -41,18 +173,58 @@ class StackExchange:
     def __repr__(self):
         return f"<StackExchange site='{self.site}'>"
 
-    def get_questions(self, n=100):
-        "Retreive n questions from the StackExchange site and return as a list"
+    def get_questions(self, n=100, since=None, max_pages=10):
+        """
+        Retreive n questions from the StackExchange site and return as a list.
+
+        If since (a unix timestamp) is provided, only return questions created
+        since then, newest first, following further pages (up to max_pages)
+        if there are more than n.
+        """
         params = {
             'pagesize': n,
             'site': self.site,
             'key': self.key,
         }
-        r = requests.get(API_URL, params)
+        if since is None:
+            items, has_more = self._get_page(params)
+            return items
+        params.update(sort='creation', order='desc', fromdate=since)
+        questions = []
+        for page in range(1, max_pages + 1):
+            params['page'] = page
+            items, has_more = self._get_page(params)
+            questions.extend(items)
+            if not has_more:
+                break
+        return questions
+
+    def _get_page(self, params):
+        "Make a questions API request and return (items, has_more)"
+        # a poll interrupted by a backoff is made again in full once it's
+        # passed, as the poll cursor only moves on after a complete poll
+        self.governor.check()
         try:
+            # timeouts and connection errors (once retries are used up) are
+            # converted like any other failure
+            with self.metrics.timer('memeoverflow_request_seconds',
+                                    api='stackexchange'):
+                r = self._http.get(self.api_url, params=params)
+            try:
+                data = r.json()
+                self.governor.record(data)
+            except ValueError:
+                data = {}
+            if self.governor.quota_remaining is not None:
+                self.metrics.set(
+                    'memeoverflow_stackexchange_quota_remaining',
+                    self.governor.quota_remaining,
+                )
             r.raise_for_status()
-            return r.json()['items']
+            return (data['items'], data.get('has_more', False))
         except (RequestException, JSONDecodeError, KeyError) as e:
+            self.metrics.inc('memeoverflow_request_errors_total',
+                             api='stackexchange')
             raise StackExchangeError(
                 "Failed to retrieve questions from Stack Exchange"
             ) from e
@@ -68,3 +240,7 @@ class StackExchange:
         if self.user_id:
             return '/'.join(url.split('/')[:-1] + [str(self.user_id)])
         return url
+
+
+def _utc_now():
+    return datetime.now(timezone.utc)
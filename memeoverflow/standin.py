@@ -0,0 +1,466 @@
+"""
+Local stand-in HTTP servers for the Stack Exchange, imgflip and Twitter APIs,
+for testing and load testing the bot offline. Point the clients at a running
+stand-in with their ``api_url`` (and for Twitter, ``upload_url``) options.
+"""
+import re
+import json
+import random
+import threading
+from time import sleep, monotonic, time
+from email import message_from_bytes
+from email.policy import HTTP
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qsl
+
+
+class StandInServer:
+    """
+    Base class for a local HTTP server standing in for a remote API, run in a
+    background thread. Subclasses list their endpoints in :attr:`routes`.
+
+    :type latency: float
+    :param latency: Seconds to wait before each response
+
+    :type jitter: float
+    :param jitter: Up to this many extra seconds to wait, chosen at random
+
+    :type error_rate: float
+    :param error_rate: Proportion of requests to fail with a 500 error
+
+    :type rate_limit: tuple or None
+    :param rate_limit:
+        (limit, window) - the number of requests allowed in each window of
+        seconds, after which requests are refused until the next window
+        (optional)
+
+    :type seed: int or None
+    :param seed: Seed for the random latency and errors (optional)
+
+    :type host: str
+    :param host: Address to listen on
+
+    :type port: int
+    :param port: Port to listen on (by default, any free port)
+    """
+    # list of (method, path regex, handler method name)
+    routes = []
+
+    def __init__(self, *, latency=0, jitter=0, error_rate=0, rate_limit=None,
+                 seed=None, host='127.0.0.1', port=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.stats = {
+            'requests': 0,
+            'errors': 0,
+            'rate_limited': 0,
+        }
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._window_start = monotonic()
+        self._window_count = 0
+        self._routes = [
+            (method, re.compile(pattern), getattr(self, name))
+            for method, pattern, name in self.routes
+        ]
+        self._server = ThreadingHTTPServer((host, port), _Handler)
+        self._server.daemon_threads = True
+        self._server.standin = self
+        self._thread = None
+
+    def __repr__(self):
+        return f"<{self.__class__.__name__} url='{self.url}'>"
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    @property
+    def url(self):
+        "Return the base URL of the server"
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self):
+        "Start serving requests in a background thread, and return self"
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self):
+        "Stop the server"
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def rate_limit_headers(self):
+        "Return the rate limit headers to add to each response"
+        if self.rate_limit is None:
+            return {}
+        limit, window = self.rate_limit
+        return {
+            'x-rate-limit-limit': str(limit),
+            'x-rate-limit-remaining': str(max(limit - self._window_count, 0)),
+            'x-rate-limit-reset': str(int(time() + self._window_left())),
+        }
+
+    def rate_limited(self):
+        "Return the (status, body) of the response to a rate limited request"
+        return (429, _errors(88, 'Rate limit exceeded'))
+
+    def error(self):
+        "Return the (status, body) of the response to a failed request"
+        return (500, _errors(131, 'Internal error'))
+
+    def handle(self, method, path, params):
+        """
+        Return (status, body, headers) for a request. body is a dict to send
+        as JSON, or bytes.
+        """
+        with self._lock:
+            self.stats['requests'] += 1
+            delay = self.latency + self._random.uniform(0, self.jitter)
+            failed = self._random.random() < self.error_rate
+            limited = self._count_request()
+            headers = self.rate_limit_headers()
+        if delay > 0:
+            sleep(delay)
+        if limited:
+            with self._lock:
+                self.stats['rate_limited'] += 1
+            return self.rate_limited() + (headers, )
+        if failed:
+            with self._lock:
+                self.stats['errors'] += 1
+            return self.error() + (headers, )
+        for route_method, pattern, handler in self._routes:
+            match = pattern.fullmatch(path)
+            if route_method == method and match:
+                return handler(params, **match.groupdict()) + (headers, )
+        return (404, _errors(34, 'Not found'), headers)
+
+    def _window_left(self):
+        return max(self._window_start + self.rate_limit[1] - monotonic(), 0)
+
+    def _count_request(self):
+        "Count a request against the rate limit. Return True if it's over."
+        if self.rate_limit is None:
+            return False
+        limit, window = self.rate_limit
+        if self._window_left() == 0:
+            self._window_start = monotonic()
+            self._window_count = 0
+        self._window_count += 1
+        return self._window_count > limit
+
+
+class StackExchangeStandIn(StandInServer):
+    """
+    Stand-in for the Stack Exchange ``/questions`` API, serving the questions
+    given to :meth:`add_questions`. Takes the options of
+    :class:`StandInServer`, and:
+
+    :type quota: int or None
+    :param quota:
+        Daily request quota to report in responses (optional) - requests are
+        refused once it's used up
+
+    :type backoff: int or None
+    :param backoff:
+        Number of seconds to ask clients to back off for in each response
+        (optional)
+    """
+    routes = [
+        ('GET', r'/2\.2/questions', 'get_questions'),
+    ]
+
+    def __init__(self, *, quota=None, backoff=None, **kwargs):
+        super().__init__(**kwargs)
+        self.quota = quota
+        self.quota_remaining = quota
+        self.backoff = backoff
+        self.questions = []
+
+    @property
+    def api_url(self):
+        "Return the URL for the ``api_url`` option of the client"
+        return f'{self.url}/2.2/questions'
+
+    def add_questions(self, questions):
+        "Make the given questions available to the API"
+        with self._lock:
+            self.questions.extend(questions)
+
+    def rate_limited(self):
+        return (400, self._wrapper({
+            'error_id': 502,
+            'error_name': 'throttle_violation',
+            'error_message': 'too many requests from this IP',
+        }))
+
+    def error(self):
+        return (500, self._wrapper({
+            'error_id': 500,
+            'error_name': 'internal_error',
+            'error_message': 'internal error',
+        }))
+
+    def get_questions(self, params):
+        with self._lock:
+            if self.quota_remaining is not None:
+                if self.quota_remaining <= 0:
+                    return self.rate_limited()
+                self.quota_remaining -= 1
+            questions = list(self.questions)
+        if 'fromdate' in params:
+            fromdate = int(params['fromdate'])
+            questions = [
+                q for q in questions if q['creation_date'] >= fromdate
+            ]
+        questions.sort(
+            key=lambda q: (q['creation_date'], q['question_id']),
+            reverse=params.get('order', 'desc') == 'desc',
+        )
+        pagesize = int(params.get('pagesize', 30))
+        page = int(params.get('page', 1))
+        start = (page - 1) * pagesize
+        items = questions[start:start + pagesize]
+        body = self._wrapper({
+            'items': items,
+            'has_more': len(questions) > start + pagesize,
+        })
+        return (200, body)
+
+    def _wrapper(self, body):
+        "Add the common wrapper fields to a response body"
+        if self.quota is not None:
+            body['quota_max'] = self.quota
+            body['quota_remaining'] = max(self.quota_remaining, 0)
+        if self.backoff is not None:
+            body['backoff'] = self.backoff
+        return body
+
+
+class ImgFlipStandIn(StandInServer):
+    """
+    Stand-in for the imgflip ``caption_image`` API, and the images it makes.
+    Takes the options of :class:`StandInServer`, and:
+
+    :type image_size: int
+    :param image_size: Size in bytes of the images served
+    """
+    routes = [
+        ('POST', r'/caption_image', 'caption_image'),
+        ('GET', r'/images/(?P<id>\d+)\.jpg', 'get_image'),
+    ]
+
+    def __init__(self, *, image_size=64 * 1024, **kwargs):
+        super().__init__(**kwargs)
+        # a JPEG header padded to size; nothing decodes it
+        self.image = b'\xff\xd8\xff\xe0' + bytes(max(image_size - 4, 0))
+        self.memes = []
+
+    @property
+    def api_url(self):
+        "Return the URL for the ``api_url`` option of the client"
+        return f'{self.url}/caption_image'
+
+    def caption_image(self, params):
+        if not params.get('template_id'):
+            return (200, {
+                'success': False,
+                'error_message': 'No template_id specified',
+            })
+        with self._lock:
+            self.memes.append(params)
+            id = len(self.memes)
+        return (200, {
+            'success': True,
+            'data': {
+                'url': f'{self.url}/images/{id}.jpg',
+                'page_url': f'{self.url}/i/{id}',
+            },
+        })
+
+    def get_image(self, params, id):
+        return (200, self.image)
+
+
+class TwitterStandIn(StandInServer):
+    """
+    Stand-in for the Twitter media upload (simple and chunked) and status
+    update APIs. Tweets are kept in :attr:`tweets`, and duplicate statuses
+    are refused as Twitter does. As with Twitter, chunked uploads with a
+    ``media_category`` report their processing state, and GIFs (category
+    ``tweet_gif``) are processed asynchronously. Takes the options of
+    :class:`StandInServer`, and:
+
+    :type processing_checks: int
+    :param processing_checks:
+        Number of STATUS requests for which an uploaded GIF is still being
+        processed
+    """
+    routes = [
+        ('POST', r'/1\.1/media/upload\.json', 'upload'),
+        ('GET', r'/1\.1/media/upload\.json', 'upload_status'),
+        ('POST', r'/1\.1/statuses/update\.json', 'update_status'),
+    ]
+
+    def __init__(self, *, processing_checks=1, **kwargs):
+        super().__init__(**kwargs)
+        self.processing_checks = processing_checks
+        self.media = {}
+        self.tweets = []
+        self._next_id = 1000
+        self._categories = {}
+        self._processing = {}
+
+    @property
+    def api_url(self):
+        "Return the URL for the ``api_url`` option of the client"
+        return self.url
+
+    @property
+    def upload_url(self):
+        "Return the URL for the ``upload_url`` option of the client"
+        return f'{self.url}/1.1/media/upload.json'
+
+    def _new_id(self):
+        with self._lock:
+            self._next_id += 1
+            return self._next_id
+
+    def upload(self, params):
+        command = params.get('command')
+        if command is None:
+            media_id = self._new_id()
+            self.media[media_id] = len(params.get('media', b''))
+            return (200, {'media_id': media_id,
+                          'media_id_string': str(media_id)})
+        if command == 'INIT':
+            media_id = self._new_id()
+            self.media[media_id] = 0
+            self._categories[media_id] = params.get('media_category')
+            return (202, {'media_id': media_id,
+                          'media_id_string': str(media_id)})
+        media_id = int(params['media_id'])
+        if media_id not in self.media:
+            return (400, _errors(324, 'Invalid media id'))
+        if command == 'APPEND':
+            self.media[media_id] += len(params.get('media', b''))
+            return (200, {})
+        response = {
+            'media_id': media_id,
+            'media_id_string': str(media_id),
+            'size': self.media[media_id],
+        }
+        category = self._categories.get(media_id)
+        if category == 'tweet_gif' and self.processing_checks:
+            self._processing[media_id] = self.processing_checks
+            response['processing_info'] = {
+                'state': 'pending', 'check_after_secs': 0,
+            }
+        elif category is not None:
+            response['processing_info'] = {'state': 'succeeded'}
+        return (201, response)
+
+    def upload_status(self, params):
+        media_id = int(params['media_id'])
+        with self._lock:
+            checks = self._processing.get(media_id, 0)
+            if checks:
+                self._processing[media_id] = checks - 1
+        if checks:
+            processing_info = {'state': 'in_progress', 'check_after_secs': 0}
+        else:
+            processing_info = {'state': 'succeeded'}
+        return (200, {
+            'media_id': media_id,
+            'processing_info': processing_info,
+        })
+
+    def update_status(self, params):
+        status = params.get('status', '')
+        with self._lock:
+            if any(tweet['text'] == status for tweet in self.tweets):
+                return (403, _errors(187, 'Status is a duplicate'))
+            self._next_id += 1
+            tweet = {
+                'id': self._next_id,
+                'id_str': str(self._next_id),
+                'text': status,
+                'media_ids': params.get('media_ids', ''),
+                'created_at': time(),
+            }
+            self.tweets.append(tweet)
+        return (200, tweet)
+
+
+def _errors(code, message):
+    "Return a Twitter style error response body"
+    return {'errors': [{'code': code, 'message': message}]}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self._respond('GET')
+
+    def do_POST(self):
+        self._respond('POST')
+
+    def log_message(self, format, *args):
+        pass
+
+    def _respond(self, method):
+        url = urlsplit(self.path)
+        params = dict(parse_qsl(url.query))
+        params.update(self._read_form())
+        status, body, headers = self.server.standin.handle(
+            method, url.path, params
+        )
+        if isinstance(body, bytes):
+            content_type = 'image/jpeg'
+        else:
+            content_type = 'application/json'
+            body = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_form(self):
+        "Return the fields of a form in the request body as a dict"
+        length = int(self.headers.get('Content-Length', 0))
+        if not length:
+            return {}
+        body = self.rfile.read(length)
+        content_type = self.headers.get('Content-Type', '')
+        if content_type.startswith('application/x-www-form-urlencoded'):
+            return dict(parse_qsl(body.decode()))
+        if content_type.startswith('multipart/form-data'):
+            message = message_from_bytes(
+                b'Content-Type: ' + content_type.encode() + b'\r\n\r\n' + body,
+                policy=HTTP,
+            )
+            fields = {}
+            for part in message.iter_parts():
+                name = part.get_param('name', header='content-disposition')
+                value = part.get_payload(decode=True)
+                if part.get_filename() is None:
+                    value = value.decode()
+                fields[name] = value
+            return fields
+        return {}
@@ -0,0 +1,115 @@
+import re
+import unicodedata
+
+from .utils import tags_to_hashtag_list
+
+
+# twitter-text v3 configuration
+MAX_WEIGHTED_LENGTH = 280
+URL_LENGTH = 23
+DEFAULT_WEIGHT = 2
+LIGHT_RANGES = (
+    (0, 4351),
+    (8192, 8205),
+    (8208, 8223),
+    (8242, 8247),
+)
+
+# Twitter also links domains without a protocol, such as ASP.NET or
+# user.github.io in a title. Counting a word as a link when Twitter doesn't
+# only costs a hashtag, but missing one makes the status too long, so these
+# include the generic TLDs likely to turn up in titles as well as the common
+# ones.
+GENERIC_TLDS = frozenset("""
+    aero ai amazon android app apple art asia aws azure bar bing bio biz blog
+    boo book box build buzz cam care cat center channel chat chrome cisco
+    city click cloud club co codes com company computer cool coop dad data
+    day design dev digital docs download edu email esq express fail fit foo
+    fun fyi game games global gmail goog google gov guru help host hosting
+    how ibm icu info ing ink int intel java jobs land link live lol ltd media
+    meme microsoft mil mobi moe money mov museum name net network new nexus
+    ninja office one online oracle org page phd photo pics place play plus
+    press pro prof rocks rsvp run sap school science search services shop
+    show site skype social software solutions soy space store studio style
+    support systems team tech tel tips today tools top travel tube tv uno vip
+    watch website wiki win windows work works world wtf xbox xxx xyz youtube
+    zip zone
+""".split())
+
+COUNTRY_TLDS = frozenset("""
+    ac ad ae af ag ai al am ao aq ar as at au aw ax az ba bb bd be bf bg bh
+    bi bj bm bn bo bq br bs bt bw by bz ca cc cd cf cg ch ci ck cl cm cn co
+    cr cu cv cw cx cy cz de dj dk dm do dz ec ee eg er es et eu fi fj fk fm
+    fo fr ga gb gd ge gf gg gh gi gl gm gn gp gq gr gs gt gu gw gy hk hm hn
+    hr ht hu id ie il im in io iq ir is it je jm jo jp ke kg kh ki km kn kp
+    kr kw ky kz la lb lc li lk lr ls lt lu lv ly ma mc md me mg mh mk ml mm
+    mn mo mp mq mr ms mt mu mv mw mx my mz na nc ne nf ng ni nl no np nr nu
+    nz om pa pe pf pg ph pk pl pm pn pr ps pt pw py qa re ro rs ru rw sa sb
+    sc sd se sg sh si sk sl sm sn so sr ss st su sv sx sy sz tc td tf tg th
+    tj tk tl tm tn to tr tt tv tw tz ua ug uk us uy uz va vc ve vg vi vn vu
+    wf ws ye yt za zm zw
+""".split())
+
+_LABEL = r'[a-z0-9](?:[a-z0-9-]*[a-z0-9])?'
+_END = r'(?![\w-])'
+_PATH = r'(?:/\S*)?'
+
+# like twitter-text, a domain with a country TLD and no protocol is only
+# linked if it has a subdomain or a path (so file.py isn't a link)
+URL_RE = re.compile(
+    rf'https?://\S+|'
+    rf'(?<![\w@#$./-])(?:'
+    rf'(?:{_LABEL}\.)+(?:{"|".join(sorted(GENERIC_TLDS))}){_END}{_PATH}|'
+    rf'(?:{_LABEL}\.){{2,}}(?:{"|".join(sorted(COUNTRY_TLDS))}){_END}{_PATH}|'
+    rf'{_LABEL}\.(?:{"|".join(sorted(COUNTRY_TLDS))}){_END}/\S*'
+    rf')',
+    re.I
+)
+
+
+def char_weight(char):
+    "Return the weight of a character in Twitter's weighted tweet length"
+    code = ord(char)
+    for start, end in LIGHT_RANGES:
+        if start <= code <= end:
+            return 1
+    return DEFAULT_WEIGHT
+
+
+def weighted_length(text):
+    """
+    Return the length of text as counted by Twitter: most characters outside
+    Latin scripts count double, and URLs (including domains without a
+    protocol) count as the length of a t.co link
+    """
+    text = unicodedata.normalize('NFC', text)
+    length = 0
+    position = 0
+    for match in URL_RE.finditer(text):
+        length += sum(map(char_weight, text[position:match.start()]))
+        length += URL_LENGTH
+        position = match.end()
+    length += sum(map(char_weight, text[position:]))
+    return length
+
+
+def compose_status(title, url, tags, max_length=MAX_WEIGHTED_LENGTH):
+    """
+    Return the status for a question: its title, URL and as many of its tags
+    as hashtags as will fit, in order. If even the title and URL are too long,
+    the title is shortened.
+    """
+    status = f"{title} {url}"
+    length = weighted_length(status)
+    if length > max_length:
+        excess = length - max_length + char_weight('…')
+        while excess > 0 and title:
+            excess -= char_weight(title[-1])
+            title = title[:-1]
+        return f"{title.rstrip()}… {url}"
+    for hashtag in tags_to_hashtag_list(tags):
+        hashtag_length = 1 + weighted_length(hashtag)
+        if length + hashtag_length <= max_length:
+            status += f" {hashtag}"
+            length += hashtag_length
+    return status
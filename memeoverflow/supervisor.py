@@ -0,0 +1,222 @@
+import os
+import sys
+import bisect
+import signal
+import hashlib
+import multiprocessing
+from collections import Counter
+from time import sleep, monotonic
+
+from logzero import logger
+
+
+class HashRing:
+    """
+    Consistent hash ring mapping keys to nodes, so that adding or removing a
+    node only moves the keys on its part of the ring
+
+    :type nodes: list
+    :param nodes: Nodes to place on the ring
+
+    :type replicas: int
+    :param replicas:
+        Number of points each node has on the ring (more points spread keys
+        more evenly)
+    """
+    def __init__(self, nodes, replicas=100):
+        self.nodes = list(nodes)
+        if not self.nodes:
+            raise ValueError("A hash ring needs at least one node")
+        self.replicas = replicas
+        self._ring = sorted(
+            (_hash(f'{node}-{i}'), node)
+            for node in self.nodes
+            for i in range(replicas)
+        )
+        self._points = [point for point, node in self._ring]
+
+    def __repr__(self):
+        return f"<HashRing nodes={len(self.nodes)}>"
+
+    def node(self, key):
+        "Return the node key belongs to"
+        i = bisect.bisect(self._points, _hash(str(key))) % len(self._ring)
+        return self._ring[i][1]
+
+
+def shard_sites(sites, workers, replicas=100):
+    """
+    Split a list of site config dicts (see :class:`MemeOverflowFleet`) into
+    workers lists by consistent hashing of the site names, so each site stays
+    with the same worker when the number of workers changes where possible
+    """
+    ring = HashRing(range(workers), replicas=replicas)
+    shards = [[] for i in range(workers)]
+    for config in sites:
+        shards[ring.node(config['stackexchange']['site'])].append(config)
+    return shards
+
+
+def key_site_counts(sites):
+    """
+    Return a dict of the number of sites using each Stack Exchange API key in
+    a list of site config dicts
+    """
+    return dict(Counter(
+        config['stackexchange'].get('key') for config in sites
+    ))
+
+
+def run_worker(sites, db_path, key_sites=None):
+    """
+    Run a :class:`MemeOverflowFleet` for sites forever (a worker's target).
+    key_sites is a dict of the number of sites using each API key across all
+    the workers (see :func:`key_site_counts`), so each worker polls at its
+    share of the key's quota. The fleet's database is closed when the worker
+    is stopped.
+    """
+    from .fleet import MemeOverflowFleet
+    from .stackexchange import QuotaGovernor
+
+    for key, count in (key_sites or {}).items():
+        QuotaGovernor.for_key(key).total_sites = count
+    # the supervisor stops workers with SIGTERM, so exit cleanly to write
+    # any batched question IDs
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    with MemeOverflowFleet(sites, db_path) as fleet:
+        logger.info(f"Worker {os.getpid()} running {len(sites)} sites")
+        while True:
+            fleet()
+
+
+class MemeOverflowSupervisor:
+    """
+    Run the :class:`MemeOverflow` pipelines for many Stack Exchange sites in
+    several worker processes, to make use of more than one CPU core. Sites
+    are sharded across the workers by consistent hashing of their names, each
+    worker runs a :class:`MemeOverflowFleet` for its shard, and all workers
+    share one WAL-mode database file. Workers which exit are restarted with
+    the same shard.
+
+    :type sites: list
+    :param sites:
+        List of site config dicts, as passed to :class:`MemeOverflowFleet`
+
+    :type db_path: str
+    :param db_path:
+        Path to the sqlite database file shared by all sites
+
+    :type workers: int or None
+    :param workers:
+        Number of worker processes (by default, the number of CPUs). Workers
+        whose shard is empty aren't started.
+
+    :type restart_delay: float
+    :param restart_delay:
+        Minimum number of seconds between starts of the same worker, so a
+        worker which crashes straight away isn't restarted in a tight loop
+
+    :type context: multiprocessing context or None
+    :param context:
+        :mod:`multiprocessing` context to start workers with (by default, the
+        platform's default)
+
+    :type target: callable or None
+    :param target:
+        Function each worker runs, called with its shard, db_path and the
+        number of sites using each API key (by default, :func:`run_worker`)
+    """
+    def __init__(self, sites, db_path, workers=None, *, restart_delay=5,
+                 context=None, target=None):
+        if workers is None:
+            workers = os.cpu_count() or 1
+        self.db_path = db_path
+        self.shards = shard_sites(sites, workers)
+        # the quota of an API key is shared by the workers using it
+        self.key_sites = key_site_counts(sites)
+        self.restart_delay = restart_delay
+        self.context = multiprocessing if context is None else context
+        self.target = run_worker if target is None else target
+        self.processes = {}
+        self.restarts = 0
+        self._started_at = {}
+
+    def __repr__(self):
+        sites = sum(len(shard) for shard in self.shards)
+        return (
+            f"<MemeOverflowSupervisor workers={len(self.shards)} "
+            f"sites={sites}>"
+        )
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def start(self):
+        "Start a worker for each non-empty shard, and return self"
+        for i, shard in enumerate(self.shards):
+            if shard:
+                self._start_worker(i)
+        return self
+
+    def _start_worker(self, i):
+        process = self.context.Process(
+            target=self.target,
+            args=(self.shards[i], self.db_path, self.key_sites),
+            name=f'memeoverflow-worker-{i}', daemon=True,
+        )
+        process.start()
+        self.processes[i] = process
+        self._started_at[i] = monotonic()
+
+    def check(self):
+        """
+        Restart any workers which have exited (unless they were started too
+        recently). Return the number of workers restarted.
+        """
+        restarted = 0
+        now = monotonic()
+        for i, process in self.processes.items():
+            if process.is_alive():
+                continue
+            if now - self._started_at[i] < self.restart_delay:
+                continue
+            logger.warning(
+                f"Worker {i} exited with code {process.exitcode}, restarting"
+            )
+            process.close()
+            self._start_worker(i)
+            restarted += 1
+        self.restarts += restarted
+        return restarted
+
+    def run(self, interval=1):
+        "Start the workers and keep them running until interrupted"
+        self.start()
+        try:
+            while True:
+                sleep(interval)
+                self.check()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+    def stop(self, timeout=10):
+        "Stop the workers"
+        for process in self.processes.values():
+            if process.is_alive():
+                process.terminate()
+        for process in self.processes.values():
+            process.join(timeout)
+            if process.is_alive():
+                process.kill()
+                process.join()
+        self.processes.clear()
+
+
+def _hash(key):
+    # hash() is salted per process, so use a stable hash
+    return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], 'big')
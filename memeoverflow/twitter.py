@@ -1,6 +1,20 @@
-from twython import Twython, TwythonError
+from io import BytesIO
+from time import sleep
+from functools import lru_cache
 
-from .exc import TwitterError
+from .exc import TwitterError, TwitterDuplicateError
+from .http import make_adapter, DEFAULT_TIMEOUT
+from .metrics import NULL_COLLECTOR
+
+
+API_URL = 'https://api.twitter.com'
+
+UPLOAD_URL = 'https://upload.twitter.com/1.1/media/upload.json'
+
+# images bigger than this are uploaded in chunks
+CHUNKED_UPLOAD_THRESHOLD = 1024 * 1024
+
+CHUNK_SIZE = 512 * 1024
 
 
 class Twitter:
@@ -18,18 +32,216 @@ class Twitter:
 
     :type acc_sec: str
     :param acc_sec: Twitter API access secret
+
+    :type timeout: float or tuple
+    :param timeout: (connect, read) timeout in seconds for API requests
+
+    :type api_url: str
+    :param api_url: Base URL of the Twitter API
+
+    :type upload_url: str
+    :param upload_url: URL of the media upload endpoint
+
+    :type chunk_size: int
+    :param chunk_size: Size of each segment in a chunked upload
+
+    :type max_retries: int
+    :param max_retries:
+        Number of times to retry a failed segment of a chunked upload
+
+    :type max_processing_wait: float
+    :param max_processing_wait:
+        Maximum number of seconds to wait for an upload to be processed
+        before giving up
+
+    :type metrics: Collector or None
+    :param metrics:
+        Collector to record metrics with, see
+        :class:`~memeoverflow.metrics.MetricsCollector` (optional)
     """
-    def __init__(self, con_key, con_sec, acc_tok, acc_sec):
-        self.twython = Twython(con_key, con_sec, acc_tok, acc_sec)
+    def __init__(self, con_key, con_sec, acc_tok, acc_sec, *,
+                 timeout=DEFAULT_TIMEOUT, api_url=API_URL,
+                 upload_url=UPLOAD_URL, chunk_size=CHUNK_SIZE,
+                 max_retries=3, max_processing_wait=300, metrics=None):
+        self.twython = _twython_class()(
+            con_key, con_sec, acc_tok, acc_sec,
+            client_args={'timeout': timeout},
+        )
+        self.twython.api_url = api_url.rstrip('/') + '/%s'
+        # Twython keeps its own authenticated session, so give it a pooled
+        # adapter with retries like the other clients
+        self.twython.client.mount('https://', make_adapter(pool_maxsize=2))
+        self.api_url = api_url
+        self.upload_url = upload_url
+        self.chunk_size = chunk_size
+        self.max_retries = max_retries
+        self.max_processing_wait = max_processing_wait
+        self.metrics = NULL_COLLECTOR if metrics is None else metrics
 
     def __repr__(self):
         return "<Twitter>"
 
-    def tweet_with_image(self, status, img_bytes):
-        "Tweet status with the image attached"
+    def tweet_with_image(self, status, img_bytes, chunked=None):
+        """
+        Tweet status with the image attached, and return the tweet's ID. If
+        chunked is None, large images are uploaded in chunks and small ones
+        in a single request. Raise :exc:`TwitterDuplicateError` if the status
+        has already been tweeted.
+        """
+        from twython import TwythonError
+
+        # the image may have been read by a previous attempt
+        img_bytes.seek(0)
         try:
-            response = self.twython.upload_media(media=img_bytes)
-            media_ids = [response['media_id']]
-            self.twython.update_status(status=status, media_ids=media_ids)
+            if chunked is None:
+                chunked = _file_size(img_bytes) > CHUNKED_UPLOAD_THRESHOLD
+            with self.metrics.timer('memeoverflow_request_seconds',
+                                    api='twitter_media'):
+                if chunked:
+                    media_id = self.upload_chunked(img_bytes)
+                else:
+                    response = self.twython.post(
+                        self.upload_url, params={'media': img_bytes}
+                    )
+                    media_id = response['media_id']
+            with self.metrics.timer('memeoverflow_request_seconds',
+                                    api='twitter_status'):
+                response = self.twython.update_status(
+                    status=status, media_ids=[media_id]
+                )
         except TwythonError as e:
+            self.metrics.inc('memeoverflow_request_errors_total',
+                             api='twitter')
+            if e.error_code == 403 and 'duplicate' in str(e).lower():
+                raise TwitterDuplicateError(str(e)) from e
             raise TwitterError from e
+        return response.get('id_str')
+
+    def upload_chunked(self, media, media_type=None):
+        """
+        Upload media with the chunked INIT/APPEND/FINALIZE process, retrying
+        any failed segments, and wait for any asynchronous processing to
+        finish. Return the media ID.
+        """
+        media.seek(0)
+        total_bytes = _file_size(media)
+        if media_type is None:
+            media_type = guess_media_type(media)
+        response = self.twython.post(self.upload_url, params={
+            'command': 'INIT',
+            'total_bytes': total_bytes,
+            'media_type': media_type,
+            # only uploads with a category are processed asynchronously, and
+            # GIFs without one are limited to 5MB
+            'media_category': (
+                'tweet_gif' if media_type == 'image/gif' else 'tweet_image'
+            ),
+        })
+        media_id = response['media_id']
+
+        segment_index = 0
+        while True:
+            chunk = media.read(self.chunk_size)
+            if not chunk:
+                break
+            self._append(media_id, segment_index, chunk)
+            segment_index += 1
+
+        response = self.twython.post(self.upload_url, params={
+            'command': 'FINALIZE',
+            'media_id': media_id,
+        })
+        self._wait_for_processing(media_id, response.get('processing_info'))
+        return media_id
+
+    def _append(self, media_id, segment_index, chunk):
+        "Upload one segment, retrying it if it fails"
+        from twython import TwythonError
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                self.twython.post(self.upload_url, params={
+                    'command': 'APPEND',
+                    'media_id': media_id,
+                    'segment_index': segment_index,
+                    'media': BytesIO(chunk),
+                })
+                return
+            except TwythonError:
+                if attempt == self.max_retries:
+                    raise
+                sleep(2 ** attempt)
+
+    def _wait_for_processing(self, media_id, processing_info):
+        "Poll the upload status until processing has finished"
+        waited = 0
+        while processing_info:
+            state = processing_info['state']
+            if state == 'succeeded':
+                return
+            if state == 'failed':
+                error = processing_info.get('error', {})
+                raise TwitterError(
+                    f"Media processing failed: {error.get('message')}"
+                )
+            wait = processing_info.get('check_after_secs', 1)
+            if waited + wait > self.max_processing_wait:
+                raise TwitterError(
+                    f"Media processing took longer than "
+                    f"{self.max_processing_wait}s"
+                )
+            sleep(wait)
+            waited += wait
+            response = self.twython.get(self.upload_url, params={
+                'command': 'STATUS',
+                'media_id': media_id,
+            })
+            processing_info = response.get('processing_info')
+
+
+@lru_cache(maxsize=None)
+def _twython_class():
+    """
+    Return a Twython client class which also allows full URLs with plain
+    HTTP, such as those of a local stand-in server (see
+    :mod:`memeoverflow.standin`). Twython is imported on first use, as it's
+    slow to import.
+    """
+    from twython import Twython
+
+    class _Twython(Twython):
+        def request(self, endpoint, method='GET', params=None,
+                    version='1.1', json_encoded=False):
+            if endpoint.startswith('http://'):
+                return self._request(
+                    endpoint, method=method, params=params,
+                    api_call=endpoint, json_encoded=json_encoded,
+                )
+            return super().request(
+                endpoint, method=method, params=params, version=version,
+                json_encoded=json_encoded,
+            )
+
+    return _Twython
+
+
+def guess_media_type(media):
+    "Return the MIME type of the image file-like object media"
+    position = media.tell()
+    header = media.read(8)
+    media.seek(position)
+    if header.startswith(b'GIF8'):
+        return 'image/gif'
+    if header.startswith(b'\x89PNG'):
+        return 'image/png'
+    if header.startswith(b'RIFF'):
+        return 'image/webp'
+    return 'image/jpeg'
+
+
+def _file_size(f):
+    "Return the size of the file-like object f, leaving its position alone"
+    position = f.tell()
+    size = f.seek(0, 2)
+    f.seek(position)
+    return size
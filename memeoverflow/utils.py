@@ -1,8 +1,53 @@
-from io import BytesIO
 import shutil
+from functools import lru_cache
+from tempfile import SpooledTemporaryFile
 
-import requests
 
+CHUNK_SIZE = 64 * 1024
+
+# images smaller than this are kept in memory rather than a temporary file
+MAX_MEMORY_IMAGE_SIZE = 5 * 1024 * 1024
+
+HASHTAG_REPLACEMENTS = (
+    ('.net', 'dotnet'),
+    ('c#', 'csharp'),
+    ('f#', 'fsharp'),
+    ('c++', 'cpp'),
+    ('g++', 'gpp'),
+    ('python2x', 'python2'),
+    ('python3x', 'python3'),
+    ('-', ''),
+    ('.', ''),
+    ('b+', 'bplus'),
+)
+
+
+@lru_cache(maxsize=4096)
+def tag_to_hashtag(tag):
+    """
+    Replace special characters in a tag and return it as a hashtag, or None if
+    it can't be used as a hashtag. Results are memoized, as the same tags come
+    up again and again.
+
+    e.g. tag_to_hashtag('c#') => '#csharp'
+    """
+    for a, b in HASHTAG_REPLACEMENTS:
+        tag = tag.replace(a, b)
+    try:
+        int(tag)
+    except ValueError:
+        return f'#{tag}'
+
+def tags_to_hashtag_list(tags):
+    """
+    Return a list of hashtags for the list of tags, de-duped and in the order
+    of the tags
+    """
+    return list(dict.fromkeys(
+        hashtag
+        for hashtag in map(tag_to_hashtag, tags)
+        if hashtag is not None
+    ))
 
 def tags_to_hashtags(tags):
     """
@@ -12,36 +57,32 @@ def tags_to_hashtags(tags):
     e.g. tags_to_hashtags(['foo', 'bar', 'foobar', 'foo-bar'])
          => '#foo #bar #foobar'
     """
-    hashtags = set()
-    replacements = (
-        ('.net', 'dotnet'),
-        ('c#', 'csharp'),
-        ('f#', 'fsharp'),
-        ('c++', 'cpp'),
-        ('g++', 'gpp'),
-        ('python2x', 'python2'),
-        ('python3x', 'python3'),
-        ('-', ''),
-        ('.', ''),
-        ('b+', 'bplus'),
-    )
-    for tag in tags:
-        for a, b in replacements:
-            tag = tag.replace(a, b)
-        try:
-            int(tag)
-        except ValueError:
-            hashtags.add(f'#{tag}')
-    return ' '.join(hashtags)
-
-def download_image_bytes(img_url):
-    "Download an image and return its contents"
-    r = requests.get(img_url)
-    r.raise_for_status()
-    return BytesIO(r.content)
-
-def download_image_file(img_url, path):
+    return ' '.join(tags_to_hashtag_list(tags))
+
+def download_image_bytes(img_url, session=None):
+    """
+    Download an image and return its contents as a file-like object, ready to
+    upload. The download is streamed in chunks into a
+    :class:`~tempfile.SpooledTemporaryFile`, which stays in memory unless the
+    image is very large.
+    """
+    img = SpooledTemporaryFile(max_size=MAX_MEMORY_IMAGE_SIZE)
+    _stream_download(img_url, img, session)
+    img.seek(0)
+    return img
+
+def download_image_file(img_url, path, session=None):
     "Download an image file and save it"
-    r = requests.get(img_url, stream=True)
     with open(path, 'wb') as f:
-        shutil.copyfileobj(r.raw, f)
+        _stream_download(img_url, f, session)
+
+def _stream_download(url, f, session=None):
+    "Download url into the file-like object f in chunks"
+    if session is None:
+        # imported here so the hashtag functions don't need requests
+        from .http import default_session
+        session = default_session()
+    with session.get(url, stream=True) as r:
+        r.raise_for_status()
+        r.raw.decode_content = True
+        shutil.copyfileobj(r.raw, f, CHUNK_SIZE)
@@ -0,0 +1,58 @@
+import os
+from io import BytesIO
+
+from memeoverflow.cache import ImageCache
+
+
+def test_image_cache_miss(tmp_path, BATMAN_SLAPPING_ROBIN):
+    cache = ImageCache(str(tmp_path))
+    assert cache.get(BATMAN_SLAPPING_ROBIN, 'foo', None) == (None, None)
+    assert cache.stats['misses'] == 1
+    assert cache.hit_rate == 0
+
+def test_image_cache_hit(tmp_path, BATMAN_SLAPPING_ROBIN,
+                         example_imgflip_img_url, example_imgflip_img_blob):
+    cache = ImageCache(str(tmp_path))
+    cache.put(BATMAN_SLAPPING_ROBIN, 'foo', None,
+              img_url=example_imgflip_img_url)
+    assert cache.get(BATMAN_SLAPPING_ROBIN, 'foo', None) == (
+        example_imgflip_img_url, None
+    )
+    assert cache.stats['url_hits'] == 1
+    cache.put(BATMAN_SLAPPING_ROBIN, 'foo', None,
+              img_bytes=BytesIO(example_imgflip_img_blob))
+    img_url, img_bytes = cache.get(BATMAN_SLAPPING_ROBIN, 'foo', None)
+    assert img_url == example_imgflip_img_url
+    assert img_bytes.read() == example_imgflip_img_blob
+    assert cache.stats['hits'] == 1
+    assert cache.hit_rate == 0.5
+    # persists between instances
+    cache = ImageCache(str(tmp_path))
+    assert len(cache) == 1
+    assert cache.get(BATMAN_SLAPPING_ROBIN, 'foo', None)[1] is not None
+
+def test_image_cache_eviction(tmp_path, BATMAN_SLAPPING_ROBIN):
+    cache = ImageCache(str(tmp_path), max_bytes=10)
+    cache.put(BATMAN_SLAPPING_ROBIN, 'a', None, img_bytes=BytesIO(b'x' * 4))
+    cache.put(BATMAN_SLAPPING_ROBIN, 'b', None, img_bytes=BytesIO(b'x' * 4))
+    cache.get(BATMAN_SLAPPING_ROBIN, 'a', None)
+    cache.put(BATMAN_SLAPPING_ROBIN, 'c', None, img_bytes=BytesIO(b'x' * 4))
+    assert len(cache) == 2
+    assert cache.stats['evictions'] == 1
+    assert cache.get(BATMAN_SLAPPING_ROBIN, 'a', None)[1] is not None
+    assert cache.get(BATMAN_SLAPPING_ROBIN, 'b', None)[1] is None
+
+def test_image_cache_url_eviction(tmp_path, BATMAN_SLAPPING_ROBIN):
+    url = 'https://i.imgflip.com/abcd.jpg'
+    cache = ImageCache(str(tmp_path), max_bytes=len(url) * 2)
+    for text in 'abc':
+        cache.put(BATMAN_SLAPPING_ROBIN, text, None, img_url=url)
+    assert len(cache) == 2
+    assert cache.stats['evictions'] == 1
+    assert cache.get(BATMAN_SLAPPING_ROBIN, 'a', None) == (None, None)
+    assert cache.get(BATMAN_SLAPPING_ROBIN, 'c', None) == (url, None)
+    assert len(os.listdir(tmp_path)) == 2
+    # URLs already on disk count towards the limit
+    cache = ImageCache(str(tmp_path), max_bytes=len(url))
+    assert len(cache) == 1
+    assert cache.get(BATMAN_SLAPPING_ROBIN, 'c', None) == (url, None)
@@ -0,0 +1,44 @@
+import random
+
+import pytest
+
+from memeoverflow.classify import TitleClassifier, Rule, DEFAULT_CLASSIFIER
+from memeoverflow.memes import QUESTION_POOL, STATEMENT_POOL
+
+
+@pytest.mark.parametrize('title, meme, text_parts', [
+    ('Is this a bug?', 'IS_THIS_A_PIGEON', ('Is this', 'a bug?')),
+    ('Is it possible to do this?', 'WELL_YES_BUT_ACTUALLY_NO',
+     ('Is it possible to do this?', None)),
+    ('What does "foo" mean', 'DR_EVIL_LASER', ('What does "foo" mean', None)),
+    ('If I do this, what happens?', 'PHILOSORAPTOR',
+     ('If I do this, what happens?', None)),
+])
+def test_classify_rules(title, meme, text_parts):
+    assert DEFAULT_CLASSIFIER.classify(title) == (meme, text_parts)
+
+def test_classify_random():
+    meme, text_parts = DEFAULT_CLASSIFIER.classify('Why does this fail?')
+    assert meme in QUESTION_POOL
+    assert 'Why does this fail?' in text_parts
+    meme, text_parts = DEFAULT_CLASSIFIER.classify('Is possible')
+    assert meme in STATEMENT_POOL
+
+def test_classify_many():
+    titles = ['Is this a bug?', 'Why?', 'Not a question'] * 10
+    results = DEFAULT_CLASSIFIER.classify_many(titles, rng=random.Random(1))
+    assert len(results) == 30
+    assert results[0][0] == 'IS_THIS_A_PIGEON'
+    assert results == DEFAULT_CLASSIFIER.classify_many(
+        titles, rng=random.Random(1)
+    )
+
+def test_classifier_add_rule():
+    classifier = TitleClassifier()
+    classifier.add_rule(Rule('Y_THO', r'why ', strip=True), index=0)
+    assert repr(classifier) == "<TitleClassifier rules=5>"
+    assert classifier.classify('Why is this possible?') == (
+        'Y_THO', ('is this possible?', 'Y THO')
+    )
+    with pytest.raises(ValueError):
+        classifier.add_rule(Rule('NOT_A_MEME', r'foo', strip=False))
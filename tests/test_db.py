@@ -1,5 +1,7 @@
 import pytest
 import os
+import threading
+from tempfile import SpooledTemporaryFile
 
 from memeoverflow import MemeDatabase
 
@@ -68,3 +70,139 @@ def test_database_multi_insert():
             db.insert_question(id)
             assert db.question_is_known(id)
     teardown_db(db_path)
+
+def test_database_known_ids():
+    teardown_db(db_path)
+    with MemeDatabase('foo', db_path) as db:
+        assert db.known_ids([]) == set()
+        for id in range(0, 2000, 2):
+            db.insert_question(id)
+        assert db.known_ids(range(1000)) == set(range(0, 1000, 2))
+        assert db.known_ids([1, 3, 5]) == set()
+        assert db.filter_unknown([5, 4, 3, 2, 1]) == [5, 3, 1]
+    teardown_db(db_path)
+
+def test_database_cache():
+    teardown_db(db_path)
+    with MemeDatabase('foo', db_path) as db:
+        db.insert_question(1)
+    with MemeDatabase('foo', db_path, cache_size=10) as db:
+        assert db.question_is_known(1)
+        assert db.cache_stats['db_hits'] == 1
+        assert db.question_is_known(1)
+        assert db.cache_stats['lru_hits'] == 1
+        assert not db.question_is_known(2)
+        assert db.cache_stats['bloom_negatives'] == 1
+        for id in range(100, 1200):
+            db.insert_question(id)
+        assert db.known_ids([1, 2, 150, 1199]) == {1, 150, 1199}
+        assert db._bloom.capacity == 2000
+    teardown_db(db_path)
+
+def test_database_wal_threads():
+    teardown_db(db_path)
+    with MemeDatabase('foo', db_path, wal=True) as db:
+        cursor = db.conn.cursor()
+        cursor.execute("pragma journal_mode")
+        assert cursor.fetchone()[0] == 'wal'
+        cursor.close()
+
+        def insert(start):
+            for id in range(start, start + 50):
+                db.insert_question(id)
+
+        threads = [
+            threading.Thread(target=insert, args=(i * 50, ))
+            for i in range(4)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert db.known_ids(range(200)) == set(range(200))
+        assert len(db._connections) == 5
+    assert not db._connections
+    for suffix in ('', '-wal', '-shm'):
+        teardown_db(db_path + suffix)
+
+def test_database_batched_insert():
+    teardown_db(db_path)
+    with MemeDatabase('foo', db_path, batch_size=3) as db:
+        db.insert_question(1)
+        db.insert_question(2)
+        assert db.question_is_known(1)
+        assert db.known_ids([1, 2, 3]) == {1, 2}
+        with MemeDatabase('foo', db_path) as other:
+            assert not other.question_is_known(1)
+        db.insert_question(3)
+        with MemeDatabase('foo', db_path) as other:
+            assert other.known_ids([1, 2, 3]) == {1, 2, 3}
+        db.insert_question(4)
+    with MemeDatabase('foo', db_path) as db:
+        assert db.question_is_known(4)
+    teardown_db(db_path)
+
+def test_database_batched_insert_interval():
+    teardown_db(db_path)
+    with MemeDatabase('foo', db_path, batch_interval=0) as db:
+        db.insert_question(1)
+        assert not db._pending
+        assert db.question_is_known(1)
+    teardown_db(db_path)
+
+def test_database_cursor():
+    teardown_db(db_path)
+    with MemeDatabase('foo', db_path) as db:
+        assert db.get_cursor() is None
+        db.set_cursor(1600000000, 123)
+        db.set_cursor(1600000100, 124)
+    with MemeDatabase('foo', db_path) as db:
+        assert db.get_cursor() == (1600000100, 124)
+    with MemeDatabase('bar', db_path) as db:
+        assert db.get_cursor() is None
+    teardown_db(db_path)
+
+def test_database_outbox(example_se_item_1, example_se_item_2):
+    teardown_db(db_path)
+    id1 = example_se_item_1['question_id']
+    id2 = example_se_item_2['question_id']
+    with MemeDatabase('foo', db_path) as db:
+        assert db.outbox_get(id1) is None
+        db.outbox_add([example_se_item_1, example_se_item_2])
+        db.outbox_update(id1, 'rendered', meme='BATMAN_SLAPPING_ROBIN',
+                         text0='a', text1='b', img_url='http://x/1.jpg')
+        with pytest.raises(ValueError):
+            db.outbox_update(id1, 'posted')
+        with pytest.raises(ValueError):
+            db.outbox_update(id1, 'rendered', colour='red')
+    with MemeDatabase('foo', db_path) as db:
+        entry = db.outbox_get(id1)
+        assert entry.state == 'rendered'
+        assert entry.question == example_se_item_1
+        assert entry.img_url == 'http://x/1.jpg'
+        assert [e.question_id for e in db.outbox_unfinished()] == [id1, id2]
+        db.outbox_update(id1, 'tweeted', tweet_id='99')
+        db.outbox_remove(id2)
+        assert db.outbox_unfinished() == []
+    with MemeDatabase('foo', db_path) as db:
+        # tweeted questions are recorded as known and leave the outbox
+        assert db.question_is_known(id1)
+        assert not db.question_is_known(id2)
+        assert db.outbox_get(id1) is None
+        db.outbox_add([example_se_item_2])
+        db.insert_question(id2)
+        assert db.outbox_get(id2) is None
+    teardown_db(db_path)
+
+def test_database_outbox_image_file(example_se_item_1):
+    teardown_db(db_path)
+    id = example_se_item_1['question_id']
+    img = SpooledTemporaryFile()
+    img.write(b'GIF89a' * 1000)
+    img.seek(0)
+    with MemeDatabase('foo', db_path) as db:
+        db.outbox_add([example_se_item_1])
+        db.outbox_update(id, 'downloaded', img=img)
+        assert img.tell() == 0
+        assert db.outbox_get(id).img == b'GIF89a' * 1000
+    teardown_db(db_path)
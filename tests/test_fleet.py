@@ -0,0 +1,64 @@
+import os
+from io import BytesIO
+from unittest.mock import patch
+
+from memeoverflow import MemeOverflowFleet, MemeDatabase
+
+
+def teardown_db(db_path):
+    for suffix in ('', '-wal', '-shm'):
+        try:
+            os.remove(db_path + suffix)
+        except FileNotFoundError:
+            pass
+
+def make_sites(fake_twitter, fake_imgflip, names):
+    return [
+        {
+            'twitter': fake_twitter,
+            'imgflip': fake_imgflip,
+            'stackexchange': {'site': name, 'key': 'stack_key'},
+            'tweet_interval': 100,
+            'poll_interval': 100,
+        }
+        for name in names
+    ]
+
+def test_fleet_init(fake_twitter, fake_imgflip, test_db):
+    teardown_db(test_db)
+    fleet = MemeOverflowFleet(
+        make_sites(fake_twitter, fake_imgflip, ['foo', 'bar']), test_db
+    )
+    assert repr(fleet) == "<MemeOverflowFleet sites=2>"
+    assert fleet.bots[0].db.conn is fleet.bots[1].db.conn
+    assert fleet.bots[0].imgflip._http is fleet.session
+    teardown_db(test_db)
+
+def test_fleet_step(fake_twitter, fake_imgflip, test_db, example_se_item_1,
+                    example_imgflip_img_url):
+    teardown_db(test_db)
+    fleet = MemeOverflowFleet(
+        make_sites(fake_twitter, fake_imgflip, ['foo', 'bar']), test_db
+    )
+    for bot in fleet.bots:
+        bot.stackexchange.get_questions = lambda **kw: [example_se_item_1]
+        bot.imgflip.make_meme = lambda **kw: example_imgflip_img_url
+        bot.twitter.tweet_with_image = lambda status, img: None
+    with patch('memeoverflow.memeoverflow.download_image_bytes',
+               return_value=BytesIO(b'blob')):
+        assert fleet.step() == 0
+        delay = fleet.step()
+    assert 0 < delay <= 100
+    for bot in fleet.bots:
+        assert bot.db.question_is_known(example_se_item_1['question_id'])
+    teardown_db(test_db)
+
+def test_fleet_close(fake_twitter, fake_imgflip, test_db):
+    teardown_db(test_db)
+    sites = make_sites(fake_twitter, fake_imgflip, ['foo', 'bar'])
+    sites[0]['batch_interval'] = 60
+    with MemeOverflowFleet(sites, test_db) as fleet:
+        fleet.bots[0].db.insert_question(1)
+    with MemeDatabase('foo', test_db) as db:
+        assert db.question_is_known(1)
+    teardown_db(test_db)
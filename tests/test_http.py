@@ -0,0 +1,24 @@
+from unittest.mock import patch
+
+from memeoverflow.http import Session, make_session, default_session
+
+
+def test_make_session_pools():
+    session = make_session(pool_sizes={'api.example.com': 3}, pool_maxsize=7)
+    assert isinstance(session, Session)
+    adapter = session.get_adapter('https://api.example.com/foo')
+    assert adapter._pool_maxsize == 3
+    assert adapter.max_retries.total == 3
+    assert session.get_adapter('https://other.example.com/')._pool_maxsize == 7
+
+def test_session_default_timeout():
+    session = make_session(timeout=12)
+    with patch('requests.Session.request') as request:
+        session.get('https://api.example.com/foo')
+    assert request.call_args[1]['timeout'] == 12
+    with patch('requests.Session.request') as request:
+        session.get('https://api.example.com/foo', timeout=1)
+    assert request.call_args[1]['timeout'] == 1
+
+def test_default_session_shared():
+    assert default_session() is default_session()
@@ -0,0 +1,67 @@
+import sys
+import subprocess
+
+import pytest
+
+import memeoverflow
+
+
+# modules which tools doing only local work (the database, hashtags, statuses
+# and classifying titles) shouldn't have to import
+HEAVY_MODULES = (
+    'twython', 'requests', 'logzero', 'memeoverflow.imgflip', 'http.server',
+)
+
+# the light modules may take at most this proportion of the time the API
+# clients' dependencies take to import on the same machine - well above what
+# they need, so this doesn't depend on how fast the machine is
+IMPORT_BUDGET = 0.5
+
+
+def import_times(code):
+    """
+    Return a dict of the cumulative import time in microseconds of each
+    module imported by code, and the set of modules imported directly by code
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        capture_output=True, text=True, check=True,
+    )
+    times = {}
+    top_level = set()
+    for line in result.stderr.splitlines()[1:]:
+        self_us, cumulative_us, name = line.split('|')
+        times[name.strip()] = int(cumulative_us)
+        if not name[1:].startswith(' '):
+            top_level.add(name.strip())
+    return times, top_level
+
+def test_lazy_names():
+    assert memeoverflow.MemeDatabase.__name__ == 'MemeDatabase'
+    assert set(memeoverflow.__all__) <= set(dir(memeoverflow))
+    with pytest.raises(AttributeError):
+        memeoverflow.NotAThing
+
+def test_import_budget():
+    times, top_level = import_times(
+        # importtime only reports modules imported by import statements, not
+        # those the lazy loader imports
+        'import memeoverflow.db, memeoverflow.utils, memeoverflow.status, '
+        'memeoverflow.classify; from memeoverflow import MemeDatabase'
+    )
+    for module in HEAVY_MODULES:
+        assert module not in times
+    total = sum(
+        times[name] for name in top_level if name.startswith('memeoverflow')
+    )
+    heavy_times, heavy_top_level = import_times('import requests, twython')
+    baseline = heavy_times['requests'] + heavy_times['twython']
+    assert total < baseline * IMPORT_BUDGET
+
+def test_maintenance_command_imports():
+    times, top_level = import_times(
+        'import sys; sys.argv = ["memeoverflow", "--help"]; '
+        'import memeoverflow.__main__'
+    )
+    for module in HEAVY_MODULES:
+        assert module not in times
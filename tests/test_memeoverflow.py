@@ -0,0 +1,207 @@
+import os
+from io import BytesIO
+from time import monotonic
+from unittest.mock import patch
+
+from memeoverflow import MemeOverflow, MemeDatabase
+from memeoverflow.cache import ImageCache
+from memeoverflow.exc import TwitterDuplicateError
+
+
+def teardown_db(db_path):
+    try:
+        os.remove(db_path)
+    except FileNotFoundError:
+        pass
+
+def make_bot(fake_twitter, fake_imgflip, fake_stack_with_key, test_db,
+             **kwargs):
+    teardown_db(test_db)
+    return MemeOverflow(
+        fake_twitter, fake_imgflip, fake_stack_with_key, test_db, **kwargs
+    )
+
+def test_memeoverflow_init(fake_twitter, fake_imgflip, fake_stack_with_key,
+                           test_db):
+    mo = make_bot(fake_twitter, fake_imgflip, fake_stack_with_key, test_db)
+    assert repr(mo) == "<MemeOverflow site='stackexchange'>"
+    teardown_db(test_db)
+
+def test_memeoverflow_step(fake_twitter, fake_imgflip, fake_stack_with_key,
+                           test_db, example_se_item_1, example_se_item_2,
+                           example_imgflip_img_url):
+    mo = make_bot(fake_twitter, fake_imgflip, fake_stack_with_key, test_db,
+                  tweet_interval=100)
+    questions = [example_se_item_1, example_se_item_2]
+    with patch.object(mo.stackexchange, 'get_questions',
+                      return_value=questions), \
+            patch.object(mo.imgflip, 'make_meme',
+                         return_value=example_imgflip_img_url), \
+            patch('memeoverflow.memeoverflow.download_image_bytes',
+                  return_value=BytesIO(b'blob')), \
+            patch.object(mo.twitter, 'tweet_with_image') as tweet:
+        delay = mo.step()
+        assert 0 < delay <= 100
+        assert tweet.call_count == 1
+        assert len(mo.pending) == 1
+        assert mo.step() > 0
+        assert tweet.call_count == 1
+    assert mo.db.question_is_known(example_se_item_1['question_id'])
+    teardown_db(test_db)
+
+def test_memeoverflow_retry(fake_twitter, fake_imgflip, fake_stack_with_key,
+                            test_db, example_se_item_1):
+    mo = make_bot(fake_twitter, fake_imgflip, fake_stack_with_key, test_db,
+                  max_attempts=2)
+    mo.pending.append(example_se_item_1)
+    with patch.object(mo, 'generate_meme_and_tweet', return_value=False):
+        assert not mo.tweet_next()
+        assert mo.scheduler.tweet_due()
+        assert list(mo.pending) == [example_se_item_1]
+        assert not mo.tweet_next()
+        assert not mo.pending
+    teardown_db(test_db)
+
+def test_memeoverflow_image_cache(fake_twitter, fake_imgflip,
+                                  fake_stack_with_key, test_db, tmp_path,
+                                  example_se_item_1, example_imgflip_img_url):
+    mo = make_bot(fake_twitter, fake_imgflip, fake_stack_with_key, test_db,
+                  image_cache=ImageCache(str(tmp_path)))
+    with patch.object(mo.imgflip, 'make_meme',
+                      return_value=example_imgflip_img_url) as make_meme, \
+            patch('memeoverflow.memeoverflow.download_image_bytes',
+                  side_effect=lambda url, session: BytesIO(b'blob')) as dl:
+        first = mo.prepare_meme(example_se_item_1)
+        second = mo.prepare_meme(example_se_item_1)
+    assert first.meme == second.meme
+    assert second.img_bytes.read() == b'blob'
+    assert make_meme.call_count == 1
+    assert dl.call_count == 1
+    teardown_db(test_db)
+
+def test_memeoverflow_prefetch(fake_twitter, fake_imgflip, fake_stack_with_key,
+                               test_db, example_se_item_1, example_se_item_2,
+                               example_imgflip_img_url):
+    mo = make_bot(fake_twitter, fake_imgflip, fake_stack_with_key, test_db,
+                  tweet_interval=100, prefetch=1)
+    questions = [example_se_item_1, example_se_item_2]
+    with patch.object(mo.stackexchange, 'get_questions',
+                      return_value=questions), \
+            patch.object(mo.imgflip, 'make_meme',
+                         return_value=example_imgflip_img_url) as make_meme, \
+            patch('memeoverflow.memeoverflow.download_image_bytes',
+                  return_value=BytesIO(b'blob')), \
+            patch.object(mo.twitter, 'tweet_with_image') as tweet:
+        mo.step()
+        assert tweet.call_count == 1
+        # the second question's meme is made during the cooldown
+        assert make_meme.call_count == 2
+        assert list(mo.ready) == [example_se_item_2['question_id']]
+        mo.scheduler.next_tweet_at = 0
+        mo.step()
+        assert tweet.call_count == 2
+        assert make_meme.call_count == 2
+    assert mo.prefetch_stats == {'rendered': 1, 'used': 1, 'discarded': 0}
+    teardown_db(test_db)
+
+def test_memeoverflow_outbox_resume(fake_twitter, fake_imgflip,
+                                    fake_stack_with_key, test_db,
+                                    example_se_item_1, example_se_item_2,
+                                    example_imgflip_img_url):
+    mo = make_bot(fake_twitter, fake_imgflip, fake_stack_with_key, test_db)
+    id1 = example_se_item_1['question_id']
+    id2 = example_se_item_2['question_id']
+    mo.db.outbox_add([example_se_item_1, example_se_item_2])
+    mo.db.outbox_update(id1, 'rendered', meme='BATMAN_SLAPPING_ROBIN',
+                        text0='a', text1='b', img_url=example_imgflip_img_url)
+    mo.db.outbox_update(id2, 'downloaded', meme='BATMAN_SLAPPING_ROBIN',
+                        text0='c', text1='d', img_url=example_imgflip_img_url,
+                        img=b'blob')
+    mo.db.close()
+    # a new process carries on where the last one stopped
+    mo = MemeOverflow(fake_twitter, fake_imgflip, fake_stack_with_key,
+                      test_db)
+    assert [q['question_id'] for q in mo.pending] == [id1, id2]
+    with patch.object(mo.imgflip, 'make_meme') as make_meme, \
+            patch('memeoverflow.memeoverflow.download_image_bytes',
+                  return_value=BytesIO(b'blob')) as dl:
+        first = mo.prepare_meme(example_se_item_1)
+        second = mo.prepare_meme(example_se_item_2)
+    assert not make_meme.called
+    assert dl.call_count == 1
+    assert (first.meme, second.meme) == ('BATMAN_SLAPPING_ROBIN', ) * 2
+    assert second.img_bytes.read() == b'blob'
+    # images are only stored if asked for
+    assert mo.db.outbox_get(id1).state == 'rendered'
+    mo.outbox_images = True
+    with patch('memeoverflow.memeoverflow.download_image_bytes',
+               return_value=BytesIO(b'blob')):
+        mo.prepare_meme(example_se_item_1)
+    assert mo.db.outbox_get(id1).img == b'blob'
+    teardown_db(test_db)
+
+def test_memeoverflow_outbox_duplicate(fake_twitter, fake_imgflip,
+                                       fake_stack_with_key, test_db,
+                                       example_se_item_1,
+                                       example_imgflip_img_url):
+    mo = make_bot(fake_twitter, fake_imgflip, fake_stack_with_key, test_db)
+    id = example_se_item_1['question_id']
+    with patch.object(mo.imgflip, 'make_meme',
+                      return_value=example_imgflip_img_url), \
+            patch('memeoverflow.memeoverflow.download_image_bytes',
+                  return_value=BytesIO(b'blob')):
+        prepared = mo.prepare_meme(example_se_item_1)
+    # the meme was tweeted by a process which stopped before recording it
+    with patch.object(mo.twitter, 'tweet_with_image',
+                      side_effect=TwitterDuplicateError('duplicate')):
+        assert mo.tweet_meme(prepared)
+    entry = mo.db.outbox_get(id)
+    assert entry.state == 'tweeted'
+    assert entry.img is None
+    mo.db.insert_question(id)
+    assert mo.db.outbox_get(id) is None
+    teardown_db(test_db)
+
+def test_memeoverflow_max_pending(fake_twitter, fake_imgflip,
+                                  fake_stack_with_key, test_db):
+    mo = make_bot(fake_twitter, fake_imgflip, fake_stack_with_key, test_db,
+                  max_pending=2)
+    questions = [
+        {'question_id': id, 'creation_date': 1600000000 + id,
+         'title': 'foo', 'link': 'bar', 'tags': []}
+        for id in (3, 4, 1, 2)
+    ]
+    with patch.object(mo.stackexchange, 'get_questions',
+                      return_value=questions):
+        mo.poll()
+    # the newest are kept
+    assert sorted(q['question_id'] for q in mo.pending) == [3, 4]
+    assert sorted(e.question_id for e in mo.db.outbox_unfinished()) == [3, 4]
+    teardown_db(test_db)
+
+def test_memeoverflow_db_options(fake_twitter, fake_imgflip,
+                                 fake_stack_with_key, test_db):
+    mo = make_bot(fake_twitter, fake_imgflip, fake_stack_with_key, test_db,
+                  cache_size=100, batch_size=10)
+    with mo:
+        assert mo.db._bloom is not None
+        mo.db.insert_question(1)
+        assert mo.db.question_is_known(1)
+        with MemeDatabase(mo.site, test_db) as db:
+            assert not db.question_is_known(1)
+    # closing the bot writes the batched IDs
+    with MemeDatabase(mo.site, test_db) as db:
+        assert db.question_is_known(1)
+    teardown_db(test_db)
+
+def test_memeoverflow_poll_backoff(fake_twitter, fake_imgflip,
+                                   fake_stack_with_key, test_db, monkeypatch):
+    mo = make_bot(fake_twitter, fake_imgflip, fake_stack_with_key, test_db)
+    monkeypatch.setattr(mo.stackexchange.governor, 'backoff_until',
+                        monotonic() + 30)
+    with patch.object(mo.stackexchange, 'get_questions') as get_questions:
+        mo.poll()
+    # the poll is postponed rather than blocking the thread
+    get_questions.assert_not_called()
+    assert 29 < mo.scheduler.time_until_poll() <= 30
+    teardown_db(test_db)
@@ -0,0 +1,51 @@
+import random
+
+import pytest
+
+from memeoverflow import MEMES
+from memeoverflow.memes import (
+    TEMPLATES, QUESTION_POOL, STATEMENT_POOL, SPECIAL_MEMES, MemeTemplate,
+    compile_templates, compile_pool,
+)
+
+
+def test_templates_match_memes():
+    assert set(TEMPLATES) == set(MEMES)
+    for name, meme in MEMES.items():
+        template = TEMPLATES[name]
+        assert template.id == meme['id']
+        assert template.text_location == meme['text_location']
+
+def test_templates_immutable():
+    with pytest.raises(TypeError):
+        TEMPLATES['FOO'] = None
+    with pytest.raises(AttributeError):
+        TEMPLATES['ZOIDBERG'].id = 1
+    with pytest.raises(AttributeError):
+        TEMPLATES['ZOIDBERG'].foo = 1
+
+def test_place_text(BATMAN_SLAPPING_ROBIN):
+    assert TEMPLATES['ANCIENT_ALIENS'].place_text('foo') == (
+        'foo', 'Therefore aliens'
+    )
+    assert TEMPLATES['BAD_LUCK_BRIAN'].place_text('foo') == (None, 'foo')
+    assert TEMPLATES['BATMAN_SLAPPING_ROBIN'].id == BATMAN_SLAPPING_ROBIN
+
+def test_pools():
+    assert not SPECIAL_MEMES & set(QUESTION_POOL)
+    assert not SPECIAL_MEMES & set(STATEMENT_POOL)
+    assert 'CHANGE_MY_MIND' not in QUESTION_POOL
+    assert 'CHANGE_MY_MIND' in STATEMENT_POOL
+    assert 'GRUMPY_CAT' in QUESTION_POOL
+    assert 'GRUMPY_CAT' not in STATEMENT_POOL
+
+def test_weighted_pool():
+    templates = compile_templates({
+        'A': {'id': 1, 'text0': None, 'text1': None, 'text_location': 'text0',
+              'weight': 3},
+        'B': {'id': 2, 'text0': None, 'text1': None, 'text_location': 'text0'},
+    })
+    assert isinstance(templates['A'], MemeTemplate)
+    assert compile_pool(templates, exclude=set()) == ('A', 'A', 'A', 'B')
+    assert compile_pool(templates, exclude={'A'}) == ('B', )
+    assert random.choice(compile_pool(templates, exclude={'B'})) == 'A'
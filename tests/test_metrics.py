@@ -0,0 +1,118 @@
+import requests
+
+from memeoverflow import MemeOverflow
+from memeoverflow.http import make_session
+from memeoverflow.metrics import (
+    MetricsCollector, MetricsServer, NullCollector, NULL_COLLECTOR,
+)
+from memeoverflow.standin import (
+    StackExchangeStandIn, ImgFlipStandIn, TwitterStandIn,
+)
+
+
+def test_counters_and_gauges():
+    metrics = MetricsCollector()
+    metrics.inc('tweets_total', site='a')
+    metrics.inc('tweets_total', 2, site='a')
+    metrics.inc('tweets_total', site='b')
+    metrics.set('queue_depth', 5, queue='pending')
+    metrics.set('queue_depth', 3, queue='pending')
+    assert metrics.get('tweets_total', site='a') == 3
+    assert metrics.get('tweets_total', site='c') is None
+    assert metrics.total('tweets_total') == 4
+    assert metrics.get('queue_depth', queue='pending') == 3
+
+def test_histogram():
+    metrics = MetricsCollector(buckets=(0.1, 1))
+    metrics.observe('request_seconds', 0.05, api='x')
+    metrics.observe('request_seconds', 0.1, api='x')
+    metrics.observe('request_seconds', 5, api='x')
+    with metrics.timer('request_seconds', api='x'):
+        pass
+    count, total = metrics.get('request_seconds', api='x')
+    assert count == 4
+    assert 5.15 <= total < 5.2
+    text = metrics.exposition()
+    assert '# TYPE request_seconds histogram' in text
+    assert 'request_seconds_bucket{api="x",le="0.1"} 3' in text
+    assert 'request_seconds_bucket{api="x",le="1"} 3' in text
+    assert 'request_seconds_bucket{api="x",le="+Inf"} 4' in text
+    assert 'request_seconds_count{api="x"} 4' in text
+
+def test_bind():
+    metrics = MetricsCollector()
+    bound = metrics.bind(site='a').bind(stage='poll')
+    bound.inc('memeoverflow_tweets_total')
+    with bound.timer('memeoverflow_stage_seconds'):
+        pass
+    assert metrics.get('memeoverflow_tweets_total', site='a',
+                       stage='poll') == 1
+    assert metrics.total('memeoverflow_stage_seconds', site='a') == 1
+    text = metrics.exposition()
+    assert '# HELP memeoverflow_tweets_total Memes tweeted' in text
+    assert 'memeoverflow_tweets_total{site="a",stage="poll"} 1' in text
+
+def test_null_collector():
+    assert NULL_COLLECTOR.bind(site='a') is NULL_COLLECTOR
+    with NullCollector().timer('request_seconds'):
+        pass
+
+def test_metrics_server():
+    metrics = MetricsCollector()
+    metrics.inc('memeoverflow_tweets_total', site='a')
+    with MetricsServer(metrics, port=0) as server:
+        r = requests.get(server.url)
+        assert r.status_code == 200
+        assert r.headers['Content-Type'].startswith('text/plain')
+        assert 'memeoverflow_tweets_total{site="a"} 1' in r.text
+        assert requests.get(server.url[:-len('metrics')]).status_code == 404
+
+def test_memeoverflow_metrics(tmp_path):
+    metrics = MetricsCollector()
+    with StackExchangeStandIn(quota=100) as se, ImgFlipStandIn() as imgflip, \
+            TwitterStandIn() as twitter:
+        se.add_questions([
+            {
+                'question_id': id,
+                'title': f'Question {id}',
+                'link': f'https://example.com/questions/{id}/question',
+                'tags': ['tag'],
+                'creation_date': 1000 + id,
+            }
+            for id in range(3)
+        ])
+        bot = MemeOverflow(
+            twitter={
+                'con_key': 'k', 'con_sec': 's', 'acc_tok': 't', 'acc_sec': 's',
+                'api_url': twitter.api_url, 'upload_url': twitter.upload_url,
+            },
+            imgflip={
+                'username': 'u', 'password': 'p', 'api_url': imgflip.api_url,
+            },
+            stackexchange={
+                'site': 'stackexchange', 'key': 'metrics',
+                'api_url': se.api_url,
+            },
+            db_path=str(tmp_path / 'memes.db'),
+            session=make_session(),
+            tweet_interval=0,
+            metrics=metrics,
+        )
+        bot.step()
+        bot.step()
+    site = {'site': 'stackexchange'}
+    assert metrics.get('memeoverflow_questions_fetched_total', **site) == 3
+    assert metrics.get('memeoverflow_questions_new_total', **site) == 3
+    assert metrics.get('memeoverflow_questions_known_total', **site) == 0
+    assert metrics.get('memeoverflow_memes_rendered_total', **site) == 2
+    assert metrics.get('memeoverflow_tweets_total', **site) == 2
+    assert metrics.get('memeoverflow_queue_depth', queue='pending',
+                       **site) == 1
+    assert metrics.get('memeoverflow_stackexchange_quota_remaining',
+                       **site) == 99
+    for stage in ('poll', 'render', 'tweet'):
+        assert metrics.total('memeoverflow_stage_seconds', stage=stage) > 0
+    for api in ('stackexchange', 'imgflip', 'imgflip_image', 'twitter_media',
+                'twitter_status'):
+        assert metrics.total('memeoverflow_request_seconds', api=api) > 0
+    assert metrics.total('memeoverflow_db_seconds', op='insert') == 2
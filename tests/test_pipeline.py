@@ -0,0 +1,119 @@
+import os
+import asyncio
+from io import BytesIO
+from unittest.mock import patch
+
+import pytest
+
+from memeoverflow import AsyncMemeOverflow, MemeDatabase
+from memeoverflow.exc import ImgFlipError, TwitterError
+
+
+def teardown_db(db_path):
+    try:
+        os.remove(db_path)
+    except FileNotFoundError:
+        pass
+
+def test_async_memeoverflow_init(fake_twitter, fake_imgflip,
+                                 fake_stack_with_key, test_db):
+    teardown_db(test_db)
+    mo = AsyncMemeOverflow(
+        fake_twitter, fake_imgflip, fake_stack_with_key, test_db
+    )
+    assert repr(mo) == "<AsyncMemeOverflow site='stackexchange'>"
+    teardown_db(test_db)
+
+def test_async_memeoverflow_run(fake_twitter, fake_imgflip,
+                                fake_stack_with_key, test_db,
+                                example_se_item_1, example_se_item_2,
+                                example_imgflip_img_url):
+    teardown_db(test_db)
+    mo = AsyncMemeOverflow(
+        fake_twitter, fake_imgflip, fake_stack_with_key, test_db,
+        tweet_interval=0, poll_interval=0,
+    )
+    questions = [example_se_item_1, example_se_item_2]
+    with patch.object(mo.stackexchange, 'get_questions',
+                      return_value=questions), \
+            patch.object(mo.imgflip, 'make_meme',
+                         return_value=example_imgflip_img_url), \
+            patch('memeoverflow.memeoverflow.download_image_bytes',
+                  return_value=BytesIO(b'blob')), \
+            patch.object(mo.twitter, 'tweet_with_image') as tweet:
+        mo.run(max_tweets=2)
+    assert tweet.call_count == 2
+    with MemeDatabase('stackexchange', test_db) as db:
+        assert db.question_is_known(example_se_item_1['question_id'])
+        assert db.question_is_known(example_se_item_2['question_id'])
+    teardown_db(test_db)
+
+def test_async_memeoverflow_stage_failure(fake_twitter, fake_imgflip,
+                                          fake_stack_with_key, test_db,
+                                          example_se_item_1):
+    teardown_db(test_db)
+    mo = AsyncMemeOverflow(
+        fake_twitter, fake_imgflip, fake_stack_with_key, test_db,
+        tweet_interval=0, poll_interval=0, renderers=1,
+    )
+    with patch.object(mo.stackexchange, 'get_questions',
+                      return_value=[example_se_item_1]), \
+            patch.object(mo.imgflip, 'make_meme', side_effect=RuntimeError):
+        # the failure stops the pipeline rather than stalling it
+        with pytest.raises(RuntimeError):
+            asyncio.run(asyncio.wait_for(mo.run_async(max_tweets=1), 10))
+    teardown_db(test_db)
+
+def test_async_memeoverflow_retry(fake_twitter, fake_imgflip,
+                                  fake_stack_with_key, test_db,
+                                  example_se_item_1, example_imgflip_img_url):
+    teardown_db(test_db)
+    mo = AsyncMemeOverflow(
+        fake_twitter, fake_imgflip, fake_stack_with_key, test_db,
+        tweet_interval=0, poll_interval=0,
+    )
+    # later polls only return newer questions, so the question has to be
+    # retried from the queue each time it fails
+    polls = [[example_se_item_1]]
+    with patch.object(mo.stackexchange, 'get_questions',
+                      side_effect=lambda *args: polls.pop() if polls else []), \
+            patch.object(mo.imgflip, 'make_meme',
+                         side_effect=[ImgFlipError, example_imgflip_img_url]), \
+            patch('memeoverflow.memeoverflow.download_image_bytes',
+                  return_value=BytesIO(b'blob')), \
+            patch.object(mo.twitter, 'tweet_with_image',
+                         side_effect=[TwitterError, '1']) as tweet:
+        mo.run(max_tweets=1)
+    assert tweet.call_count == 2
+    with MemeDatabase('stackexchange', test_db) as db:
+        assert db.question_is_known(example_se_item_1['question_id'])
+    teardown_db(test_db)
+
+def test_async_memeoverflow_options(fake_twitter, fake_imgflip,
+                                    fake_stack_with_key, test_db,
+                                    example_se_item_1, example_se_item_2,
+                                    example_imgflip_img_url):
+    teardown_db(test_db)
+    with pytest.raises(ValueError):
+        AsyncMemeOverflow(fake_twitter, fake_imgflip, fake_stack_with_key,
+                          test_db, prefetch=2)
+    mo = AsyncMemeOverflow(
+        fake_twitter, fake_imgflip, fake_stack_with_key, test_db,
+        tweet_interval=0, poll_interval=0, max_pending=1, batch_size=10,
+    )
+    questions = [example_se_item_1, example_se_item_2]
+    polls = [questions]
+    with patch.object(mo.stackexchange, 'get_questions',
+                      side_effect=lambda *args: polls.pop() if polls else []), \
+            patch.object(mo.imgflip, 'make_meme',
+                         return_value=example_imgflip_img_url), \
+            patch('memeoverflow.memeoverflow.download_image_bytes',
+                  return_value=BytesIO(b'blob')), \
+            patch.object(mo.twitter, 'tweet_with_image') as tweet:
+        mo.run(max_tweets=1)
+    assert tweet.call_count == 1
+    # the older question was skipped, and the batched ID written on exit
+    with MemeDatabase('stackexchange', test_db) as db:
+        assert not db.question_is_known(example_se_item_1['question_id'])
+        assert db.question_is_known(example_se_item_2['question_id'])
+    teardown_db(test_db)
@@ -0,0 +1,95 @@
+import os
+import signal
+from unittest.mock import patch
+
+from memeoverflow import MemeOverflow, MemeOverflowFleet
+from memeoverflow import profiling
+from memeoverflow.profiling import Profiler
+
+
+def busy():
+    return sum(i * i for i in range(10000))
+
+def test_profile_run(tmp_path):
+    profiler = Profiler(str(tmp_path), cycles=2)
+    with profiler.cycle():
+        busy()
+    assert not os.listdir(tmp_path)
+    profiler.request()
+    for i in range(3):
+        with profiler.cycle():
+            busy()
+    assert profiler.runs == 1
+    assert not profiler.profiling
+    files = sorted(os.listdir(tmp_path))
+    assert [os.path.splitext(f)[1] for f in files] == [
+        '.collapsed', '.pstats', '.txt'
+    ]
+    with open(tmp_path / files[0]) as f:
+        stacks = f.read()
+    assert 'busy (test_profiling.py' in stacks
+    assert all(line.rsplit(' ', 1)[1].isdigit() for line in stacks.splitlines())
+
+def test_tracemalloc_snapshots(tmp_path):
+    profiler = Profiler(str(tmp_path), snapshot_interval=2)
+    profiler.toggle_tracing()
+    leak = []
+    for i in range(4):
+        with profiler.cycle():
+            leak.append(bytearray(100000))
+    assert profiler.snapshots == 2
+    profiler.toggle_tracing()
+    with profiler.cycle():
+        pass
+    files = sorted(os.listdir(tmp_path))
+    assert len(files) == 2
+    with open(tmp_path / files[0]) as f:
+        assert 'test_profiling.py' in f.read()
+
+def test_from_env(tmp_path):
+    assert Profiler.from_env({}) is None
+    with patch('signal.signal') as install:
+        profiler = Profiler.from_env({
+            'MEMEOVERFLOW_PROFILE': '5',
+            'MEMEOVERFLOW_PROFILE_DIR': str(tmp_path),
+        })
+    assert profiler.output_dir == str(tmp_path)
+    assert profiler._requested == 5
+    handlers = {call.args[0]: call.args[1] for call in install.call_args_list}
+    handlers[signal.SIGUSR1](signal.SIGUSR1, None)
+    assert profiler._requested == profiler.cycles
+
+def test_memeoverflow_profiler(fake_twitter, fake_imgflip, fake_stack_with_key,
+                               tmp_path):
+    profiler = Profiler(str(tmp_path), cycles=1)
+    profiler.request()
+    mo = MemeOverflow(fake_twitter, fake_imgflip, fake_stack_with_key,
+                      str(tmp_path / 'memes.db'), profiler=profiler)
+    with patch.object(mo, 'step', return_value=0):
+        mo()
+    assert profiler.runs == 1
+
+def test_default_profiler(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, '_default_profiler', None)
+    monkeypatch.setattr(profiling, '_default_profiler_pid', None)
+    monkeypatch.setenv('MEMEOVERFLOW_PROFILE', '0')
+    monkeypatch.setenv('MEMEOVERFLOW_PROFILE_DIR', str(tmp_path))
+    with patch('signal.signal'):
+        profiler = profiling.default_profiler()
+        assert profiling.default_profiler() is profiler
+    assert profiler.output_dir == str(tmp_path)
+
+def test_fleet_profiler(fake_twitter, fake_imgflip, tmp_path):
+    profiler = Profiler(str(tmp_path), cycles=1)
+    profiler.request()
+    sites = [
+        {'twitter': fake_twitter, 'imgflip': fake_imgflip,
+         'stackexchange': {'site': name, 'key': 'stack_key'}}
+        for name in ('foo', 'bar')
+    ]
+    fleet = MemeOverflowFleet(sites, str(tmp_path / 'memes.db'),
+                              profiler=profiler)
+    assert all(bot.profiler is profiler for bot in fleet.bots)
+    with patch.object(fleet, 'step', return_value=0):
+        fleet()
+    assert profiler.runs == 1
@@ -0,0 +1,29 @@
+import pytest
+
+from memeoverflow.render import LocalRenderer, wrap_text
+
+Image = pytest.importorskip('PIL.Image')
+
+
+@pytest.fixture()
+def template_dir(tmp_path, BATMAN_SLAPPING_ROBIN):
+    Image.new('RGB', (400, 300), 'grey').save(
+        tmp_path / f'{BATMAN_SLAPPING_ROBIN}.jpg'
+    )
+    return str(tmp_path)
+
+def test_wrap_text():
+    assert wrap_text('aa bb cc', len, 5) == ['aa bb', 'cc']
+    assert wrap_text('aaaaaaa bb', len, 5) == ['aaaaaaa', 'bb']
+    assert wrap_text('', len, 5) == []
+
+def test_local_renderer_make_meme(template_dir):
+    renderer = LocalRenderer(template_dir=template_dir)
+    assert repr(renderer).startswith("<LocalRenderer")
+    img_bytes = renderer.make_meme(
+        meme='BATMAN_SLAPPING_ROBIN',
+        text_parts=('Why does my code not work?', None),
+    )
+    img = Image.open(img_bytes)
+    assert img.format == 'JPEG'
+    assert img.size == (400, 300)
@@ -0,0 +1,41 @@
+import os
+
+from memeoverflow.replay import (
+    replay, synthetic_questions, load_questions, percentile, STAGES,
+)
+
+
+def test_percentile():
+    values = list(range(1, 11))
+    assert percentile(values, 50) == 5
+    assert percentile(values, 90) == 9
+    assert percentile(values, 100) == 10
+    assert percentile([], 50) is None
+
+def test_load_questions(tmp_path):
+    path = tmp_path / 'questions.jsonl'
+    path.write_text(
+        '{"question_id": 2, "creation_date": 20}\n'
+        '\n'
+        '{"question_id": 1, "creation_date": 10}\n'
+    )
+    questions = load_questions(str(path))
+    assert [q['question_id'] for q in questions] == [1, 2]
+
+def test_replay(tmp_path):
+    questions = synthetic_questions(5, interval=10)
+    report = replay(
+        questions,
+        db_path=os.path.join(tmp_path, 'replay.db'),
+        speed=100,
+        bot_options={'poll_interval': 0.1},
+        timeout=30,
+    )
+    assert report.questions == 5
+    assert report.tweets == 5
+    assert report.failures == 0
+    assert report.memes_per_minute > 0
+    assert len(report.latencies['end_to_end']) == 5
+    assert report.percentile('render', 50) is not None
+    for stage in STAGES:
+        assert stage in report.summary()
@@ -0,0 +1,41 @@
+from unittest.mock import patch
+
+from memeoverflow.scheduler import Scheduler
+
+
+def test_scheduler_initially_due():
+    scheduler = Scheduler()
+    assert scheduler.tweet_due()
+    assert scheduler.poll_due()
+    assert scheduler.time_until_next() == 0
+
+def test_scheduler_deadlines():
+    with patch('memeoverflow.scheduler.monotonic', return_value=1000):
+        scheduler = Scheduler(tweet_interval=300, poll_interval=60,
+                              retry_interval=5)
+        scheduler.tweeted()
+        scheduler.polled()
+        assert not scheduler.tweet_due()
+        assert scheduler.time_until_tweet() == 300
+        assert scheduler.time_until_next(pending=True) == 60
+        scheduler.polled(interval=600)
+        assert scheduler.time_until_next(pending=True) == 300
+        assert scheduler.time_until_next(pending=False) == 600
+        scheduler.tweeted(success=False)
+        assert scheduler.time_until_tweet() == 5
+
+def test_scheduler_backoff():
+    with patch('memeoverflow.scheduler.monotonic', return_value=1000):
+        scheduler = Scheduler(retry_interval=0, backoff_after=2, backoff=10,
+                              max_backoff=30)
+        scheduler.tweeted(success=False)
+        # a single failure is retried straight away
+        assert scheduler.time_until_tweet() == 0
+        delays = []
+        for i in range(4):
+            scheduler.tweeted(success=False)
+            delays.append(scheduler.time_until_tweet())
+        assert delays == [10, 20, 30, 30]
+        scheduler.tweeted()
+        scheduler.tweeted(success=False)
+        assert scheduler.time_until_tweet() == 0
@@ -0,0 +1,98 @@
+from unittest.mock import Mock
+
+import pytest
+from requests.exceptions import ConnectionError
+
+from memeoverflow import StackExchange
+from memeoverflow.exc import StackExchangeError, StackExchangeNoKeyWarning
+
+
+def fake_session(*responses):
+    session = Mock()
+    session.get.side_effect = [
+        Mock(json=Mock(return_value=response)) for response in responses
+    ]
+    return session
+
+def test_stackexchange_no_key(fake_stack_no_key):
+    with pytest.warns(StackExchangeNoKeyWarning):
+        se = StackExchange(**fake_stack_no_key)
+    assert repr(se) == "<StackExchange site='stackexchange'>"
+
+def test_stackexchange_get_questions(fake_stack_with_key, stack_url,
+                                     example_se_response):
+    session = fake_session(example_se_response)
+    se = StackExchange(**fake_stack_with_key, session=session)
+    questions = se.get_questions()
+    assert questions == example_se_response['items']
+    session.get.assert_called_once_with(stack_url, params={
+        'pagesize': 100,
+        'site': 'stackexchange',
+        'key': 'stack_key',
+    })
+
+def test_stackexchange_get_questions_since(fake_stack_with_key,
+                                           example_se_response,
+                                           example_se_item_1):
+    last_page = {'items': [example_se_item_1], 'has_more': False}
+    session = fake_session(example_se_response, last_page)
+    se = StackExchange(**fake_stack_with_key, session=session)
+    questions = se.get_questions(n=2, since=1600000000)
+    assert len(questions) == 3
+    assert session.get.call_count == 2
+    params = session.get.call_args[1]['params']
+    assert params['fromdate'] == 1600000000
+    assert params['sort'] == 'creation'
+    assert params['page'] == 2
+
+def test_stackexchange_bad_response(fake_stack_with_key, empty_dict):
+    se = StackExchange(**fake_stack_with_key, session=fake_session(empty_dict))
+    with pytest.raises(StackExchangeError):
+        se.get_questions()
+
+def test_stackexchange_connection_error(fake_stack_with_key):
+    session = Mock()
+    session.get.side_effect = ConnectionError()
+    se = StackExchange(**fake_stack_with_key, session=session)
+    with pytest.raises(StackExchangeError):
+        se.get_questions()
+
+def test_stackexchange_question_url(fake_stack_with_key_and_userid):
+    se = StackExchange(**fake_stack_with_key_and_userid)
+    url = 'https://stackexchange.com/questions/98765/question-title'
+    assert se.get_question_url(url) == (
+        'https://stackexchange.com/questions/98765/12345'
+    )
+
+def test_stackexchange_governor(example_se_response):
+    session = fake_session(dict(example_se_response, backoff=0))
+    se1 = StackExchange(site='foo', key='governor_key', session=session)
+    se2 = StackExchange(site='bar', key='governor_key', session=session)
+    assert se1.governor is se2.governor
+    assert se1.governor.poll_interval(minimum=60) == 60
+    se1.get_questions()
+    state = se2.governor.state
+    assert state['quota_max'] == 300
+    assert state['quota_remaining'] == 299
+    assert state['sites'] == 2
+    # 2 sites sharing 299 requests over at most a day
+    assert 0 < se2.governor.poll_interval() <= 24 * 60 * 60 * 2 / 299
+
+def test_stackexchange_governor_quota_exhausted(example_se_response):
+    response = dict(example_se_response, quota_remaining=0)
+    session = fake_session(response, response)
+    se = StackExchange(site='foo', key='exhausted_key', session=session)
+    se.get_questions()
+    with pytest.raises(StackExchangeError):
+        se.get_questions()
+    assert session.get.call_count == 1
+
+def test_stackexchange_governor_backoff(example_se_item_1):
+    response = {'items': [example_se_item_1], 'has_more': True, 'backoff': 30}
+    session = fake_session(response)
+    se = StackExchange(site='foo', key='backoff_key', session=session)
+    # the backoff interrupts the poll rather than being slept through
+    with pytest.raises(StackExchangeError):
+        se.get_questions(n=1, since=1600000000)
+    assert session.get.call_count == 1
+    assert 29 < se.governor.poll_interval(minimum=10) <= 30
@@ -0,0 +1,97 @@
+from io import BytesIO
+
+import pytest
+from requests.exceptions import HTTPError
+
+from memeoverflow import StackExchange, ImgFlip, Twitter
+from memeoverflow.http import make_session
+from memeoverflow.utils import download_image_bytes
+from memeoverflow.exc import ImgFlipError, TwitterError
+from memeoverflow.standin import (
+    StackExchangeStandIn, ImgFlipStandIn, TwitterStandIn,
+)
+
+
+def make_questions(n):
+    return [
+        {
+            'question_id': id,
+            'title': f'Question {id}',
+            'link': f'https://example.com/questions/{id}/question',
+            'tags': ['tag'],
+            'creation_date': 1000 + id,
+        }
+        for id in range(n)
+    ]
+
+def test_stackexchange_standin(fake_stack_with_key):
+    with StackExchangeStandIn(quota=100) as se:
+        se.add_questions(make_questions(250))
+        stackexchange = StackExchange(
+            **fake_stack_with_key, session=make_session(), api_url=se.api_url
+        )
+        questions = stackexchange.get_questions(n=100, since=1100)
+        assert len(questions) == 150
+        assert questions[0]['question_id'] == 249
+        assert se.stats['requests'] == 2
+        assert stackexchange.governor.quota_remaining == 98
+
+def test_imgflip_standin(fake_imgflip):
+    session = make_session()
+    with ImgFlipStandIn(image_size=1000) as standin:
+        imgflip = ImgFlip(**fake_imgflip, session=session,
+                          api_url=standin.api_url)
+        img_url = imgflip.make_meme(meme='ANCIENT_ALIENS',
+                                    text_parts=('top', 'bottom'))
+        assert img_url.startswith(standin.url)
+        assert standin.memes[0]['text0'] == 'top'
+        img = download_image_bytes(img_url, session=session)
+        assert len(img.read()) == 1000
+
+def test_imgflip_standin_errors(fake_imgflip):
+    with ImgFlipStandIn(error_rate=1) as standin:
+        imgflip = ImgFlip(**fake_imgflip, session=make_session(retries=0),
+                          api_url=standin.api_url)
+        with pytest.raises(ImgFlipError):
+            imgflip.make_meme(meme='ANCIENT_ALIENS', text_parts=('a', 'b'))
+        assert standin.stats['errors'] == 1
+
+def test_twitter_standin(fake_twitter):
+    with ImgFlipStandIn(image_size=1000) as imgflip, \
+            TwitterStandIn(rate_limit=(10, 60)) as standin:
+        twitter = Twitter(**fake_twitter, api_url=standin.api_url,
+                          upload_url=standin.upload_url, chunk_size=300)
+        img = download_image_bytes(f'{imgflip.url}/images/1.jpg',
+                                   session=make_session())
+        twitter.tweet_with_image('simple', img)
+        twitter.tweet_with_image('chunked', img, chunked=True)
+        assert [tweet['text'] for tweet in standin.tweets] == [
+            'simple', 'chunked'
+        ]
+        assert list(standin.media.values()) == [1000, 1000]
+        headers = twitter.twython.get_lastfunction_header('x-rate-limit-limit')
+        assert headers == '10'
+        with pytest.raises(TwitterError):
+            twitter.tweet_with_image('simple', img)
+
+def test_twitter_standin_gif_processing(fake_twitter):
+    with TwitterStandIn(processing_checks=2) as standin:
+        twitter = Twitter(**fake_twitter, api_url=standin.api_url,
+                          upload_url=standin.upload_url, chunk_size=300)
+        gif = BytesIO(b'GIF89a' + b'x' * 994)
+        twitter.tweet_with_image('gif', gif, chunked=True)
+        assert [tweet['text'] for tweet in standin.tweets] == ['gif']
+        # INIT, 4 APPENDs, FINALIZE, 3 STATUS checks and the tweet
+        assert standin.stats['requests'] == 10
+
+def test_standin_rate_limit():
+    session = make_session(retries=0)
+    with TwitterStandIn(rate_limit=(2, 60)) as standin:
+        url = f'{standin.url}/1.1/media/upload.json?command=STATUS&media_id=1'
+        assert session.get(url).headers['x-rate-limit-remaining'] == '1'
+        assert session.get(url).status_code == 200
+        r = session.get(url)
+        assert r.status_code == 429
+        with pytest.raises(HTTPError):
+            r.raise_for_status()
+        assert standin.stats['rate_limited'] == 1
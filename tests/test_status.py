@@ -0,0 +1,49 @@
+from memeoverflow.status import weighted_length, compose_status
+
+
+def test_weighted_length():
+    assert weighted_length('hello') == 5
+    assert weighted_length('こんにちは') == 10
+    assert weighted_length('see https://example.com/a/very/long/url/indeed') == 27
+    assert weighted_length('http://a.b and http://c.d') == 51
+
+def test_weighted_length_domains():
+    # domains without a protocol are links too
+    assert weighted_length('ASP.NET') == 23
+    assert weighted_length('Deploy to user.github.io') == 33
+    assert weighted_length('Main.java') == 23
+    # but not file names, or a country TLD without a subdomain or path
+    assert weighted_length('Node.js') == 7
+    assert weighted_length('setup.py') == 8
+    assert weighted_length('bit.ly/abc') == 23
+    assert weighted_length('me@example.com') == 14
+
+def test_compose_status_counts_domains():
+    url = 'https://stackexchange.com/questions/12345'
+    title = 'ASP.NET ' * 10
+    status = compose_status(title, url, ['c#', 'asp.net', 'asp.net-core'])
+    # each ASP.NET counts as 23, leaving room for only one hashtag
+    assert weighted_length(status) == 272
+    assert status.endswith(f'{url} #csharp')
+
+def test_compose_status(example_question):
+    status = compose_status(
+        example_question['title'], example_question['link'],
+        example_question['tags'],
+    )
+    assert status == 'question_title question_url #foo #bar #foobar'
+
+def test_compose_status_keeps_hashtags_that_fit(example_long_question):
+    title = example_long_question['title'] * 5
+    url = 'https://stackexchange.com/questions/12345'
+    status = compose_status(title, url, example_long_question['tags'])
+    assert weighted_length(status) <= 280
+    assert status.startswith(f'{title} {url} #aaaaaaaaa1')
+    assert not status.endswith(url)
+    assert '#aaaaaaaa20' not in status
+
+def test_compose_status_shortens_title():
+    url = 'https://stackexchange.com/questions/12345'
+    status = compose_status('x' * 300, url, ['foo'])
+    assert weighted_length(status) == 280
+    assert status.endswith(f'… {url}')
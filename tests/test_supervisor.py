@@ -0,0 +1,83 @@
+import sys
+from time import sleep
+
+import pytest
+
+from memeoverflow import MemeOverflowSupervisor
+from memeoverflow.stackexchange import QuotaGovernor
+from memeoverflow.supervisor import HashRing, shard_sites, key_site_counts
+
+
+def make_sites(names):
+    return [{'stackexchange': {'site': name}} for name in names]
+
+def exit_worker(sites, db_path, key_sites):
+    sys.exit(1)
+
+def sleep_worker(sites, db_path, key_sites):
+    sleep(60)
+
+def test_hash_ring():
+    ring = HashRing(range(4))
+    assert repr(ring) == "<HashRing nodes=4>"
+    keys = [f'site{i}' for i in range(1000)]
+    nodes = [ring.node(key) for key in keys]
+    assert nodes == [HashRing(range(4)).node(key) for key in keys]
+    assert set(nodes) == {0, 1, 2, 3}
+    # adding a node only moves keys to the new node
+    bigger = HashRing(range(5))
+    moved = [
+        bigger.node(key) for key, node in zip(keys, nodes)
+        if bigger.node(key) != node
+    ]
+    assert set(moved) == {4}
+    assert len(moved) < 400
+    with pytest.raises(ValueError):
+        HashRing([])
+
+def test_shard_sites():
+    sites = make_sites(['foo', 'bar', 'baz', 'qux', 'quux'])
+    shards = shard_sites(sites, 3)
+    assert len(shards) == 3
+    assert sorted(
+        config['stackexchange']['site'] for shard in shards for config in shard
+    ) == ['bar', 'baz', 'foo', 'quux', 'qux']
+    assert shard_sites(sites, 1) == [sites]
+
+def test_supervisor_restart(tmp_path):
+    supervisor = MemeOverflowSupervisor(
+        make_sites(['foo', 'bar', 'baz']), str(tmp_path / 'memes.db'),
+        workers=2, restart_delay=0, target=exit_worker,
+    )
+    assert repr(supervisor) == "<MemeOverflowSupervisor workers=2 sites=3>"
+    with supervisor:
+        workers = set(supervisor.processes)
+        for process in supervisor.processes.values():
+            process.join(5)
+        assert supervisor.check() == len(workers)
+        assert set(supervisor.processes) == workers
+        assert supervisor.restarts == len(workers)
+    assert not supervisor.processes
+
+def test_supervisor_stop(tmp_path):
+    supervisor = MemeOverflowSupervisor(
+        make_sites(['foo']), str(tmp_path / 'memes.db'), workers=2,
+        restart_delay=60, target=sleep_worker,
+    )
+    with supervisor:
+        assert len(supervisor.processes) == 1
+        process = next(iter(supervisor.processes.values()))
+        assert process.is_alive()
+        assert supervisor.check() == 0
+    assert process.exitcode is not None
+
+def test_key_site_counts():
+    sites = make_sites(['foo', 'bar', 'baz'])
+    sites[0]['stackexchange']['key'] = 'supervisor_key'
+    sites[1]['stackexchange']['key'] = 'supervisor_key'
+    assert key_site_counts(sites) == {'supervisor_key': 2, None: 1}
+    governor = QuotaGovernor.for_key('supervisor_key')
+    governor.sites.add('foo')
+    assert governor.site_count == 1
+    governor.total_sites = 2
+    assert governor.site_count == 2
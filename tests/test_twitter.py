@@ -0,0 +1,96 @@
+from io import BytesIO
+from unittest.mock import patch
+
+import pytest
+from twython import TwythonError
+
+from memeoverflow import Twitter
+from memeoverflow.exc import TwitterError, TwitterDuplicateError
+from memeoverflow.twitter import guess_media_type
+
+
+UPLOAD_URL = 'http://localhost:8000/media/upload.json'
+
+
+@pytest.fixture()
+def twitter(fake_twitter):
+    return Twitter(**fake_twitter, upload_url=UPLOAD_URL, chunk_size=4)
+
+def test_twitter_init(twitter):
+    assert repr(twitter) == "<Twitter>"
+
+def test_guess_media_type(example_imgflip_img_blob):
+    assert guess_media_type(BytesIO(b'GIF89a...')) == 'image/gif'
+    assert guess_media_type(BytesIO(b'\x89PNG\r\n')) == 'image/png'
+    assert guess_media_type(BytesIO(example_imgflip_img_blob)) == 'image/jpeg'
+
+def test_tweet_with_image(twitter, example_twitter_upload_response,
+                          example_imgflip_img_blob):
+    img = BytesIO(example_imgflip_img_blob)
+    img.read()
+    with patch.object(twitter.twython, 'post',
+                      return_value=example_twitter_upload_response) as post, \
+            patch.object(twitter.twython, 'update_status') as update:
+        twitter.tweet_with_image('status', img)
+    post.assert_called_once_with(UPLOAD_URL, params={'media': img})
+    update.assert_called_once_with(status='status', media_ids=['1234567890'])
+
+def test_tweet_with_image_error(twitter, example_imgflip_img_blob):
+    with patch.object(twitter.twython, 'post', side_effect=TwythonError('')):
+        with pytest.raises(TwitterError):
+            twitter.tweet_with_image('status', BytesIO(example_imgflip_img_blob))
+
+def test_tweet_with_image_duplicate(twitter, example_twitter_upload_response,
+                                    example_imgflip_img_blob):
+    error = TwythonError('Status is a duplicate.', error_code=403)
+    with patch.object(twitter.twython, 'post',
+                      return_value=example_twitter_upload_response), \
+            patch.object(twitter.twython, 'update_status', side_effect=error):
+        with pytest.raises(TwitterDuplicateError):
+            twitter.tweet_with_image(
+                'status', BytesIO(example_imgflip_img_blob)
+            )
+
+def test_upload_chunked(twitter, example_twitter_upload_response):
+    calls = []
+    append_failures = [TwythonError('')]
+
+    def post(url, params):
+        assert url == UPLOAD_URL
+        params = dict(params)
+        if 'media' in params:
+            params['media'] = params['media'].read()
+        calls.append(params)
+        if params['command'] == 'APPEND' and params['segment_index'] == 1:
+            if append_failures:
+                raise append_failures.pop()
+        if params['command'] == 'FINALIZE':
+            return {'processing_info': {'state': 'pending',
+                                        'check_after_secs': 0}}
+        return example_twitter_upload_response
+
+    status = {'processing_info': {'state': 'succeeded'}}
+    with patch.object(twitter.twython, 'post', side_effect=post), \
+            patch.object(twitter.twython, 'get', return_value=status), \
+            patch('memeoverflow.twitter.sleep'):
+        media_id = twitter.upload_chunked(BytesIO(b'GIF89a123'))
+    assert media_id == '1234567890'
+    assert calls[0] == {
+        'command': 'INIT', 'total_bytes': 9, 'media_type': 'image/gif',
+        'media_category': 'tweet_gif',
+    }
+    appends = [c for c in calls if c['command'] == 'APPEND']
+    assert [c['segment_index'] for c in appends] == [0, 1, 1, 2]
+    assert [c['media'] for c in appends] == [b'GIF8', b'9a12', b'9a12', b'3']
+    assert calls[-1]['command'] == 'FINALIZE'
+
+def test_upload_processing_timeout(twitter):
+    twitter.max_processing_wait = 10
+    status = {'processing_info': {'state': 'in_progress',
+                                  'check_after_secs': 3}}
+    with patch.object(twitter.twython, 'get', return_value=status) as get, \
+            patch('memeoverflow.twitter.sleep') as sleep:
+        with pytest.raises(TwitterError):
+            twitter._wait_for_processing('1', status['processing_info'])
+    assert sleep.call_count == 3
+    assert get.call_count == 3
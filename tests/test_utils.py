@@ -0,0 +1,51 @@
+from io import BytesIO
+from unittest.mock import MagicMock
+
+import pytest
+from requests.exceptions import HTTPError
+
+from memeoverflow.utils import (
+    tags_to_hashtags, tag_to_hashtag, download_image_bytes,
+    download_image_file, CHUNK_SIZE,
+)
+
+
+def fake_session(content, error=None):
+    response = MagicMock()
+    response.__enter__.return_value = response
+    response.raw = BytesIO(content)
+    if error is not None:
+        response.raise_for_status.side_effect = error
+    session = MagicMock()
+    session.get.return_value = response
+    return session
+
+def test_tags_to_hashtags():
+    hashtags = tags_to_hashtags(['foo', 'c#', 'python-3.x', '123'])
+    assert sorted(hashtags.split()) == ['#csharp', '#foo', '#python3x']
+
+def test_download_image_bytes(example_imgflip_img_url):
+    content = b'x' * (CHUNK_SIZE * 2 + 1)
+    session = fake_session(content)
+    img = download_image_bytes(example_imgflip_img_url, session=session)
+    assert img.read() == content
+    session.get.assert_called_once_with(example_imgflip_img_url, stream=True)
+
+def test_download_image_bytes_error(example_imgflip_img_url):
+    session = fake_session(b'', error=HTTPError)
+    with pytest.raises(HTTPError):
+        download_image_bytes(example_imgflip_img_url, session=session)
+
+def test_download_image_file(tmp_path, example_imgflip_img_url,
+                             example_imgflip_img_blob):
+    path = tmp_path / 'test.jpg'
+    session = fake_session(example_imgflip_img_blob)
+    download_image_file(example_imgflip_img_url, str(path), session=session)
+    assert path.read_bytes() == example_imgflip_img_blob
+
+def test_tags_to_hashtags_ordered():
+    assert tags_to_hashtags(['foo', 'bar', 'foobar', 'foo-bar']) == (
+        '#foo #bar #foobar'
+    )
+    assert tag_to_hashtag('c++') == '#cpp'
+    assert tag_to_hashtag('2020') is None